@@ -0,0 +1,44 @@
+"""add rain_hourly ledger
+
+Revision ID: 3b8e1f0c9a27
+Revises: 5d2d396f52ea
+Create Date: 2026-10-19 09:12:41.503118
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3b8e1f0c9a27'
+down_revision: Union[str, Sequence[str], None] = '5d2d396f52ea'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('rain_hourly',
+    sa.Column('device_id', sa.Integer(), nullable=False),
+    sa.Column('hour', sa.DateTime(), nullable=False),
+    sa.Column('rain_cm', sa.Float(), nullable=False),
+    sa.ForeignKeyConstraint(['device_id'], ['device.id'], name=op.f('fk_rain_hourly_device_id_device'), ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('device_id', 'hour', name=op.f('pk_rain_hourly'))
+    )
+    # Backfill: consolida a chuva já gravada nas leituras em baldes horários
+    op.execute(
+        """
+        INSERT INTO rain_hourly (device_id, hour, rain_cm)
+        SELECT device_id, date_trunc('hour', timestamp), SUM(rain_cm)
+        FROM reading
+        WHERE rain_cm > 0
+        GROUP BY device_id, date_trunc('hour', timestamp)
+        """
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('rain_hourly')
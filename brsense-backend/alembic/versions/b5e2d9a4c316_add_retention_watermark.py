@@ -0,0 +1,33 @@
+"""add retention watermark
+
+Revision ID: b5e2d9a4c316
+Revises: f1c8a5d27b63
+Create Date: 2026-10-19 21:40:12.587301
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b5e2d9a4c316'
+down_revision: Union[str, Sequence[str], None] = 'f1c8a5d27b63'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('retention_watermark',
+    sa.Column('unit', sa.String(length=8), nullable=False),
+    sa.Column('compacted_before', sa.DateTime(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('unit', name=op.f('pk_retention_watermark'))
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('retention_watermark')
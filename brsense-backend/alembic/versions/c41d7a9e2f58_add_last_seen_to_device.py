@@ -0,0 +1,39 @@
+"""add last_seen to device
+
+Revision ID: c41d7a9e2f58
+Revises: 3b8e1f0c9a27
+Create Date: 2026-10-19 10:03:17.226904
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c41d7a9e2f58'
+down_revision: Union[str, Sequence[str], None] = '3b8e1f0c9a27'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('device', sa.Column('last_seen_at', sa.DateTime(), nullable=True))
+    op.add_column('device', sa.Column('last_message_at', sa.DateTime(), nullable=True))
+    # Até aqui o ingest gravava o "visto por último" em updated_at
+    op.execute("UPDATE device SET last_seen_at = updated_at")
+    op.execute(
+        """
+        UPDATE device SET last_message_at = r.max_ts
+        FROM (SELECT device_id, MAX(timestamp) AS max_ts FROM reading GROUP BY device_id) AS r
+        WHERE r.device_id = device.id
+        """
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('device', 'last_message_at')
+    op.drop_column('device', 'last_seen_at')
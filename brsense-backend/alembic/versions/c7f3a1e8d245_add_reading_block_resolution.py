@@ -0,0 +1,28 @@
+"""add reading_block resolution
+
+Revision ID: c7f3a1e8d245
+Revises: b5e2d9a4c316
+Create Date: 2026-10-19 23:05:37.914226
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c7f3a1e8d245'
+down_revision: Union[str, Sequence[str], None] = 'b5e2d9a4c316'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('reading_block', sa.Column('resolution', sa.String(length=8), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('reading_block', 'resolution')
@@ -0,0 +1,83 @@
+# app/core/conditional.py
+import hashlib
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Iterable, Optional, Tuple
+
+from fastapi import Request, Response
+
+from app.services.last_seen import last_seen_tracker
+
+# Respostas são por usuário (token) e sempre revalidadas pelo navegador
+CACHE_CONTROL = "private, no-cache"
+
+def build_validators(markers: Iterable[Tuple[int, Optional[datetime], Optional[datetime]]], *variant, floor: Optional[datetime] = None):
+    """
+    Monta (ETag, Last-Modified) a partir dos marcadores (id, updated_at, last_seen_at)
+    das sondas envolvidas, sem consultar leituras nem agregados.
+
+    Os valores de last_seen ainda não gravados pelo LastSeenTracker entram na
+    conta, então uma mensagem recém-recebida muda o ETag na hora. `variant`
+    diferencia representações (parâmetros, formato...) e `floor` é o instante a
+    partir do qual o conteúdo pode mudar só pela passagem do tempo (ex.: a hora
+    corrente nas janelas de chuva).
+    """
+    pending = last_seen_tracker.pending()
+    digest = hashlib.sha1()
+    last_modified = floor
+
+    for device_id, updated_at, last_seen_at in markers:
+        queued = pending.get(device_id)
+        if queued and (last_seen_at is None or queued[0] > last_seen_at):
+            last_seen_at = queued[0]
+        digest.update(f"{device_id}|{updated_at}|{last_seen_at};".encode())
+        for ts in (updated_at, last_seen_at):
+            if ts and (last_modified is None or ts > last_modified):
+                last_modified = ts
+
+    digest.update(repr(variant).encode())
+    return f'W/"{digest.hexdigest()[:24]}"', last_modified
+
+def _http_date(ts: datetime) -> str:
+    if ts.tzinfo is None:
+        ts = ts.replace(tzinfo=timezone.utc)
+    return format_datetime(ts.astimezone(timezone.utc), usegmt=True)
+
+def _opaque(tag: str) -> str:
+    # Comparação fraca (RFC 9110): ignora o prefixo W/
+    tag = tag.strip()
+    return tag[2:] if tag.startswith("W/") else tag
+
+def is_not_modified(request: Request, etag: str, last_modified: Optional[datetime]) -> bool:
+    """If-None-Match tem precedência; If-Modified-Since só vale sem ele."""
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        if if_none_match.strip() == "*":
+            return True
+        return _opaque(etag) in {_opaque(t) for t in if_none_match.split(",")}
+
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since and last_modified:
+        try:
+            since = parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+        if since.tzinfo is None:
+            since = since.replace(tzinfo=timezone.utc)
+        modified = last_modified if last_modified.tzinfo else last_modified.replace(tzinfo=timezone.utc)
+        # HTTP-date tem resolução de segundos
+        return modified.replace(microsecond=0) <= since
+    return False
+
+def set_validators(response: Response, etag: str, last_modified: Optional[datetime]) -> None:
+    response.headers["ETag"] = etag
+    if last_modified:
+        response.headers["Last-Modified"] = _http_date(last_modified)
+    response.headers["Cache-Control"] = CACHE_CONTROL
+
+def not_modified(etag: str, last_modified: Optional[datetime], vary: Optional[str] = None) -> Response:
+    response = Response(status_code=304)
+    set_validators(response, etag, last_modified)
+    if vary:
+        response.headers["Vary"] = vary
+    return response
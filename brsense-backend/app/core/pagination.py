@@ -0,0 +1,69 @@
+# app/core/pagination.py
+import threading
+import time
+from typing import Dict, Hashable, Optional, Sequence, Tuple
+
+from fastapi import Response
+from sqlalchemy import text
+from sqlalchemy.orm import Query, Session
+
+from app.settings import settings
+
+# Cabeçalhos da paginação por cursor (o corpo das listagens não muda de formato)
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+TOTAL_COUNT_HEADER = "X-Total-Count"
+TOTAL_ESTIMATED_HEADER = "X-Total-Count-Estimated"
+
+_count_lock = threading.Lock()
+_count_cache: Dict[Hashable, Tuple[float, int]] = {}
+
+def _estimated_rows(db: Session, table_name: str) -> int:
+    """Estimativa do planner (pg_class.reltuples): O(1), atualizada pelo ANALYZE/autovacuum."""
+    value = db.execute(
+        text("SELECT reltuples::bigint FROM pg_class WHERE oid = to_regclass(:table)"),
+        {"table": table_name},
+    ).scalar()
+    return max(int(value or 0), 0)
+
+def count_total(db: Session, query: Query, cache_key: Hashable, table_name: Optional[str] = None) -> Tuple[int, bool]:
+    """
+    Total da listagem para o cabeçalho X-Total-Count. Retorna (total, estimado).
+
+    Sem filtro (`table_name` informado) e acima de PAGINATION_EXACT_COUNT_LIMIT
+    linhas, usa a estimativa do planner em vez de um COUNT(*) que percorre a
+    tabela. Contagens exatas ficam em cache por PAGINATION_COUNT_TTL_SECONDS.
+    """
+    if table_name:
+        estimate = _estimated_rows(db, table_name)
+        if estimate >= settings.PAGINATION_EXACT_COUNT_LIMIT:
+            return estimate, True
+
+    now = time.monotonic()
+    with _count_lock:
+        cached = _count_cache.get(cache_key)
+    if cached and cached[0] > now:
+        return cached[1], False
+
+    total = query.order_by(None).count()
+    with _count_lock:
+        if len(_count_cache) > 4096:
+            _count_cache.clear()
+        _count_cache[cache_key] = (now + settings.PAGINATION_COUNT_TTL_SECONDS, total)
+    return total, False
+
+def set_page_headers(
+    response: Response,
+    keys: Sequence[int],
+    limit: int,
+    total: Optional[Tuple[int, bool]] = None,
+) -> None:
+    """
+    `keys` são as chaves (ids) da página na ordem devolvida. Página cheia
+    indica que pode haver mais: o cursor da próxima é a chave do último item.
+    """
+    if keys and len(keys) >= limit:
+        response.headers[NEXT_CURSOR_HEADER] = str(keys[-1])
+    if total is not None:
+        response.headers[TOTAL_COUNT_HEADER] = str(total[0])
+        if total[1]:
+            response.headers[TOTAL_ESTIMATED_HEADER] = "true"
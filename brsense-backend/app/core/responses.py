@@ -0,0 +1,114 @@
+# app/core/responses.py
+import gzip
+import json
+from datetime import date, datetime
+from typing import Any, Dict, Optional
+
+from fastapi import HTTPException, Request, Response
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson faz parte do requirements.txt
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:  # pragma: no cover - msgpack faz parte do requirements.txt
+    msgpack = None
+
+try:
+    import pyarrow as pa
+except ImportError:  # pragma: no cover - pyarrow faz parte do requirements.txt
+    pa = None
+
+# Tipos aceitos no Accept para o formato colunar do histórico
+COLUMNAR_JSON = "application/vnd.brsense.columnar+json"
+MSGPACK = "application/msgpack"
+ARROW_STREAM = "application/vnd.apache.arrow.stream"
+_ACCEPTED = {
+    COLUMNAR_JSON: COLUMNAR_JSON,
+    MSGPACK: MSGPACK,
+    "application/x-msgpack": MSGPACK,
+    ARROW_STREAM: ARROW_STREAM,
+}
+
+# Abaixo disso o gzip não compensa o custo de CPU
+GZIP_MIN_BYTES = 1024
+
+def _json_default(value: Any) -> Any:
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError(f"Tipo não serializável em JSON: {type(value).__name__}")
+
+def json_bytes(payload: Any) -> bytes:
+    """
+    Codifica em JSON formas internas e confiáveis (dicts e listas montados a
+    partir das linhas do banco) sem validação Pydantic item a item. Usa orjson;
+    sem ele, cai no json da biblioteca padrão com a mesma saída.
+    """
+    if orjson is not None:
+        return orjson.dumps(payload)
+    return json.dumps(payload, default=_json_default, separators=(",", ":")).encode("utf-8")
+
+class FastJSONResponse(Response):
+    """
+    Resposta JSON do caminho rápido. Devolvida pela rota, o FastAPI não revalida
+    o conteúdo pelo response_model, que continua documentando o OpenAPI.
+    """
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        return json_bytes(content)
+
+def negotiate_columnar(request: Request, format: Optional[str] = None) -> Optional[str]:
+    """
+    Escolhe a codificação colunar pedida pelo cliente (Accept ou ?format=columnar).
+    Retorna None quando o cliente quer o formato tradicional (lista de objetos).
+    """
+    for part in request.headers.get("accept", "").split(","):
+        media_type = part.split(";")[0].strip().lower()
+        if media_type in _ACCEPTED:
+            return _ACCEPTED[media_type]
+    if format == "columnar":
+        return COLUMNAR_JSON
+    return None
+
+def _to_arrow(payload: Dict[str, Any]) -> bytes:
+    """Uma coluna por métrica e profundidade (ex.: 'moisture_pct@10.0')."""
+    columns = {"timestamp": pa.array(payload["timestamps_ms"], type=pa.timestamp("ms"))}
+    for key, values in payload.items():
+        if key in ("timestamps_ms", "depths", "rain_cm", "battery_status"):
+            continue
+        for depth, series in zip(payload["depths"], values):
+            columns[f"{key}@{depth}"] = pa.array(series, type=pa.float64())
+    columns["rain_cm"] = pa.array(payload["rain_cm"], type=pa.float64())
+    columns["battery_status"] = pa.array(payload["battery_status"], type=pa.int64())
+
+    table = pa.table(columns)
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
+
+def columnar_response(payload: Dict[str, Any], media_type: str, request: Request) -> Response:
+    """
+    Serializa o payload colunar já montado (sem validação Pydantic: a forma é
+    interna e confiável) e comprime com gzip quando o cliente aceita.
+    """
+    if media_type == MSGPACK:
+        if msgpack is None:
+            raise HTTPException(status_code=406, detail="Codificação MessagePack indisponível no servidor")
+        body = msgpack.packb(payload, use_bin_type=True)
+    elif media_type == ARROW_STREAM:
+        if pa is None:
+            raise HTTPException(status_code=406, detail="Codificação Arrow indisponível no servidor")
+        body = _to_arrow(payload)
+    else:
+        body = json_bytes(payload)
+
+    headers = {"Vary": "Accept, Accept-Encoding"}
+    if len(body) >= GZIP_MIN_BYTES and "gzip" in request.headers.get("accept-encoding", "").lower():
+        body = gzip.compress(body, compresslevel=6)
+        headers["Content-Encoding"] = "gzip"
+
+    return Response(content=body, media_type=media_type, headers=headers)
@@ -1,6 +1,7 @@
 import time
 import requests
-from fastapi import Depends, HTTPException, status
+from typing import Optional
+from fastapi import Depends, HTTPException, Query, Request, status
 from fastapi.security import OAuth2PasswordBearer
 from jose import jwt, JWTError
 from app.models.user import User
@@ -22,6 +23,11 @@ oauth2_scheme = OAuth2PasswordBearer(
     tokenUrl=TOKEN_URL
 )
 
+# Mesmo esquema sem erro automático: o EventSource do navegador não envia
+# cabeçalhos, então o stream também aceita o token na URL ou em cookie
+optional_oauth2_scheme = OAuth2PasswordBearer(tokenUrl=TOKEN_URL, auto_error=False)
+ACCESS_TOKEN_COOKIE = "access_token"
+
 def get_jwks():
     """Busca as chaves do Keycloak e armazena em cache por 24 horas."""
     current_time = time.time()
@@ -86,6 +92,25 @@ def get_current_user_token(token: str = Depends(oauth2_scheme)):
         print(f"Erro na validação: {e}")
         raise HTTPException(status_code=401, detail="Erro de autenticação")
 
+def get_stream_user_token(
+    request: Request,
+    header_token: Optional[str] = Depends(optional_oauth2_scheme),
+    access_token: Optional[str] = Query(None, description="Token JWT (para EventSource, que não envia Authorization)"),
+):
+    """
+    Igual a get_current_user_token, mas o token pode vir do cabeçalho
+    Authorization, do parâmetro `access_token` ou do cookie `access_token`
+    (nessa ordem). A validação é a mesma.
+    """
+    token = header_token or access_token or request.cookies.get(ACCESS_TOKEN_COOKIE)
+    if not token:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Not authenticated",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    return get_current_user_token(token)
+
 # Função auxiliar para verificar roles (Ex: apenas ADMIN)
 def verify_admin_role(token_data: dict = Depends(get_current_user_token)):
     roles = token_data.get("realm_access", {}).get("roles", [])
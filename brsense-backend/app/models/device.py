@@ -1,7 +1,7 @@
 # app/models/device.py
 from datetime import datetime
 from typing import TYPE_CHECKING, Optional
-from sqlalchemy import String, DateTime, ForeignKey, Float, Integer, Date
+from sqlalchemy import String, DateTime, ForeignKey, Float, Integer, Date, Index, func
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 from app.db.base import Base
 from app.models.device_config import DeviceConfig
@@ -36,7 +36,33 @@ class Device(Base):
     created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, nullable=False)
     updated_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
 
-    readings = relationship("Reading", back_populates="device", cascade="all, delete-orphan")
+    # Mantidos pelo LastSeenTracker (gravação em lote, separada de updated_at)
+    last_seen_at: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True)
+    last_message_at: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True)
+
+    # Nunca carregar o histórico inteiro por acesso preguiçoso: use consultas limitadas
+    # (ver app/services/device_state.py). A remoção das leituras é feita em lote.
+    readings = relationship(
+        "Reading",
+        back_populates="device",
+        cascade="all, delete-orphan",
+        passive_deletes=True,
+        lazy="raise_on_sql",
+    )
     config = relationship("DeviceConfig", back_populates="device", uselist=False, cascade="all, delete-orphan")
     
-    farm: Mapped["Farm"] = relationship("Farm", back_populates="devices")
\ No newline at end of file
+    farm: Mapped["Farm"] = relationship("Farm", back_populates="devices")
+
+# Índice espacial (GiST) de point(longitude, latitude) para as consultas de viewport
+# do mapa (operador <@ box). Só sondas com coordenadas entram no índice.
+Index(
+    "ix_device_location_gist",
+    func.point(Device.longitude, Device.latitude),
+    postgresql_using="gist",
+    postgresql_where=Device.latitude.isnot(None) & Device.longitude.isnot(None),
+)
+
+# Índices de trigramas (pg_trgm) para a busca por trecho de ESN ou nome:
+# atendem ILIKE '%trecho%' e o operador de similaridade (%).
+Index("ix_device_esn_trgm", Device.esn, postgresql_using="gin", postgresql_ops={"esn": "gin_trgm_ops"})
+Index("ix_device_name_trgm", Device.name, postgresql_using="gin", postgresql_ops={"name": "gin_trgm_ops"})
@@ -0,0 +1,17 @@
+# app/models/rain_hourly.py
+from datetime import datetime
+from sqlalchemy import Float, DateTime, ForeignKey
+from sqlalchemy.orm import Mapped, mapped_column
+from app.db.base import Base
+
+class RainHourly(Base):
+    """
+    Livro-razão de chuva: um balde por sonda e por hora cheia (UTC).
+    Mantido pelo ingest, permite responder as janelas de 1h a 30d
+    lendo no máximo ~720 linhas por sonda em vez das leituras brutas.
+    """
+    __tablename__ = "rain_hourly"
+
+    device_id: Mapped[int] = mapped_column(ForeignKey("device.id", ondelete="CASCADE"), primary_key=True)
+    hour: Mapped[datetime] = mapped_column(DateTime, primary_key=True)
+    rain_cm: Mapped[float] = mapped_column(Float, default=0.0, nullable=False)
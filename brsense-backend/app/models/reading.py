@@ -1,9 +1,12 @@
 # app/models/reading.py
 from datetime import datetime
-from sqlalchemy import Float, DateTime, ForeignKey, String, Integer, Index
+from sqlalchemy import Float, DateTime, ForeignKey, String, Integer, BigInteger, Index, Sequence
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 from app.db.base import Base
 
+# Sequência global de ingestão: um valor por envelope, em ordem de commit (ver services/sync.py)
+ingest_seq = Sequence("ingest_seq", metadata=Base.metadata)
+
 class Reading(Base):
     __tablename__ = "reading"
 
@@ -23,8 +26,12 @@ class Reading(Base):
     battery_status: Mapped[int] = mapped_column(Integer, nullable=True)
     solar_status: Mapped[int] = mapped_column(Integer, nullable=True)
 
+    # Nulo para leituras anteriores à sequência e para as compactadas pela retenção
+    ingest_seq: Mapped[int] = mapped_column(BigInteger, nullable=True)
+
     device = relationship("Device", back_populates="readings")
     
     __table_args__ = (
         Index('ix_reading_device_time', 'device_id', 'timestamp'),
+        Index('ix_reading_ingest_seq', 'ingest_seq'),
     )
\ No newline at end of file
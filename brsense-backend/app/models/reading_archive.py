@@ -0,0 +1,28 @@
+# app/models/reading_archive.py
+from datetime import datetime, date
+from sqlalchemy import String, Integer, DateTime, Date, ForeignKey, Index
+from sqlalchemy.orm import Mapped, mapped_column
+from app.db.base import Base
+
+class ReadingArchive(Base):
+    """
+    Manifesto do arquivo frio: cada linha aponta para um arquivo Parquet
+    com as leituras de uma sonda em um mês fechado (removidas do Postgres).
+    Um mesmo mês pode ter mais de uma parte se chegarem leituras atrasadas.
+    """
+    __tablename__ = "reading_archive"
+
+    id: Mapped[int] = mapped_column(primary_key=True, index=True)
+    device_id: Mapped[int] = mapped_column(ForeignKey("device.id", ondelete="CASCADE"), nullable=False)
+    month: Mapped[date] = mapped_column(Date, nullable=False)  # Primeiro dia do mês
+
+    path: Mapped[str] = mapped_column(String(255), nullable=False)  # Relativo a ARCHIVE_DIR
+    row_count: Mapped[int] = mapped_column(Integer, nullable=False)
+    first_ts: Mapped[datetime] = mapped_column(DateTime, nullable=False)
+    last_ts: Mapped[datetime] = mapped_column(DateTime, nullable=False)
+
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, nullable=False)
+
+    __table_args__ = (
+        Index('ix_reading_archive_device_month', 'device_id', 'month'),
+    )
@@ -0,0 +1,31 @@
+# app/models/reading_block.py
+from datetime import datetime, date
+from typing import Optional
+from sqlalchemy import Integer, String, DateTime, Date, ForeignKey, Index, LargeBinary
+from sqlalchemy.orm import Mapped, mapped_column
+from app.db.base import Base
+
+class ReadingBlock(Base):
+    """
+    Leituras de uma sonda em um dia fechado, compactadas em um único bloco
+    (ver app/services/tsblock.py). As linhas correspondentes saem de `reading`.
+    Leituras atrasadas de um dia já selado são fundidas no bloco do dia.
+    """
+    __tablename__ = "reading_block"
+
+    id: Mapped[int] = mapped_column(primary_key=True, index=True)
+    device_id: Mapped[int] = mapped_column(ForeignKey("device.id", ondelete="CASCADE"), nullable=False)
+    day: Mapped[date] = mapped_column(Date, nullable=False)
+
+    row_count: Mapped[int] = mapped_column(Integer, nullable=False)
+    first_ts: Mapped[datetime] = mapped_column(DateTime, nullable=False)
+    last_ts: Mapped[datetime] = mapped_column(DateTime, nullable=False)
+    payload: Mapped[bytes] = mapped_column(LargeBinary, nullable=False)
+    # Nulo = leituras brutas; 'hour' ou 'day' depois da compactação da retenção
+    resolution: Mapped[Optional[str]] = mapped_column(String(8), nullable=True)
+
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, nullable=False)
+
+    __table_args__ = (
+        Index('ix_reading_block_device_day', 'device_id', 'day'),
+    )
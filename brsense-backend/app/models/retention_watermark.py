@@ -0,0 +1,16 @@
+# app/models/retention_watermark.py
+from datetime import datetime
+from sqlalchemy import String, DateTime
+from sqlalchemy.orm import Mapped, mapped_column
+from app.db.base import Base
+
+class RetentionWatermark(Base):
+    """
+    Até onde a política de retenção já compactou cada nível ('hour' ou 'day').
+    O planejamento só varre os dias a partir de `compacted_before`.
+    """
+    __tablename__ = "retention_watermark"
+
+    unit: Mapped[str] = mapped_column(String(8), primary_key=True)
+    compacted_before: Mapped[datetime] = mapped_column(DateTime, nullable=False)
+    updated_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
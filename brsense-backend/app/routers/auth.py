@@ -1,4 +1,4 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, Response, status
 from sqlalchemy.orm import Session
 from app.db.session import get_db
 from app.models.user import User # Vamos precisar criar este modelo abaixo
@@ -7,6 +7,7 @@ from app.services.keycloak_admin import create_keycloak_user
 from app.core.security import get_current_user_token, get_user_and_roles
 from typing import Optional
 from app.settings import settings
+from app.core.pagination import count_total, set_page_headers
 
 router = APIRouter()
 
@@ -66,12 +67,17 @@ def login_user(data: UserLogin, db: Session = Depends(get_db)):
     
 @router.get("/users")
 def list_users(
+    response: Response,
+    cursor: Optional[int] = Query(None, ge=0, description="Valor de X-Next-Cursor da página anterior"),
+    limit: int = Query(100, ge=1, le=1000),
+    include_total: bool = Query(False, description="Inclui X-Total-Count (em cache ou estimado)"),
     db: Session = Depends(get_db),
     token_payload: dict = Depends(get_current_user_token)
 ):
     """
     Lista usuários. Apenas ADMINs podem acessar.
     Também sincroniza o Admin atual com o banco local.
+    Paginado por cursor (keyset em id): siga o cabeçalho X-Next-Cursor.
     """
     
     # 1. O PULO DO GATO: Sincroniza o usuário atual (você) com o banco
@@ -105,7 +111,13 @@ def list_users(
         )
 
     # 3. Agora sim, busca no banco (agora você vai estar lá!)
-    users = db.query(User).all()
+    query = db.query(User).order_by(User.id)
+    if cursor is not None:
+        query = query.filter(User.id > cursor)
+    users = query.limit(limit).all()
+
+    total = count_total(db, db.query(User), ("users",), "users") if include_total else None
+    set_page_headers(response, [u.id for u in users], limit, total)
     
     return {
         "status": "success",
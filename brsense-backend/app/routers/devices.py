@@ -1,172 +1,242 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, status
 from sqlalchemy.orm import Session
-from sqlalchemy import func, case, desc
 from typing import List, Optional
-from datetime import datetime, timedelta
+from datetime import datetime
 
 from app.db.session import get_db
 from app.models.farm import Farm
 from app.models.device import Device
 from app.models.reading import Reading
 from app.models.user import User
-from app.schemas.device import DeviceRead, DeviceUpdate, DeviceCreate
+from app.schemas.device import DeviceRead, DeviceUpdate, DeviceCreate, DeviceChanges, DeviceSearchHit, MapViewport
+from app.services.device_state import (
+    build_device_payloads, build_projected_payloads, parse_device_fields, projected_columns,
+)
+from app.services.dashboard_cache import dashboard_cache, ADMIN_SCOPE
+from app.services.single_flight import single_flight
+from app.services.sync import changed_devices, current_cursor
+from app.services.geo import BBox, query_map_markers
+from app.services.search import search_devices
+from app.services.rain import RAIN_WINDOWS, next_rain_change
+from app.services.archive import archived_paths, remove_archive_files
 from app.core.security import get_current_user_token, get_user_and_roles
+from app.core.conditional import build_validators, is_not_modified, not_modified, set_validators
+from app.core.pagination import count_total, set_page_headers
+from app.core.responses import FastJSONResponse, json_bytes
 
 router = APIRouter()
 
-# --- FUNÇÃO AUXILIAR PARA CALCULAR CHUVA (Reutilizável) ---
-def populate_rain_metrics(db: Session, devices: List[Device]) -> List[Device]:
-    """
-    Recebe uma lista de dispositivos, calcula a chuva acumulada (1h, 24h, 7d)
-    e injeta os valores nos objetos antes de retornar.
-    """
-    now = datetime.utcnow()
-    time_1h = now - timedelta(hours=1)
-    time_24h = now - timedelta(hours=24)
-    time_7d = now - timedelta(days=7)
-    time_15d = now - timedelta(days=15)
-    time_30d = now - timedelta(days=30)
-    
-    if not devices:
-        return devices
-
-    device_ids = [d.id for d in devices]
-
-    rain_rows = (
-        db.query(
-            Reading.device_id,
-            func.coalesce(func.sum(case((Reading.timestamp >= time_1h, Reading.rain_cm), else_=0.0)), 0.0).label("rain_1h"),
-            func.coalesce(func.sum(case((Reading.timestamp >= time_24h, Reading.rain_cm), else_=0.0)), 0.0).label("rain_24h"),
-            func.coalesce(func.sum(case((Reading.timestamp >= time_7d, Reading.rain_cm), else_=0.0)), 0.0).label("rain_7d"),
-            func.coalesce(func.sum(case((Reading.timestamp >= time_15d, Reading.rain_cm), else_=0.0)), 0.0).label("rain_15d"),
-            func.coalesce(func.sum(case((Reading.timestamp >= time_30d, Reading.rain_cm), else_=0.0)), 0.0).label("rain_30d"),
-        )
-        .filter(Reading.device_id.in_(device_ids))
-        .group_by(Reading.device_id)
-        .all()
-    )
-
-    rain_map = {
-        row.device_id: {
-            "rain_1h": float(row.rain_1h or 0.0),
-            "rain_24h": float(row.rain_24h or 0.0),
-            "rain_7d": float(row.rain_7d or 0.0),
-            "rain_15d": float(row.rain_15d or 0.0),
-            "rain_30d": float(row.rain_30d or 0.0),
-        }
-        for row in rain_rows
-    }
-
-    for dev in devices:
-        metrics = rain_map.get(dev.id, {"rain_1h": 0.0, "rain_24h": 0.0, "rain_7d": 0.0, "rain_15d": 0.0, "rain_30d": 0.0})
-        dev.rain_1h = metrics["rain_1h"]
-        dev.rain_24h = metrics["rain_24h"]
-        dev.rain_7d = metrics["rain_7d"]
-        dev.rain_15d = metrics["rain_15d"]
-        dev.rain_30d = metrics["rain_30d"]
-
-    return devices
+# Colunas que sempre saem da consulta da página (ETag/cursor)
+_MARKER_COLUMNS = (Device.id, Device.updated_at, Device.last_seen_at)
+
+def _farm_owners(db: Session, *farm_ids: Optional[int]) -> List[int]:
+    """Donos das fazendas informadas (para invalidar o cache de quem ganhou/perdeu sondas)."""
+    ids = [f for f in farm_ids if f is not None]
+    if not ids:
+        return []
+    return [owner for (owner,) in db.query(Farm.user_id).filter(Farm.id.in_(ids)).all()]
 
 @router.get("/devices", response_model=List[DeviceRead])
 def read_devices(
-    skip: int = 0, 
-    limit: int = 25, 
+    request: Request,
+    cursor: Optional[int] = Query(None, ge=0, description="Valor de X-Next-Cursor da página anterior"),
+    skip: int = Query(0, ge=0, description="Legado: prefira `cursor`"),
+    limit: int = Query(25, ge=1, le=500),
+    include_total: bool = Query(False, description="Inclui X-Total-Count (em cache ou estimado)"),
+    fields: Optional[str] = Query(None, description="Campos separados por vírgula (ex.: esn,name,latitude,longitude). Apelidos: rain, config"),
     token_payload: dict = Depends(get_current_user_token),
     db: Session = Depends(get_db)
 ):
+    """
+    Lista as sondas com chuva e últimas leituras.
+
+    Com `fields`, devolve só os campos pedidos e só roda o SQL necessário:
+    sem janelas de chuva não consulta o livro-razão, sem 'readings' não busca
+    as últimas leituras. Só colunas da sonda = uma única consulta indexada.
+
+    Suporta GET condicional: o ETag vem dos marcadores das sondas da página
+    (updated_at e last_seen_at) e do instante em que a próxima chuva sai de uma
+    janela exata (uma consulta só nas horas de fronteira), então um polling sem
+    uplink novo recebe 304 sem rodar nenhuma agregação. Não há Last-Modified:
+    excluir uma sonda ou tirá-la do usuário muda a página sem avançar nenhuma data.
+
+    A resposta serializada fica no cache do dashboard, por usuário e página;
+    vários clientes olhando o mesmo painel não multiplicam as consultas.
+
+    Paginação por cursor (keyset em `id`): siga o cabeçalho X-Next-Cursor;
+    o custo de cada página não cresce com a posição na lista.
+    """
     user, is_admin = get_user_and_roles(db, token_payload)
+
+    try:
+        projection = parse_device_fields(fields)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     
-    query = db.query(Device)
+    base = db.query(Device)
     if not is_admin:
-        query = query.join(Farm, Device.farm_id == Farm.id).filter(Farm.user_id == user.id)
-        
-    devices = query.offset(skip).limit(limit).all()
-    
-    # Calcula as métricas de chuva (adiciona dev.rain_1h, etc)
-    devices = populate_rain_metrics(db, devices)
-    
-    result_list = []
-    for dev in devices:
-        # 1. Copia as colunas do banco
-        dev_data = {col.name: getattr(dev, col.name) for col in dev.__table__.columns}
-        
-        # 2. Garante a conversão da chuva para Float para o Frontend processar no Card
-        dev_data["rain_1h"] = float(getattr(dev, "rain_1h", 0.0))
-        dev_data["rain_24h"] = float(getattr(dev, "rain_24h", 0.0))
-        dev_data["rain_7d"] = float(getattr(dev, "rain_7d", 0.0))
-        dev_data["rain_15d"] = float(getattr(dev, "rain_15d", 0.0))
-        dev_data["rain_30d"] = float(getattr(dev, "rain_30d", 0.0))
-        
-        # 3. SUBQUERY: Encontra a última leitura de CADA profundidade que tenha humidade válida
-        subquery = (
-            db.query(
-                Reading.depth_cm,
-                func.max(Reading.timestamp).label("max_ts")
-            )
-            .filter(
-                Reading.device_id == dev.id, 
-                Reading.depth_cm.isnot(None),
-                Reading.moisture_pct.isnot(None) # Mantém as cores do mapa a funcionar
-            )
-            .group_by(Reading.depth_cm)
-            .subquery()
-        )
-        
-        # Busca as leituras completas usando a data da subquery
-        latest_depth_readings = (
-            db.query(Reading)
-            .join(
-                subquery,
-                (Reading.depth_cm == subquery.c.depth_cm) &
-                (Reading.timestamp == subquery.c.max_ts)
-            )
-            .filter(Reading.device_id == dev.id)
-            .all()
-        )
-        
-        # 4. Busca a bateria mais recente
-        latest_battery = (
-            db.query(Reading)
-            .filter(Reading.device_id == dev.id, Reading.battery_status.isnot(None))
-            .order_by(desc(Reading.timestamp))
-            .first()
-        )
-        
-        all_readings = list(latest_depth_readings)
-        if latest_battery and latest_battery.id not in [r.id for r in all_readings]:
-            all_readings.append(latest_battery)
-            
-        dev_data["readings"] = all_readings
-        result_list.append(dev_data)
-            
-    return result_list
+        base = base.join(Farm, Device.farm_id == Farm.id).filter(Farm.user_id == user.id)
+    query = base.order_by(Device.id)
+    if cursor is not None:
+        query = query.filter(Device.id > cursor)
+    elif skip:
+        query = query.offset(skip)
+    query = query.limit(limit)
+
+    # As janelas de chuva andam a cada hora cheia, mesmo sem uplink novo
+    now = datetime.utcnow()
+    hour = now.replace(minute=0, second=0, microsecond=0)
+    rows = None
+    if projection is None:
+        markers = query.with_entities(*_MARKER_COLUMNS).all()
+    else:
+        # Marcadores e colunas pedidas saem da mesma consulta
+        extra = [c for c in projected_columns(projection) if c.key not in ("id", "updated_at", "last_seen_at")]
+        rows = query.with_entities(*_MARKER_COLUMNS, *extra).all()
+        markers = [(r.id, r.updated_at, r.last_seen_at) for r in rows]
+
+    variant = sorted(projection) if projection else None
+    # 1h, 24h e 7d são exatas ao minuto: o instante em que a próxima chuva
+    # sai de uma janela também versiona a resposta
+    rain_change = None
+    if projection is None or projection & set(RAIN_WINDOWS):
+        rain_change = next_rain_change(db, [m[0] for m in markers], now)
+    # Só o ETag: uma sonda que sai da lista não deixa data mais recente,
+    # então If-Modified-Since daria 304 errado
+    etag, _ = build_validators(markers, "devices", hour, rain_change, variant)
+    if is_not_modified(request, etag, None):
+        return not_modified(etag, None)
+
+    cache_key = (ADMIN_SCOPE if is_admin else user.id, cursor, skip, limit, frozenset(projection or ()))
+    body = dashboard_cache.get(cache_key, etag)
+    if body is None:
+        def build():
+            if projection is not None:
+                payloads = build_projected_payloads(db, rows, projection)
+                return json_bytes(payloads), [p["id"] for p in payloads]
+            devices = query.all()
+            # Chuva e últimas leituras da página inteira em consultas agrupadas (sem N+1).
+            # Os dicts já têm a forma do DeviceRead: vão direto para o encoder
+            payloads = build_device_payloads(db, devices)
+            return json_bytes(payloads), [d.id for d in devices]
+
+        # O ETag identifica o conjunto de sondas e o estado delas: requisições
+        # simultâneas com o mesmo ETag (mesmo de usuários diferentes) compartilham o cálculo
+        body, device_ids = single_flight.do(("devices", etag), build)
+        dashboard_cache.put(cache_key, etag, body, device_ids)
+
+    cached_response = Response(content=body, media_type="application/json")
+    set_validators(cached_response, etag, None)
+    total = None
+    if include_total:
+        scope = "all" if is_admin else user.id
+        total = count_total(db, base, ("devices", scope), "device" if is_admin else None)
+    set_page_headers(cached_response, [m[0] for m in markers], limit, total)
+    return cached_response
+
+@router.get("/devices/changes", response_model=DeviceChanges)
+def read_device_changes(
+    since: Optional[int] = Query(None, ge=0, description="Cursor devolvido pela chamada anterior"),
+    token_payload: dict = Depends(get_current_user_token),
+    db: Session = Depends(get_db)
+):
+    """
+    Sincronização incremental do dashboard: só as sondas que receberam
+    leituras depois do cursor `since`, com o estado atual completo.
+
+    Sem `since`, devolve apenas o cursor atual: pegue-o antes de carregar
+    /api/devices e passe a consultar as mudanças a partir dele.
+    """
+    user, is_admin = get_user_and_roles(db, token_payload)
+
+    if since is None:
+        return {"cursor": current_cursor(db), "devices": []}
+
+    changed, cursor = changed_devices(db, since, None if is_admin else user.id)
+    if not changed:
+        return {"cursor": cursor, "devices": []}
+
+    devices = db.query(Device).filter(Device.id.in_(changed)).order_by(Device.id).all()
+    return {"cursor": cursor, "devices": build_device_payloads(db, devices)}
+
+@router.get("/devices/map", response_model=MapViewport, response_model_exclude_none=True)
+def read_devices_in_viewport(
+    west: float = Query(..., ge=-180, le=180),
+    south: float = Query(..., ge=-90, le=90),
+    east: float = Query(..., ge=-180, le=180),
+    north: float = Query(..., ge=-90, le=90),
+    zoom: int = Query(..., ge=0, le=24),
+    token_payload: dict = Depends(get_current_user_token),
+    db: Session = Depends(get_db)
+):
+    """
+    Sondas visíveis no viewport do mapa (FarmMap/SatelliteMap), via índice
+    espacial. Em zoom baixo devolve agrupamentos com contagem e umidade média;
+    de perto, as sondas individuais. west > east = viewport cruzando o antimeridiano.
+    """
+    if south > north:
+        raise HTTPException(status_code=400, detail="south deve ser menor ou igual a north")
+    user, is_admin = get_user_and_roles(db, token_payload)
+    return query_map_markers(db, BBox(west, south, east, north), zoom, None if is_admin else user.id)
+
+@router.get("/devices/search", response_model=List[DeviceSearchHit])
+def search_devices_endpoint(
+    q: str = Query(..., min_length=2, max_length=64, description="Trecho do ESN ou do nome"),
+    limit: int = Query(20, ge=1, le=100),
+    token_payload: dict = Depends(get_current_user_token),
+    db: Session = Depends(get_db)
+):
+    """
+    Busca de sondas por trecho do ESN ou do nome (typeahead da tabela de
+    administração), com ranking e limite. Usuários comuns só encontram as
+    sondas das próprias fazendas; o filtro roda no SQL.
+    """
+    user, is_admin = get_user_and_roles(db, token_payload)
+    if not q.strip():
+        return []
+    return FastJSONResponse(search_devices(db, q, limit, None if is_admin else user.id))
+
+@router.get("/devices/cache/stats")
+def read_dashboard_cache_stats(
+    token_payload: dict = Depends(get_current_user_token),
+    db: Session = Depends(get_db)
+):
+    """Contadores do cache do dashboard e do single-flight (somente administradores)."""
+    user, is_admin = get_user_and_roles(db, token_payload)
+    if not is_admin:
+        raise HTTPException(status_code=403, detail="Acesso restrito a administradores.")
+    return {**dashboard_cache.stats(), "single_flight": single_flight.stats()}
 
 @router.get("/devices/user/{user_id}", response_model=List[DeviceRead])
 def read_user_devices(
     user_id: int,
-    skip: int = 0,
-    limit: int = 100,
+    cursor: Optional[int] = Query(None, ge=0, description="Valor de X-Next-Cursor da página anterior"),
+    skip: int = Query(0, ge=0, description="Legado: prefira `cursor`"),
+    limit: int = Query(100, ge=1, le=500),
+    include_total: bool = Query(False, description="Inclui X-Total-Count (em cache)"),
     db: Session = Depends(get_db)
 ):
     """
     Retorna exclusivamente as sondas pertencentes às fazendas do usuário informado.
+    Paginação por cursor (keyset em `id`) via X-Next-Cursor.
     """
     user = db.query(User).filter(User.id == user_id).first()
     if not user:
         raise HTTPException(status_code=404, detail="Usuário não encontrado")
 
-    devices = (
-        db.query(Device)
-        
-        .join(Farm)
-        .filter(Farm.user_id == user_id)
-        .offset(skip)
-        .limit(limit)
-        .all()
-    )
-    devices = populate_rain_metrics(db, devices)
+    base = db.query(Device).join(Farm).filter(Farm.user_id == user_id)
+    query = base.order_by(Device.id)
+    if cursor is not None:
+        query = query.filter(Device.id > cursor)
+    elif skip:
+        query = query.offset(skip)
+    devices = query.limit(limit).all()
 
-    return devices
+    # Só as leituras recentes (por profundidade + bateria), nunca o histórico inteiro
+    response = FastJSONResponse(build_device_payloads(db, devices))
+    total = count_total(db, base, ("devices", user_id)) if include_total else None
+    set_page_headers(response, [d.id for d in devices], limit, total)
+    return response
 
 @router.post("/devices", response_model=DeviceRead)
 def create_or_associate_device(
@@ -189,6 +259,7 @@ def create_or_associate_device(
 
     clean_esn = device_data.esn.strip()
     db_device = db.query(Device).filter(Device.esn == clean_esn).first()
+    previous_farm_id = db_device.farm_id if db_device else None
 
     if db_device:
         # Atualiza dados existentes
@@ -223,12 +294,11 @@ def create_or_associate_device(
     
     db.commit()
     db.refresh(db_device)
+
+    dashboard_cache.invalidate_devices([db_device.id])
+    dashboard_cache.invalidate_scopes(_farm_owners(db, previous_farm_id, db_device.farm_id))
     
-    db_device.rain_1h = 0.0
-    db_device.rain_24h = 0.0
-    db_device.rain_7d = 0.0
-    
-    return db_device
+    return build_device_payloads(db, [db_device])[0]
 
 @router.patch("/devices/{esn}", response_model=DeviceRead)
 def update_device(
@@ -249,6 +319,7 @@ def update_device(
             if not farm or farm.user_id != user.id:
                 raise HTTPException(status_code=403, detail="Acesso negado a esta sonda.")
 
+    previous_farm_id = db_device.farm_id
     update_data = device_update.model_dump(exclude_unset=True)
     for key, value in update_data.items():
         setattr(db_device, key, value)
@@ -256,15 +327,27 @@ def update_device(
     db.add(db_device)
     db.commit()
     db.refresh(db_device)
+
+    dashboard_cache.invalidate_devices([db_device.id])
+    if db_device.farm_id != previous_farm_id:
+        dashboard_cache.invalidate_scopes(_farm_owners(db, previous_farm_id, db_device.farm_id))
     
-    updated_list = populate_rain_metrics(db, [db_device])
-    return updated_list[0]
+    return build_device_payloads(db, [db_device])[0]
 
 @router.delete("/devices/{esn}", status_code=status.HTTP_204_NO_CONTENT)
 def delete_device(esn: str, db: Session = Depends(get_db)):
     device = db.query(Device).filter(Device.esn == esn).first()
     if not device:
         raise HTTPException(status_code=404, detail="Sonda não encontrada")
+    # Remove as leituras em lote (o relacionamento não carrega o histórico na memória)
+    db.query(Reading).filter(Reading.device_id == device.id).delete(synchronize_session=False)
+    device_id, owners = device.id, _farm_owners(db, device.farm_id)
+    archive_files = archived_paths(db, device_id)
     db.delete(device)
     db.commit()
+    # Os arquivos Parquet só saem depois que o manifesto foi removido com sucesso
+    remove_archive_files(archive_files)
+    # As páginas seguintes do dono também mudam (as sondas "sobem" uma posição)
+    dashboard_cache.invalidate_devices([device_id])
+    dashboard_cache.invalidate_scopes(owners)
     return
\ No newline at end of file
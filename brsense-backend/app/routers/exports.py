@@ -0,0 +1,69 @@
+# app/routers/exports.py
+import os
+from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi.responses import FileResponse
+from sqlalchemy.orm import Session
+
+from app.db.session import get_db
+from app.models.farm import Farm
+from app.schemas.export import ExportJobCreate, ExportJobRead
+from app.services.export_jobs import export_jobs
+from app.core.security import get_current_user_token, get_user_and_roles
+
+router = APIRouter()
+
+def _get_job_for_user(job_id: str, db: Session, token_payload: dict):
+    user, is_admin = get_user_and_roles(db, token_payload)
+    job = export_jobs.get(job_id)
+    if not job or (not is_admin and job.user_id != user.id):
+        raise HTTPException(status_code=404, detail="Exportação não encontrada")
+    return job
+
+@router.post("/farms/{farm_id}/exports", response_model=ExportJobRead, status_code=status.HTTP_202_ACCEPTED)
+def create_farm_export(
+    farm_id: int,
+    data: ExportJobCreate,
+    token_payload: dict = Depends(get_current_user_token),
+    db: Session = Depends(get_db)
+):
+    """
+    Agenda a exportação do histórico de todas as sondas da fazenda para um
+    arquivo Parquet. Acompanhe em GET /exports/{id} e baixe quando 'done'.
+    """
+    user, is_admin = get_user_and_roles(db, token_payload)
+
+    farm = db.query(Farm).filter(Farm.id == farm_id).first()
+    if not farm:
+        raise HTTPException(status_code=404, detail="Fazenda não encontrada")
+    if not is_admin and farm.user_id != user.id:
+        raise HTTPException(status_code=403, detail="Acesso negado a esta fazenda.")
+
+    start_date = data.start_date.replace(tzinfo=None) if data.start_date else None
+    end_date = data.end_date.replace(tzinfo=None) if data.end_date else None
+    try:
+        return export_jobs.submit(farm_id, user.id, start_date, end_date)
+    except RuntimeError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+
+@router.get("/exports/{job_id}", response_model=ExportJobRead)
+def get_export(
+    job_id: str,
+    token_payload: dict = Depends(get_current_user_token),
+    db: Session = Depends(get_db)
+):
+    return _get_job_for_user(job_id, db, token_payload)
+
+@router.get("/exports/{job_id}/download")
+def download_export(
+    job_id: str,
+    token_payload: dict = Depends(get_current_user_token),
+    db: Session = Depends(get_db)
+):
+    job = _get_job_for_user(job_id, db, token_payload)
+    if job.status != "done" or not os.path.exists(job.path):
+        raise HTTPException(status_code=409, detail=f"Exportação ainda não disponível (status: {job.status})")
+    return FileResponse(
+        job.path,
+        media_type="application/vnd.apache.parquet",
+        filename=os.path.basename(job.path),
+    )
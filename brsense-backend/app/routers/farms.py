@@ -1,14 +1,23 @@
 # brsense-backend/app/routers/farms.py
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
 from sqlalchemy.orm import Session
 from typing import List, Optional
+from datetime import datetime, timedelta
 
 from app.db.session import get_db
 from app.models.farm import Farm
+from app.models.device import Device
 from app.models.user import User
-from app.schemas.farm import FarmCreate, FarmRead
+from app.schemas.farm import FarmCreate, FarmHeatmap, FarmRead, FarmsOverviewRead
+from app.services.device_state import build_device_payloads, get_moisture_sparklines
+from app.services.heatmap import build_farm_heatmap, heatmap_cache
+from app.services.single_flight import single_flight
+from app.core.conditional import build_validators, is_not_modified, not_modified, set_validators
+from app.core.responses import json_bytes
+from app.settings import settings
 # Importa a dependência que valida o token e extrai os dados do Keycloak
 from app.core.security import get_current_user_token, get_user_and_roles
+from app.core.pagination import count_total, set_page_headers
 
 router = APIRouter()
 def get_local_user(db: Session, token_payload: dict) -> User:
@@ -71,8 +80,11 @@ def create_farm(
 # 2. Listar Fazendas
 @router.get("/farms", response_model=List[FarmRead])
 def read_farms(
-    skip: int = 0, 
-    limit: int = 100, 
+    response: Response,
+    cursor: Optional[int] = Query(None, ge=0, description="Valor de X-Next-Cursor da página anterior"),
+    skip: int = Query(0, ge=0, description="Legado: prefira `cursor`"),
+    limit: int = Query(100, ge=1, le=500),
+    include_total: bool = Query(False, description="Inclui X-Total-Count (em cache ou estimado)"),
     token_payload: dict = Depends(get_current_user_token),
     db: Session = Depends(get_db)
 ):
@@ -89,10 +101,126 @@ def read_farms(
         # Usuário Comum: Filtra apenas onde user_id bate com o dele
         query = query.filter(Farm.user_id == user.id)
 
-    farms = query.offset(skip).limit(limit).all()
+    # 3. Paginação por cursor (keyset em id): X-Next-Cursor aponta a próxima página
+    page = query.order_by(Farm.id)
+    if cursor is not None:
+        page = page.filter(Farm.id > cursor)
+    elif skip:
+        page = page.offset(skip)
+    farms = page.limit(limit).all()
+
+    total = None
+    if include_total:
+        total = count_total(db, query, ("farms", "all" if is_admin else user.id), "farm" if is_admin else None)
+    set_page_headers(response, [f.id for f in farms], limit, total)
     return farms
 
-# 3. Rota Legada / Específica (Opcional)
+# 3. Visão geral do dashboard (fazendas + sondas + estado atual + sparklines)
+@router.get("/farms/overview", response_model=FarmsOverviewRead)
+def read_farms_overview(
+    sparkline_hours: int = Query(48, ge=1, le=168, description="Janela dos sparklines, em horas"),
+    sparkline_points: int = Query(24, ge=2, le=96, description="Pontos por sparkline"),
+    token_payload: dict = Depends(get_current_user_token),
+    db: Session = Depends(get_db)
+):
+    """
+    Tudo o que o dashboard precisa em uma chamada: fazendas, sondas, última
+    leitura por profundidade, janelas de chuva e sparklines de umidade.
+
+    Autenticação e filtro de propriedade uma vez só; o número de consultas é
+    fixo (usuário, fazendas, sondas, chuva, 2x estado atual, sparklines),
+    independente da quantidade de fazendas e sondas.
+    """
+    user, is_admin = get_user_and_roles(db, token_payload)
+
+    farm_query = db.query(Farm)
+    device_query = db.query(Device).join(Farm, Device.farm_id == Farm.id)
+    if not is_admin:
+        farm_query = farm_query.filter(Farm.user_id == user.id)
+        device_query = device_query.filter(Farm.user_id == user.id)
+
+    farms = farm_query.order_by(Farm.id).all()
+    devices = device_query.order_by(Device.farm_id, Device.id).all()
+
+    now = datetime.utcnow()
+    bucket_s = max(60, sparkline_hours * 3600 // sparkline_points)
+    # Alinha o início ao bucket para que os pontos caiam sempre nos mesmos horários
+    epoch = int((now - timedelta(hours=sparkline_hours) - datetime(1970, 1, 1)).total_seconds())
+    start = datetime(1970, 1, 1) + timedelta(seconds=epoch - epoch % bucket_s + bucket_s)
+
+    payloads = build_device_payloads(db, devices)
+    sparklines = get_moisture_sparklines(db, [d.id for d in devices], start, bucket_s, sparkline_points)
+
+    by_farm = {farm.id: [] for farm in farms}
+    for data in payloads:
+        data["sparklines"] = sparklines[data["id"]]
+        by_farm[data["farm_id"]].append(data)
+
+    return {
+        "generated_at": now,
+        "sparkline_start": start,
+        "sparkline_bucket_seconds": bucket_s,
+        "farms": [
+            {"id": farm.id, "name": farm.name, "location": farm.location, "user_id": farm.user_id, "devices": by_farm[farm.id]}
+            for farm in farms
+        ],
+    }
+
+# Mapa de calor da umidade (IDW) de uma fazenda
+@router.get("/farms/{farm_id}/heatmap", response_model=FarmHeatmap)
+def read_farm_heatmap(
+    farm_id: int,
+    request: Request,
+    depth_cm: float = Query(..., description="Profundidade interpolada"),
+    size: int = Query(64, ge=8, le=settings.HEATMAP_MAX_SIZE, description="Células no lado mais longo"),
+    power: float = Query(2.0, ge=0.5, le=5.0, description="Expoente do inverso da distância"),
+    token_payload: dict = Depends(get_current_user_token),
+    db: Session = Depends(get_db)
+):
+    """
+    Interpola a última umidade de cada sonda da fazenda (na profundidade pedida)
+    em uma grade regular, para o mapa de calor sem cálculo no navegador.
+
+    A grade vem compactada (uint16 + zlib + base64; valor = inteiro * scale).
+    O raster fica em cache pela versão das sondas da fazenda (último uplink e
+    cadastro) e pela hora cheia, onde termina a janela de umidade: só é
+    recalculado quando alguma sonda recebe dados ou muda, ou na virada da hora.
+    """
+    user, is_admin = get_user_and_roles(db, token_payload)
+
+    farm = db.query(Farm).filter(Farm.id == farm_id).first()
+    if not farm:
+        raise HTTPException(status_code=404, detail="Fazenda não encontrada")
+    if not is_admin and farm.user_id != user.id:
+        raise HTTPException(status_code=403, detail="Acesso negado a esta fazenda.")
+
+    markers = (
+        db.query(Device.id, Device.updated_at, Device.last_seen_at)
+        .filter(Device.farm_id == farm_id)
+        .order_by(Device.id)
+        .all()
+    )
+    # A janela de umidade é alinhada à hora cheia: só anda na virada da hora
+    hour = datetime.utcnow().replace(minute=0, second=0, microsecond=0)
+    # Só o ETag: uma sonda que sai da fazenda não deixa data mais recente
+    etag, _ = build_validators(markers, "heatmap", farm_id, depth_cm, size, power, hour)
+    if is_not_modified(request, etag, None):
+        return not_modified(etag, None)
+
+    cache_key = ("heatmap", farm_id, depth_cm, size, power)
+    body = heatmap_cache.get(cache_key, etag)
+    if body is None:
+        def build():
+            return json_bytes(build_farm_heatmap(db, farm_id, depth_cm, size, power, hour))
+
+        body = single_flight.do(("heatmap", etag), build)
+        heatmap_cache.put(cache_key, etag, body, [m.id for m in markers])
+
+    response = Response(content=body, media_type="application/json")
+    set_validators(response, etag, None)
+    return response
+
+# 4. Rota Legada / Específica (Opcional)
 @router.get("/farms/user/{user_id}", response_model=List[FarmRead])
 def read_user_farms(
     user_id: int,
@@ -1,14 +1,29 @@
 # app/routers/readings.py
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
-from typing import List, Optional
+from typing import List, Literal, Optional
 from pydantic import BaseModel
-from datetime import datetime
+from datetime import datetime, timedelta
+from itertools import dropwhile
 
-from app.db.session import get_db
-from app.models.reading import Reading
+from app.db.session import get_db, SessionLocal
 from app.models.device import Device
 from app.models.request_log import RequestLog
+from app.services.history import (
+    iter_device_history, load_device_history, load_downsampled_history, parse_resolution, plan_downsampling,
+    load_batch_history, load_downsampled_batch, plan_batch_downsampling,
+)
+from app.services.export import iter_csv, iter_ndjson
+from app.services.columnar import to_columnar
+from app.services.single_flight import single_flight
+from app.services.sync import current_cursor, reading_changes
+from app.services.retention import compaction_epoch
+from app.services.profile import CLOSED_VERSION, grid_start, is_closed_range, load_moisture_matrix, profile_cache
+from app.core.responses import FastJSONResponse, columnar_response, json_bytes, negotiate_columnar
+from app.core.conditional import build_validators, is_not_modified, not_modified, set_validators
+from app.core.pagination import count_total, set_page_headers
+from app.settings import settings
 
 router = APIRouter()
 
@@ -20,67 +35,314 @@ class ReadingResponse(BaseModel):
     temperature_c: Optional[float] = None
     battery_status: Optional[int] = None
     rain_cm: Optional[float] = None
+
+    # Preenchidos apenas no histórico reduzido (max_points / resolution)
+    moisture_min: Optional[float] = None
+    moisture_max: Optional[float] = None
+    temperature_min: Optional[float] = None
+    temperature_max: Optional[float] = None
     
     class Config:
         from_attributes = True
 
-@router.get("/device/{esn}/history", response_model=List[ReadingResponse])
+class DeviceHistoryResponse(BaseModel):
+    esn: str
+    bucket_seconds: Optional[int] = None  # None = leituras brutas
+    readings: List[ReadingResponse]
+
+class ReadingChangesResponse(BaseModel):
+    cursor: int  # Envie como `since` na próxima chamada
+    has_more: bool = False
+    readings: List[ReadingResponse]
+
+class MoistureProfileResponse(BaseModel):
+    esn: str
+    start: datetime  # Coluna i = start + i * step_seconds
+    step_seconds: int
+    steps: int
+    depths: List[float]  # Linha j da matriz = depths[j]
+    moisture_pct: List[List[Optional[float]]]  # depths × steps, None = sem leitura
+
+# Limite de sondas por chamada do histórico em lote
+MAX_BATCH_DEVICES = 50
+
+@router.get("/device/{esn}/history", response_model=List[ReadingResponse], response_model_exclude_unset=True)
 def get_device_history(
     esn: str, 
+    request: Request,
     start_date: Optional[datetime] = None, 
     end_date: Optional[datetime] = None,
+    max_points: Optional[int] = Query(None, ge=2, le=100000, description="Máximo de pontos por profundidade"),
+    resolution: Optional[str] = Query(None, description="Tamanho do bucket: 'raw', '15m', '1h', '1d'..."),
+    format: Optional[str] = Query(None, description="'columnar' para o formato colunar (ou negocie pelo Accept)"),
     db: Session = Depends(get_db)
 ):
     """
     Retorna o histórico otimizado, suportando grandes períodos de tempo.
+    Com `max_points` ou `resolution`, devolve um ponto por profundidade e bucket
+    (média + mínimo/máximo) em vez das leituras brutas. Só com `max_points`, se
+    as leituras do intervalo já cabem no limite, a resposta sai bruta.
+
+    Formato colunar opcional (um vetor de timestamps + vetores por profundidade),
+    escolhido pelo Accept: application/vnd.brsense.columnar+json, application/msgpack
+    ou application/vnd.apache.arrow.stream; gzip quando Accept-Encoding permitir.
+
+    Suporta GET condicional (ETag/Last-Modified pelo último uplink da sonda e
+    pela última execução da retenção): sem mensagem nova nem compactação,
+    responde 304 sem ler o histórico.
     """
     device = db.query(Device).filter(Device.esn == esn).first()
     if not device:
         raise HTTPException(status_code=404, detail="Dispositivo não encontrado")
-    
-    query = db.query(
-        Reading.timestamp,
-        Reading.depth_cm,
-        Reading.moisture_pct,
-        Reading.temperature_c,
-        Reading.battery_status,
-        Reading.rain_cm
-    ).filter(Reading.device_id == device.id)
-    
-    # Tratamento de Timezone e Filtros
-    if start_date:
-        if start_date.tzinfo:
-            start_date = start_date.replace(tzinfo=None)
-        query = query.filter(Reading.timestamp >= start_date)
-        
-    if end_date:
-        if end_date.tzinfo:
-            end_date = end_date.replace(tzinfo=None)
-        query = query.filter(Reading.timestamp <= end_date)
-        
-    if not start_date and not end_date:
-        query = query.limit(10000)
-
-    readings = query.order_by(Reading.timestamp.asc()).all()
 
-    return [
+    columnar = negotiate_columnar(request, format)
+    if resolution:
+        try:
+            parse_resolution(resolution)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+    # A retenção pode compactar leituras antigas a qualquer hora: a última execução entra no ETag
+    epoch = compaction_epoch(db)
+    gzip_ok = bool(columnar) and "gzip" in request.headers.get("accept-encoding", "").lower()
+    etag, last_modified = build_validators(
+        [(device.id, device.updated_at, device.last_seen_at)],
+        "history", start_date, end_date, max_points, resolution, columnar, gzip_ok, epoch,
+        floor=epoch,
+    )
+    if is_not_modified(request, etag, last_modified):
+        return not_modified(etag, last_modified, vary="Accept, Accept-Encoding")
+
+    def load():
+        if resolution or max_points:
+            plan = plan_downsampling(db, device.id, start_date, end_date, max_points, resolution)
+            if plan:
+                return load_downsampled_history(db, device.id, *plan)
+        return load_device_history(db, device.id, start_date, end_date)
+
+    # Vários painéis abrindo o mesmo gráfico ao mesmo tempo leem o histórico uma vez só
+    rows = single_flight.do(("history", device.id, etag), load)
+
+    if columnar:
+        # Forma interna e confiável: serializa direto, sem validar ponto a ponto
+        columnar_resp = columnar_response(to_columnar(rows), columnar, request)
+        set_validators(columnar_resp, etag, last_modified)
+        return columnar_resp
+
+    # Linhas internas direto para o encoder; o response_model fica só na documentação
+    fast = FastJSONResponse([r._asdict() for r in rows], headers={"Vary": "Accept"})
+    set_validators(fast, etag, last_modified)
+    return fast
+
+@router.get("/history", response_model=List[DeviceHistoryResponse], response_model_exclude_unset=True)
+def get_batch_history(
+    esn: List[str] = Query(..., description="ESNs a comparar (repita o parâmetro: ?esn=A&esn=B)"),
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None,
+    max_points: Optional[int] = Query(None, ge=2, le=100000, description="Máximo de pontos por profundidade"),
+    resolution: Optional[str] = Query(None, description="Tamanho do bucket: 'raw', '15m', '1h', '1d'..."),
+    db: Session = Depends(get_db)
+):
+    """
+    Histórico de várias sondas em uma chamada, para os gráficos de comparação.
+    As sondas são resolvidas em uma consulta e a tabela de leituras é lida em
+    uma única passada (ou uma única agregação, no histórico reduzido, com o
+    mesmo bucket para todas as séries ficarem alinhadas). Só com `max_points`,
+    se as leituras de cada sonda já cabem no limite, as séries saem brutas
+    (`bucket_seconds` nulo).
+    """
+    esns = list(dict.fromkeys(e.strip() for e in esn))
+    if len(esns) > MAX_BATCH_DEVICES:
+        raise HTTPException(status_code=400, detail=f"Máximo de {MAX_BATCH_DEVICES} sondas por chamada")
+
+    found = dict(db.query(Device.esn, Device.id).filter(Device.esn.in_(esns)).all())
+    missing = [e for e in esns if e not in found]
+    if missing:
+        raise HTTPException(status_code=404, detail=f"Dispositivo(s) não encontrado(s): {', '.join(missing)}")
+    device_ids = [found[e] for e in esns]
+
+    plan = None
+    if resolution or max_points:
+        try:
+            plan = plan_batch_downsampling(db, device_ids, start_date, end_date, max_points, resolution)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+    if plan:
+        series = load_downsampled_batch(db, device_ids, *plan)
+    else:
+        series = load_batch_history(db, device_ids, start_date, end_date)
+
+    return FastJSONResponse([
         {
-            "timestamp": r.timestamp,
-            "depth_cm": r.depth_cm,
-            "moisture_pct": r.moisture_pct,
-            "temperature_c": r.temperature_c,
-            "battery_status": r.battery_status,
-            "rain_cm": r.rain_cm
+            "esn": e,
+            "bucket_seconds": plan[2] if plan else None,
+            "readings": [r._asdict() for r in series[found[e]]],
         }
-        for r in readings
-    ]
+        for e in esns
+    ])
+
+@router.get("/device/{esn}/changes", response_model=ReadingChangesResponse, response_model_exclude_unset=True)
+def get_device_changes(
+    esn: str,
+    since: Optional[int] = Query(None, ge=0, description="Cursor devolvido pela chamada anterior"),
+    limit: int = Query(5000, ge=100, le=50000),
+    db: Session = Depends(get_db)
+):
+    """
+    Leituras da sonda que chegaram depois do cursor `since`, para anexar ao
+    gráfico já carregado em vez de baixar a janela inteira de novo. Com
+    `has_more`, chame de novo com o cursor devolvido.
+
+    Sem `since`, devolve apenas o cursor atual (pegue-o antes do histórico).
+    """
+    device = db.query(Device).filter(Device.esn == esn).first()
+    if not device:
+        raise HTTPException(status_code=404, detail="Dispositivo não encontrado")
+
+    if since is None:
+        return {"cursor": current_cursor(db), "has_more": False, "readings": []}
+
+    rows, cursor, has_more = reading_changes(db, device.id, since, limit)
+    return FastJSONResponse({"cursor": cursor, "has_more": has_more, "readings": [r._asdict() for r in rows]})
+
+@router.get("/device/{esn}/profile", response_model=MoistureProfileResponse)
+def get_moisture_profile(
+    esn: str,
+    request: Request,
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None,
+    step: str = Query("1h", description="Passo da grade: '15m', '1h', '1d'..."),
+    fill: Literal["none", "ffill", "linear"] = Query("none", description="Preenchimento de lacunas: none, ffill ou linear"),
+    max_gap: int = Query(3, ge=0, le=1000, description="Maior lacuna (em passos) que o preenchimento cobre"),
+    db: Session = Depends(get_db)
+):
+    """
+    Matriz densa profundidade × tempo da umidade para o gráfico de perfil do
+    solo (heatmap): uma linha por profundidade, uma coluna por passo da grade
+    regular, já pivotada e com lacunas tratadas no servidor.
+
+    Intervalos fechados (terminados há mais de PROFILE_CLOSED_AFTER_HOURS)
+    ficam em cache; leituras atrasadas da sonda descartam o cache dela.
+    Padrão: últimos 7 dias.
+    """
+    device = db.query(Device).filter(Device.esn == esn).first()
+    if not device:
+        raise HTTPException(status_code=404, detail="Dispositivo não encontrado")
+
+    try:
+        step_s = parse_resolution(step)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if step_s is None:
+        raise HTTPException(status_code=400, detail="O perfil exige um passo de grade ('raw' não se aplica).")
+
+    end = end_date.replace(tzinfo=None) if end_date else datetime.utcnow()
+    start = start_date.replace(tzinfo=None) if start_date else end - timedelta(days=7)
+    if start > end:
+        raise HTTPException(status_code=400, detail="start_date deve ser anterior a end_date.")
+    first = grid_start(start, step_s)
+    steps = int((end - first).total_seconds() // step_s) + 1
+    if steps > settings.PROFILE_MAX_STEPS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Intervalo gera {steps} colunas (máximo {settings.PROFILE_MAX_STEPS}); aumente o passo.",
+        )
+
+    etag, last_modified = build_validators(
+        [(device.id, device.updated_at, device.last_seen_at)],
+        "profile", start_date, end_date, first, steps, step_s, fill, max_gap,
+    )
+    if is_not_modified(request, etag, last_modified):
+        return not_modified(etag, last_modified)
+
+    def render() -> bytes:
+        matrix = load_moisture_matrix(db, device.id, start, end, step_s, fill, max_gap)
+        return json_bytes({"esn": device.esn, **matrix})
+
+    if is_closed_range(end):
+        # Nada novo deve cair no intervalo: a versão da entrada é fixa. O
+        # início e o fim exatos entram na chave, pois a última coluna só
+        # agrega leituras até `end`
+        key = ("profile", device.id, start, end, step_s, fill, max_gap)
+        body = profile_cache.get(key, CLOSED_VERSION)
+        if body is None:
+            body = render()
+            profile_cache.put(key, CLOSED_VERSION, body, [device.id])
+    else:
+        body = render()
+
+    response = Response(content=body, media_type="application/json")
+    set_validators(response, etag, last_modified)
+    return response
+
+@router.get("/device/{esn}/export")
+def export_device_history(
+    esn: str,
+    format: Literal["csv", "ndjson"] = "csv",
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None,
+    depth_cm: Optional[float] = None,
+    reading_type: Optional[Literal["H", "T"]] = Query(None, description="'H' umidade, 'T' temperatura"),
+    after: Optional[datetime] = Query(None, description="Retoma após este timestamp (último recebido por completo)"),
+    db: Session = Depends(get_db)
+):
+    """
+    Exporta o histórico completo da sonda em CSV ou NDJSON, em streaming.
+    As leituras são lidas com cursor no servidor e enviadas à medida que chegam,
+    então o uso de memória não depende do tamanho do período.
+    """
+    device = db.query(Device).filter(Device.esn == esn).first()
+    if not device:
+        raise HTTPException(status_code=404, detail="Dispositivo não encontrado")
+    device_id = device.id
+
+    if after:
+        after = after.replace(tzinfo=None)
+        start_date = max(start_date.replace(tzinfo=None), after) if start_date else after
+
+    def rows():
+        # Sessão própria: a do request é fechada antes do fim do streaming
+        stream_db = SessionLocal()
+        try:
+            history = iter_device_history(stream_db, device_id, start_date, end_date, depth_cm, reading_type)
+            if after:
+                history = dropwhile(lambda r: r.timestamp <= after, history)
+            yield from history
+        finally:
+            stream_db.close()
+
+    if format == "ndjson":
+        body, media_type = iter_ndjson(rows()), "application/x-ndjson"
+    else:
+        body, media_type = iter_csv(rows()), "text/csv"
+
+    return StreamingResponse(
+        body,
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{esn}_historico.{format}"'},
+    )
 
 @router.get("/logs")
-def view_uplink_logs(limit: int = 50, db: Session = Depends(get_db)):
+def view_uplink_logs(
+    response: Response,
+    limit: int = Query(50, ge=1, le=500),
+    cursor: Optional[int] = Query(None, ge=0, description="Valor de X-Next-Cursor da página anterior"),
+    include_total: bool = Query(False, description="Inclui X-Total-Count (estimado em tabelas grandes)"),
+    db: Session = Depends(get_db)
+):
     """
     Rota pública para visualizar os últimos payloads recebidos (capturados pelo Middleware).
+    Do mais novo para o mais antigo, paginado por cursor (X-Next-Cursor).
     """
-    logs = db.query(RequestLog).order_by(RequestLog.timestamp.desc()).limit(limit).all()
+    # O id cresce junto com o timestamp (gravado na inserção) e já é indexado
+    query = db.query(RequestLog).order_by(RequestLog.id.desc())
+    if cursor is not None:
+        query = query.filter(RequestLog.id < cursor)
+    logs = query.limit(limit).all()
+
+    total = count_total(db, db.query(RequestLog), ("request_log",), "request_log") if include_total else None
+    set_page_headers(response, [l.id for l in logs], limit, total)
     
     # Retorna uma lista simples
     return [
@@ -0,0 +1,135 @@
+# app/routers/stream.py
+import asyncio
+import json
+import time
+from typing import Optional, Set, Tuple
+
+from fastapi import APIRouter, Depends, Header, Query, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import StreamingResponse
+
+from app.db.session import SessionLocal
+from app.models.device import Device
+from app.models.farm import Farm
+from app.services.broker import event_broker
+from app.services.device_state import build_device_payloads
+from app.services.sync import changed_devices, current_cursor
+from app.settings import settings
+from app.core.security import get_stream_user_token, get_user_and_roles
+
+router = APIRouter()
+
+def _sse(event: str, data, event_id: Optional[int] = None) -> str:
+    lines = [f"event: {event}"]
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    lines.append("data: " + json.dumps(jsonable_encoder(data), separators=(",", ":")))
+    return "\n".join(lines) + "\n\n"
+
+# As funções abaixo rodam no threadpool, cada uma com uma sessão curta:
+# o stream fica aberto por horas e não pode segurar conexão do pool.
+
+def _resolve_user(token_payload: dict) -> Tuple[int, bool]:
+    db = SessionLocal()
+    try:
+        user, is_admin = get_user_and_roles(db, token_payload)
+        return user.id, is_admin
+    finally:
+        db.close()
+
+def _owned_farms(user_id: int) -> Set[int]:
+    db = SessionLocal()
+    try:
+        return {farm_id for (farm_id,) in db.query(Farm.id).filter(Farm.user_id == user_id).all()}
+    finally:
+        db.close()
+
+def _catch_up(since: Optional[int], owner_id: Optional[int]) -> dict:
+    """Estado completo das sondas alteradas depois de `since` (ou só o cursor, sem `since`)."""
+    db = SessionLocal()
+    try:
+        if since is None:
+            return {"cursor": current_cursor(db), "devices": []}
+        changed, cursor = changed_devices(db, since, owner_id)
+        devices = db.query(Device).filter(Device.id.in_(changed)).order_by(Device.id).all() if changed else []
+        return {"cursor": cursor, "devices": build_device_payloads(db, devices)}
+    finally:
+        db.close()
+
+@router.get("/stream")
+async def stream_updates(
+    request: Request,
+    cursor: Optional[int] = Query(None, ge=0, description="Cursor de ingestão para retomar (alternativa ao Last-Event-ID)"),
+    last_event_id: Optional[str] = Header(None),
+    token_payload: dict = Depends(get_stream_user_token),
+):
+    """
+    Stream SSE com as leituras novas das sondas do usuário, publicadas pela
+    ingestão logo após o commit.
+
+    Eventos:
+    - `snapshot`: estado completo das sondas alteradas desde o cursor (ao
+      conectar com cursor/Last-Event-ID, ou após o cliente ficar para trás);
+      sem cursor, traz só o cursor atual.
+    - `reading`: atualização compacta de uma sonda (`seq`, `esn`, `readings`).
+
+    O `id` de cada evento é o cursor de ingestão: ao reconectar, o navegador
+    envia Last-Event-ID e o stream continua de onde parou.
+
+    Como o EventSource não envia cabeçalhos, o token também pode vir em
+    `?access_token=` ou no cookie `access_token`.
+    """
+    user_id, is_admin = await run_in_threadpool(_resolve_user, token_payload)
+    owner_id = None if is_admin else user_id
+
+    since = cursor
+    if last_event_id and last_event_id.strip().isdigit():
+        since = int(last_event_id)
+
+    farm_ids = None if is_admin else await run_in_threadpool(_owned_farms, user_id)
+    # Assina antes do snapshot: nada publicado entre os dois se perde
+    sub = event_broker.subscribe(farm_ids)
+
+    async def events():
+        try:
+            snapshot = await run_in_threadpool(_catch_up, since, owner_id)
+            # covered: o snapshot já inclui tudo até aqui; last_id: último cursor entregue
+            covered = last_id = snapshot["cursor"]
+            yield _sse("snapshot", snapshot, last_id)
+            acl_checked = time.monotonic()
+
+            while True:
+                if await request.is_disconnected():
+                    break
+                try:
+                    event = await asyncio.wait_for(sub.queue.get(), timeout=settings.SSE_HEARTBEAT_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": ping\n\n"
+                    if owner_id is not None and time.monotonic() - acl_checked > settings.SSE_ACL_REFRESH_SECONDS:
+                        sub.farm_ids = await run_in_threadpool(_owned_farms, owner_id)
+                        acl_checked = time.monotonic()
+                    continue
+
+                if sub.lagged:
+                    # Cliente lento: descarta a fila e refaz pelo banco a partir do último cursor entregue
+                    while not sub.queue.empty():
+                        sub.queue.get_nowait()
+                    sub.lagged = False
+                    snapshot = await run_in_threadpool(_catch_up, last_id, owner_id)
+                    covered = last_id = max(last_id, snapshot["cursor"])
+                    yield _sse("snapshot", snapshot, last_id)
+                    continue
+
+                if event["seq"] <= covered:
+                    continue  # Já veio no snapshot
+                last_id = max(last_id, event["seq"])
+                yield _sse("reading", event, last_id)
+        finally:
+            event_broker.unsubscribe(sub)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
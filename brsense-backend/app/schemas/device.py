@@ -21,6 +21,8 @@ class DeviceRead(BaseModel):
     location: str | None = None
     created_at: datetime
     updated_at: datetime
+    last_seen_at: Optional[datetime] = None
+    last_message_at: Optional[datetime] = None
     
     farm_id: Optional[int] = None 
     latitude: Optional[float] = None
@@ -46,6 +48,36 @@ class DeviceRead(BaseModel):
     class Config:
         from_attributes = True
         
+class DeviceChanges(BaseModel):
+    cursor: int  # Envie como `since` na próxima chamada
+    devices: List[DeviceRead] = Field(default_factory=list)
+
+class MapMarker(BaseModel):
+    type: str  # "device" | "cluster"
+    latitude: float
+    longitude: float
+    count: int = 1
+    mean_moisture_pct: Optional[float] = None
+    # Apenas em marcadores de sonda
+    device_id: Optional[int] = None
+    esn: Optional[str] = None
+    name: Optional[str] = None
+    farm_id: Optional[int] = None
+
+class MapViewport(BaseModel):
+    clustered: bool
+    cell_degrees: Optional[float] = None
+    truncated: bool = False
+    markers: List[MapMarker] = Field(default_factory=list)
+
+class DeviceSearchHit(BaseModel):
+    id: int
+    esn: str
+    name: Optional[str] = None
+    farm_id: Optional[int] = None
+    last_seen_at: Optional[datetime] = None
+    score: float  # Similaridade de trigramas (0 a 1)
+
 class DeviceUpdate(BaseModel):
     name: Optional[str] = None
     farm_id: Optional[int] = None
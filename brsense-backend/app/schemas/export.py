@@ -0,0 +1,23 @@
+from pydantic import BaseModel
+from datetime import datetime
+from typing import Optional
+
+class ExportJobCreate(BaseModel):
+    start_date: Optional[datetime] = None
+    end_date: Optional[datetime] = None
+
+class ExportJobRead(BaseModel):
+    id: str
+    farm_id: int
+    status: str  # pending | running | done | failed
+    start_date: Optional[datetime] = None
+    end_date: Optional[datetime] = None
+    created_at: datetime
+    finished_at: Optional[datetime] = None
+    devices_total: int = 0
+    devices_done: int = 0
+    row_count: int = 0
+    error: Optional[str] = None
+
+    class Config:
+        from_attributes = True
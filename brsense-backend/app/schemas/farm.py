@@ -1,6 +1,9 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
+from datetime import datetime
 from typing import List, Optional
 
+from app.schemas.device import DeviceRead
+
 class FarmBase(BaseModel):
     name: str
     location: Optional[str] = None
@@ -13,4 +16,39 @@ class FarmRead(FarmBase):
     user_id: int
     
     class Config:
-        from_attributes = True
\ No newline at end of file
+        from_attributes = True
+
+class SparklineSeries(BaseModel):
+    depth_cm: float
+    values: List[Optional[float]]
+
+class DeviceOverview(DeviceRead):
+    sparklines: List[SparklineSeries] = Field(default_factory=list)
+
+class FarmOverview(FarmRead):
+    devices: List[DeviceOverview] = Field(default_factory=list)
+
+class FarmsOverviewRead(BaseModel):
+    generated_at: datetime
+    sparkline_start: datetime
+    sparkline_bucket_seconds: int
+    farms: List[FarmOverview]
+
+class HeatmapProbe(BaseModel):
+    esn: str
+    latitude: float
+    longitude: float
+    moisture_pct: Optional[float] = None  # None = sem leitura recente nesta profundidade
+
+class FarmHeatmap(BaseModel):
+    farm_id: int
+    depth_cm: float
+    generated_at: datetime
+    width: int
+    height: int
+    bounds: Optional[List[float]] = None  # [oeste, sul, leste, norte]
+    scale: float  # valor = inteiro * scale
+    nodata: int
+    encoding: str  # uint16 little-endian, linha a linha de norte para sul
+    data: Optional[str] = None
+    probes: List[HeatmapProbe] = Field(default_factory=list)
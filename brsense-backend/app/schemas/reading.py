@@ -0,0 +1,31 @@
+from datetime import datetime
+from typing import NamedTuple, Optional
+
+class HistoryRow(NamedTuple):
+    """
+    Linha do histórico no formato do ReadingResponse, independente da origem
+    (tabela `reading` ou arquivo frio). Leve o bastante para milhões de pontos.
+    """
+    timestamp: datetime
+    depth_cm: Optional[float]
+    moisture_pct: Optional[float]
+    temperature_c: Optional[float]
+    battery_status: Optional[int]
+    rain_cm: Optional[float]
+
+class HistoryBucket(NamedTuple):
+    """
+    Ponto agregado de uma profundidade em um intervalo de tempo (histórico reduzido).
+    Os campos do HistoryRow trazem a média (chuva: soma; bateria: a menor);
+    os limites mínimo/máximo preservam os picos que a média esconderia.
+    """
+    timestamp: datetime
+    depth_cm: Optional[float]
+    moisture_pct: Optional[float]
+    temperature_c: Optional[float]
+    battery_status: Optional[int]
+    rain_cm: Optional[float]
+    moisture_min: Optional[float]
+    moisture_max: Optional[float]
+    temperature_min: Optional[float]
+    temperature_max: Optional[float]
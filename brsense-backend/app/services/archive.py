@@ -0,0 +1,212 @@
+# app/services/archive.py
+import heapq
+import logging
+import os
+import uuid
+from datetime import date, datetime
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from sqlalchemy import func, and_, cast, DateTime
+from sqlalchemy.orm import Session
+
+from app.models.reading import Reading
+from app.models.reading_archive import ReadingArchive
+from app.models.reading_block import ReadingBlock
+from app.schemas.reading import HistoryRow
+from app.services.latest_state import latest_state_ids
+from app.services.tsblock import BLOCK_COLUMNS, decode_block
+from app.settings import settings
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # pragma: no cover - pyarrow faz parte do requirements.txt
+    pa = None
+    pq = None
+
+logger = logging.getLogger(__name__)
+
+# Colunas de `reading` preservadas no Parquet (id e device_id ficam no manifesto);
+# mesma ordem das tuplas dos blocos, que são arquivados junto
+ARCHIVE_COLUMNS = list(BLOCK_COLUMNS)
+
+def _require_pyarrow() -> None:
+    if pa is None:
+        raise RuntimeError("pyarrow não está instalado: o arquivo frio de leituras está indisponível.")
+
+def _archive_schema():
+    return pa.schema([
+        ("timestamp", pa.timestamp("us")),
+        ("reading_type", pa.string()),
+        ("depth_cm", pa.float64()),
+        ("moisture_pct", pa.float64()),
+        ("temperature_c", pa.float64()),
+        ("rain_cm", pa.float64()),
+        ("battery_status", pa.int16()),
+        ("solar_status", pa.int16()),
+    ])
+
+def month_start(d: datetime | date) -> date:
+    return date(d.year, d.month, 1)
+
+def next_month(m: date) -> date:
+    return date(m.year + 1, 1, 1) if m.month == 12 else date(m.year, m.month + 1, 1)
+
+def archive_cutoff(today: Optional[date] = None, keep_months: Optional[int] = None) -> date:
+    """Primeiro dia do mês mais antigo que continua quente no Postgres."""
+    today = today or datetime.utcnow().date()
+    keep = settings.ARCHIVE_KEEP_MONTHS if keep_months is None else keep_months
+    m = month_start(today)
+    for _ in range(keep):
+        m = date(m.year - 1, 12, 1) if m.month == 1 else date(m.year, m.month - 1, 1)
+    return m
+
+def find_archivable_months(db: Session, cutoff: date) -> List[Tuple[int, date, int]]:
+    """
+    Lista (device_id, mês, nº de linhas) com leituras anteriores ao corte
+    ainda no Postgres, em `reading` ou em blocos selados.
+    """
+    month_col = func.date_trunc("month", Reading.timestamp)
+    hot = (
+        db.query(Reading.device_id, month_col.label("month"), func.count().label("n"))
+        .filter(Reading.timestamp < datetime.combine(cutoff, datetime.min.time()))
+        .group_by(Reading.device_id, month_col)
+    )
+    block_month = func.date_trunc("month", cast(ReadingBlock.day, DateTime))
+    sealed = (
+        db.query(ReadingBlock.device_id, block_month.label("month"), func.sum(ReadingBlock.row_count).label("n"))
+        .filter(ReadingBlock.day < cutoff)
+        .group_by(ReadingBlock.device_id, block_month)
+    )
+    months: Dict[Tuple[int, date], int] = {}
+    for r in [*hot, *sealed]:
+        key = (r.device_id, r.month.date())
+        months[key] = months.get(key, 0) + int(r.n)
+    return [(device_id, month, n) for (device_id, month), n in sorted(months.items())]
+
+def archive_month(db: Session, device_id: int, month: date) -> int:
+    """
+    Exporta as leituras de uma sonda em um mês fechado (linhas quentes e blocos
+    selados) para um arquivo Parquet, registra no manifesto e remove linhas e
+    blocos do Postgres, tudo em uma transação. Retorna o nº de leituras
+    arquivadas. O estado atual da sonda (latest_state_ids) fica quente; sai em
+    uma parte tardia quando deixar de sê-lo.
+    """
+    _require_pyarrow()
+
+    start = datetime.combine(month, datetime.min.time())
+    end = datetime.combine(next_month(month), datetime.min.time())
+    window = and_(Reading.device_id == device_id, Reading.timestamp >= start, Reading.timestamp < end)
+
+    keep = latest_state_ids(db, [device_id])
+    hot = (
+        db.query(Reading.id, *[getattr(Reading, c) for c in ARCHIVE_COLUMNS])
+        .filter(window)
+        .all()
+    )
+    hot = [r for r in hot if r.id not in keep]
+    blocks = (
+        db.query(ReadingBlock)
+        .filter(ReadingBlock.device_id == device_id, ReadingBlock.day >= month, ReadingBlock.day < next_month(month))
+        .all()
+    )
+    rows = [tuple(r)[1:] for r in hot]
+    for block in blocks:
+        rows.extend(decode_block(block.payload))
+    if not rows:
+        return 0
+    rows.sort(key=lambda r: r[0])
+
+    table = pa.Table.from_pydict(
+        {c: [r[i] for r in rows] for i, c in enumerate(ARCHIVE_COLUMNS)},
+        schema=_archive_schema(),
+    )
+
+    rel_path = os.path.join(str(device_id), f"{month:%Y-%m}-{uuid.uuid4().hex[:8]}.parquet")
+    abs_path = os.path.join(settings.ARCHIVE_DIR, rel_path)
+    os.makedirs(os.path.dirname(abs_path), exist_ok=True)
+    pq.write_table(table, abs_path, compression="zstd")
+
+    try:
+        db.add(ReadingArchive(
+            device_id=device_id,
+            month=month,
+            path=rel_path,
+            row_count=len(rows),
+            first_ts=rows[0][0],
+            last_ts=rows[-1][0],
+        ))
+        # Apaga só o que foi exportado (leituras que chegarem agora ficam quentes)
+        if hot:
+            max_id = max(r.id for r in hot)
+            db.query(Reading).filter(window, Reading.id <= max_id, Reading.id.notin_(keep)).delete(synchronize_session=False)
+        for block in blocks:
+            db.delete(block)
+        db.commit()
+    except Exception:
+        db.rollback()
+        os.remove(abs_path)
+        raise
+
+    logger.info(f"Arquivadas {len(rows)} leituras da sonda {device_id} em {month:%Y-%m} -> {rel_path}")
+    return len(rows)
+
+def archived_paths(db: Session, device_id: int) -> List[str]:
+    """Arquivos Parquet da sonda (relativos a ARCHIVE_DIR), para apagar junto com ela."""
+    return [p for (p,) in db.query(ReadingArchive.path).filter(ReadingArchive.device_id == device_id)]
+
+def remove_archive_files(paths: List[str]) -> None:
+    """
+    Apaga os arquivos do arquivo frio. Chamar depois do commit que removeu a
+    sonda (o manifesto sai junto, por ON DELETE CASCADE).
+    """
+    for rel_path in paths:
+        abs_path = os.path.join(settings.ARCHIVE_DIR, rel_path)
+        try:
+            os.remove(abs_path)
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            logger.error(f"Não foi possível apagar o arquivo frio {abs_path}: {e}")
+            continue
+        try:
+            os.rmdir(os.path.dirname(abs_path))
+        except OSError:
+            pass  # Ainda há partes no diretório
+
+def iter_archived_rows(
+    db: Session,
+    device_id: int,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+) -> Iterator[HistoryRow]:
+    """Lê do arquivo frio as leituras da sonda no intervalo, em ordem cronológica."""
+    query = db.query(ReadingArchive).filter(ReadingArchive.device_id == device_id)
+    if start:
+        query = query.filter(ReadingArchive.last_ts >= start)
+    if end:
+        query = query.filter(ReadingArchive.first_ts <= end)
+    parts = query.order_by(ReadingArchive.first_ts.asc()).all()
+
+    if not parts:
+        return
+    _require_pyarrow()
+
+    filters = []
+    if start:
+        filters.append(("timestamp", ">=", start))
+    if end:
+        filters.append(("timestamp", "<=", end))
+
+    def read_part(part: ReadingArchive) -> Iterator[HistoryRow]:
+        table = pq.read_table(
+            os.path.join(settings.ARCHIVE_DIR, part.path),
+            columns=list(HistoryRow._fields),
+            filters=filters or None,
+        )
+        columns = [table.column(name).to_pylist() for name in HistoryRow._fields]
+        for values in zip(*columns):
+            yield HistoryRow(*values)
+
+    # Partes tardias do mesmo mês podem se sobrepor no tempo
+    yield from heapq.merge(*[read_part(p) for p in parts], key=lambda r: r.timestamp)
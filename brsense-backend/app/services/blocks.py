@@ -0,0 +1,184 @@
+# app/services/blocks.py
+import heapq
+import logging
+from datetime import date, datetime, timedelta
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+from sqlalchemy import func, and_, cast, exists, or_, Date
+from sqlalchemy.orm import Session
+
+from app.models.reading import Reading
+from app.models.reading_block import ReadingBlock
+from app.schemas.reading import HistoryRow
+from app.services.latest_state import latest_state_ids
+from app.services.tsblock import BLOCK_COLUMNS, BlockRow, decode_block, encode_block
+from app.settings import settings
+
+logger = logging.getLogger(__name__)
+
+def seal_cutoff(today: Optional[date] = None, after_days: Optional[int] = None) -> date:
+    """Dias anteriores a esta data podem ser selados em blocos."""
+    today = today or datetime.utcnow().date()
+    after = settings.BLOCK_SEAL_AFTER_DAYS if after_days is None else after_days
+    return today - timedelta(days=after)
+
+def find_sealable_days(db: Session, cutoff: date, min_rows: Optional[int] = None) -> List[Tuple[int, date, int]]:
+    """
+    Lista (device_id, dia, nº de linhas) com linhas quentes em dias fechados a
+    selar: os das sondas de alta frequência e as sobras de dias já selados
+    (ex.: o estado atual que ficou quente e depois deixou de sê-lo).
+    """
+    min_rows = settings.BLOCK_MIN_ROWS_PER_DAY if min_rows is None else min_rows
+    day_col = cast(Reading.timestamp, Date)
+    counts = (
+        db.query(Reading.device_id, day_col.label("day"), func.count().label("n"))
+        .filter(Reading.timestamp < datetime.combine(cutoff, datetime.min.time()))
+        .group_by(Reading.device_id, day_col)
+        .subquery()
+    )
+    has_block = exists().where(ReadingBlock.device_id == counts.c.device_id, ReadingBlock.day == counts.c.day)
+    rows = (
+        db.query(counts)
+        .filter(or_(counts.c.n >= min_rows, has_block))
+        .order_by(counts.c.day, counts.c.device_id)
+        .all()
+    )
+    return [(r.device_id, r.day, r.n) for r in rows]
+
+def _write_day_block(
+    db: Session,
+    device_id: int,
+    day: date,
+    rows: Sequence[BlockRow],
+    replaces: Sequence[ReadingBlock],
+    resolution: Optional[str] = None,
+) -> None:
+    """Grava `rows` como o único bloco do dia, no lugar de `replaces` (sem commit)."""
+    db.add(ReadingBlock(
+        device_id=device_id,
+        day=day,
+        row_count=len(rows),
+        first_ts=min(r[0] for r in rows),
+        last_ts=max(r[0] for r in rows),
+        payload=encode_block(rows),
+        resolution=resolution,
+    ))
+    for block in replaces:
+        db.delete(block)
+
+def _day_blocks(db: Session, device_id: int, day: date) -> List[ReadingBlock]:
+    return db.query(ReadingBlock).filter(ReadingBlock.device_id == device_id, ReadingBlock.day == day).all()
+
+def seal_day(db: Session, device_id: int, day: date) -> int:
+    """
+    Compacta as leituras de uma sonda em um dia fechado no bloco do dia (fundindo
+    com o bloco já existente, se houver) e remove as linhas de `reading`, na
+    mesma transação. Retorna o nº de linhas seladas agora.
+    O estado atual da sonda (latest_state_ids) não entra no bloco: fica quente
+    e é selado em uma execução seguinte, quando deixar de ser o estado atual.
+    """
+    start = datetime.combine(day, datetime.min.time())
+    window = and_(
+        Reading.device_id == device_id,
+        Reading.timestamp >= start,
+        Reading.timestamp < start + timedelta(days=1),
+    )
+    keep = latest_state_ids(db, [device_id])
+    rows = (
+        db.query(Reading.id, *[getattr(Reading, c) for c in BLOCK_COLUMNS])
+        .filter(window)
+        .all()
+    )
+    rows = [r for r in rows if r.id not in keep]
+    if not rows:
+        return 0
+
+    try:
+        existing = _day_blocks(db, device_id, day)
+        merged = [tuple(r)[1:] for r in rows]
+        for block in existing:
+            merged.extend(decode_block(block.payload))
+        # Linhas brutas novas: o bloco volta a ser bruto até a próxima retenção
+        _write_day_block(db, device_id, day, merged, existing)
+        # Apaga só o que entrou no bloco (leituras atrasadas ficam para o próximo)
+        db.query(Reading).filter(
+            window, Reading.id <= max(r.id for r in rows), Reading.id.notin_(keep)
+        ).delete(synchronize_session=False)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+
+    return len(rows)
+
+def _truncate(ts: datetime, unit: str) -> datetime:
+    if unit == "day":
+        return ts.replace(hour=0, minute=0, second=0, microsecond=0)
+    return ts.replace(minute=0, second=0, microsecond=0)
+
+def aggregate_rows(rows: Sequence[BlockRow], unit: str) -> List[BlockRow]:
+    """
+    Mesmo resultado da compactação SQL da retenção, em memória: por série e
+    bucket, média de umidade/temperatura, soma da chuva e último status de energia.
+    """
+    groups: Dict[Tuple[Optional[str], Optional[float], datetime], List[BlockRow]] = {}
+    for row in sorted(rows, key=lambda r: r[0]):
+        groups.setdefault((row[1], row[2], _truncate(row[0], unit)), []).append(row)
+
+    def avg(rs: List[BlockRow], i: int) -> Optional[float]:
+        values = [r[i] for r in rs if r[i] is not None]
+        return sum(values) / len(values) if values else None
+
+    def last(rs: List[BlockRow], i: int) -> Optional[int]:
+        return next((r[i] for r in reversed(rs) if r[i] is not None), None)
+
+    result = []
+    for (reading_type, depth, bucket), rs in groups.items():
+        rain = [r[5] for r in rs if r[5] is not None]
+        result.append((
+            bucket, reading_type, depth, avg(rs, 3), avg(rs, 4),
+            sum(rain) if rain else None, last(rs, 6), last(rs, 7),
+        ))
+    return result
+
+def compact_block_day(db: Session, device_id: int, day: date, unit: str) -> int:
+    """
+    Retenção dos dias selados: decodifica os blocos do dia, agrega para `unit`
+    ('hour' ou 'day') e grava um único bloco no lugar deles, em uma transação.
+    Retorna o nº de linhas do novo bloco.
+    """
+    try:
+        blocks = _day_blocks(db, device_id, day)
+        rows = [row for block in blocks for row in decode_block(block.payload)]
+        if not rows:
+            return 0
+        compacted = aggregate_rows(rows, unit)
+        _write_day_block(db, device_id, day, compacted, blocks, resolution=unit)
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    return len(compacted)
+
+def iter_block_rows(
+    db: Session,
+    device_id: int,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+) -> Iterator[HistoryRow]:
+    """Decodifica, em ordem cronológica, os blocos da sonda que cruzam o intervalo."""
+    query = db.query(ReadingBlock.payload).filter(ReadingBlock.device_id == device_id)
+    if start:
+        query = query.filter(ReadingBlock.last_ts >= start)
+    if end:
+        query = query.filter(ReadingBlock.first_ts <= end)
+    blocks = query.order_by(ReadingBlock.first_ts.asc()).all()
+
+    def read_block(payload: bytes) -> Iterator[HistoryRow]:
+        for ts, _type, depth, moisture, temperature, rain, battery, _solar in decode_block(payload):
+            if (start and ts < start) or (end and ts > end):
+                continue
+            yield HistoryRow(ts, depth, moisture, temperature, battery, rain)
+
+    # Blocos tardios do mesmo dia podem se sobrepor no tempo
+    yield from heapq.merge(*[read_block(b.payload) for b in blocks], key=lambda r: r.timestamp)
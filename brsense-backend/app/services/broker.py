@@ -0,0 +1,78 @@
+# app/services/broker.py
+import asyncio
+import logging
+import threading
+from typing import Any, Dict, List, Optional, Set
+
+from app.settings import settings
+
+logger = logging.getLogger(__name__)
+
+class Subscription:
+    """
+    Fila de eventos de um cliente SSE. A fila é limitada: se o cliente não
+    acompanha, os eventos seguintes são descartados e a assinatura fica
+    marcada como `lagged`; o stream então refaz o estado pelo banco a partir
+    do último cursor entregue, em vez de acumular memória sem limite.
+    """
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, farm_ids: Optional[Set[int]], maxsize: int):
+        self.loop = loop
+        self.farm_ids = farm_ids  # None = administrador (todas as sondas)
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize)
+        self.lagged = False
+
+    def wants(self, event: Dict[str, Any]) -> bool:
+        return self.farm_ids is None or event.get("farm_id") in self.farm_ids
+
+    def _offer(self, event: Dict[str, Any]) -> None:
+        # Roda na thread do event loop do assinante
+        if self.lagged:
+            return
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self.lagged = True
+
+class EventBroker:
+    """
+    Distribui, dentro do processo, as atualizações publicadas pela ingestão
+    (depois do commit) para os streams SSE abertos. `publish` pode ser chamado
+    de qualquer thread.
+    """
+
+    def __init__(self, queue_size: int):
+        self.queue_size = queue_size
+        self._lock = threading.Lock()
+        self._subs: Set[Subscription] = set()
+
+    def subscribe(self, farm_ids: Optional[Set[int]]) -> Subscription:
+        sub = Subscription(asyncio.get_running_loop(), farm_ids, self.queue_size)
+        with self._lock:
+            self._subs.add(sub)
+        return sub
+
+    def unsubscribe(self, sub: Subscription) -> None:
+        with self._lock:
+            self._subs.discard(sub)
+
+    def publish(self, events: List[Dict[str, Any]]) -> None:
+        if not events:
+            return
+        with self._lock:
+            subs = list(self._subs)
+        for sub in subs:
+            for event in events:
+                if sub.wants(event):
+                    try:
+                        sub.loop.call_soon_threadsafe(sub._offer, event)
+                    except RuntimeError:
+                        # Loop já encerrado: a assinatura é descartada no fim do stream
+                        break
+
+    @property
+    def subscribers(self) -> int:
+        with self._lock:
+            return len(self._subs)
+
+event_broker = EventBroker(settings.SSE_QUEUE_SIZE)
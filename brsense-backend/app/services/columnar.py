@@ -0,0 +1,63 @@
+# app/services/columnar.py
+import calendar
+from typing import Any, Dict, List, Sequence, Union
+
+from app.schemas.reading import HistoryBucket, HistoryRow
+
+# Métricas por profundidade no formato colunar (HistoryBucket adiciona os envelopes)
+_DEPTH_METRICS = ("moisture_pct", "temperature_c")
+_ENVELOPE_METRICS = ("moisture_min", "moisture_max", "temperature_min", "temperature_max")
+
+def to_columnar(rows: Sequence[Union[HistoryRow, HistoryBucket]]) -> Dict[str, Any]:
+    """
+    Converte o histórico (linhas em ordem cronológica) para o formato colunar:
+    um vetor de timestamps (ms Unix, UTC) e, para cada métrica, um vetor por
+    profundidade alinhado a ele. Chuva (soma) e bateria são por timestamp.
+
+        {"timestamps_ms": [...], "depths": [10.0, 20.0],
+         "moisture_pct": [[...10 cm...], [...20 cm...]], "temperature_c": [...],
+         "rain_cm": [...], "battery_status": [...]}
+    """
+    downsampled = bool(rows) and isinstance(rows[0], HistoryBucket)
+    metrics = _DEPTH_METRICS + (_ENVELOPE_METRICS if downsampled else ())
+
+    timestamps: List[int] = []
+    ts_index: Dict[Any, int] = {}
+    rain: List[Any] = []
+    battery: List[Any] = []
+    depths: Dict[float, Dict[str, List[Any]]] = {}
+
+    for r in rows:
+        i = ts_index.get(r.timestamp)
+        if i is None:
+            i = ts_index[r.timestamp] = len(timestamps)
+            timestamps.append(calendar.timegm(r.timestamp.timetuple()) * 1000 + r.timestamp.microsecond // 1000)
+            rain.append(None)
+            battery.append(None)
+
+        if r.rain_cm is not None:
+            rain[i] = (rain[i] or 0.0) + r.rain_cm
+        if r.battery_status is not None:
+            battery[i] = r.battery_status
+
+        if r.depth_cm is None:
+            continue
+        series = depths.get(r.depth_cm)
+        if series is None:
+            series = depths[r.depth_cm] = {m: [] for m in metrics}
+        for m in metrics:
+            values = series[m]
+            if len(values) <= i:
+                values.extend([None] * (i + 1 - len(values)))
+            value = getattr(r, m)
+            if value is not None:
+                values[i] = value
+
+    n = len(timestamps)
+    ordered = sorted(depths)
+    payload: Dict[str, Any] = {"timestamps_ms": timestamps, "depths": ordered}
+    for m in metrics:
+        payload[m] = [depths[d][m] + [None] * (n - len(depths[d][m])) for d in ordered]
+    payload["rain_cm"] = rain
+    payload["battery_status"] = battery
+    return payload
@@ -0,0 +1,117 @@
+# app/services/dashboard_cache.py
+import threading
+from collections import OrderedDict
+from typing import Dict, Hashable, Iterable, Optional, Set, Tuple
+
+from app.settings import settings
+
+# Escopo dos administradores (veem todas as sondas, então compartilham as entradas)
+ADMIN_SCOPE = None
+
+class DashboardCache:
+    """
+    Cache LRU, em memória, da resposta já serializada de GET /api/devices
+    (e, com outras chaves, do perfil e do mapa de calor).
+
+    Em /api/devices a chave é (escopo, cursor, skip, limit, frozenset(projeção)),
+    onde o escopo é o id do usuário ou ADMIN_SCOPE. Cada entrada guarda o ETag
+    com que foi gerada e só é servida se o ETag atual for o mesmo. Como o ETag
+    vem de updated_at/last_seen_at e o last_seen é gravado em lote (ver
+    LastSeenTracker), um uplink recebido por outro processo pode levar até
+    LAST_SEEN_FLUSH_SECONDS para invalidar a entrada aqui. No mesmo processo,
+    a invalidação explícita, por sonda ou por escopo, libera a entrada na hora.
+
+    O limite é o total de bytes das respostas guardadas (max_bytes); uma
+    resposta maior que o limite não é guardada.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.total_bytes = 0
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[Hashable, Tuple[str, bytes, frozenset]]" = OrderedDict()
+        self._by_device: Dict[int, Set[Hashable]] = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, key: Hashable, etag: str) -> Optional[bytes]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] != etag:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key: Hashable, etag: str, body: bytes, device_ids: Iterable[int]) -> None:
+        if len(body) > self.max_bytes:
+            return
+        device_ids = frozenset(device_ids)
+        with self._lock:
+            self._drop(key)
+            self._entries[key] = (etag, body, device_ids)
+            self.total_bytes += len(body)
+            for device_id in device_ids:
+                self._by_device.setdefault(device_id, set()).add(key)
+            while self.total_bytes > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._drop(oldest)
+                self.evictions += 1
+
+    def invalidate_devices(self, device_ids: Iterable[int]) -> None:
+        """Remove as páginas que contêm alguma das sondas (ingestão, edição, exclusão)."""
+        with self._lock:
+            keys = set()
+            for device_id in device_ids:
+                keys |= self._by_device.get(device_id, set())
+            for key in keys:
+                self._drop(key)
+            self.invalidations += len(keys)
+
+    def invalidate_scopes(self, user_ids: Iterable[Optional[int]]) -> None:
+        """
+        Remove todas as páginas dos usuários informados e dos administradores.
+        Usado quando o conjunto de sondas muda (criação, troca de fazenda).
+        """
+        scopes = set(user_ids) | {ADMIN_SCOPE}
+        with self._lock:
+            keys = [k for k in self._entries if k[0] in scopes]
+            for key in keys:
+                self._drop(key)
+            self.invalidations += len(keys)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._by_device.clear()
+            self.total_bytes = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self.total_bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
+
+    def _drop(self, key: Hashable) -> None:
+        # Chamado com o lock já adquirido
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        self.total_bytes -= len(entry[1])
+        for device_id in entry[2]:
+            keys = self._by_device.get(device_id)
+            if keys:
+                keys.discard(key)
+                if not keys:
+                    del self._by_device[device_id]
+
+dashboard_cache = DashboardCache(settings.DASHBOARD_CACHE_MAX_BYTES)
@@ -0,0 +1,183 @@
+# app/services/device_state.py
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Sequence, Set
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from app.models.device import Device
+from app.models.reading import Reading
+from app.services.rain import RAIN_WINDOWS, get_rain_windows
+from app.services.history import bucket_expr
+from app.services.latest_state import latest_battery_query, latest_depth_query
+
+# Campos do DeviceReadingSchema buscados diretamente do banco
+_READING_COLUMNS = (
+    Reading.id,
+    Reading.device_id,
+    Reading.moisture_pct,
+    Reading.depth_cm,
+    Reading.temperature_c,
+    Reading.timestamp,
+    Reading.battery_status,
+    Reading.solar_status,
+    Reading.rain_cm,
+)
+
+def _reading_dict(row) -> Dict[str, Any]:
+    return {
+        "moisture_pct": row.moisture_pct,
+        "depth_cm": row.depth_cm,
+        "temperature_c": row.temperature_c,
+        "timestamp": row.timestamp,
+        "battery_status": row.battery_status,
+        "solar_status": row.solar_status,
+        "rain_cm": row.rain_cm,
+    }
+
+def get_latest_readings(db: Session, device_ids: List[int]) -> Dict[int, List[Dict[str, Any]]]:
+    """
+    Estado atual de várias sondas em duas consultas (independente da quantidade):
+    a última leitura de umidade de cada profundidade e a última bateria.
+    """
+    latest: Dict[int, List[Dict[str, Any]]] = {device_id: [] for device_id in device_ids}
+    if not device_ids:
+        return latest
+
+    # 1. Última leitura de CADA profundidade que tenha umidade válida (mantém as cores do mapa)
+    depth_rows = latest_depth_query(db, device_ids, *_READING_COLUMNS).all()
+
+    # 2. Bateria mais recente de cada sonda
+    battery_rows = latest_battery_query(db, device_ids, *_READING_COLUMNS).all()
+
+    seen_ids = set()
+    for row in depth_rows:
+        latest[row.device_id].append(_reading_dict(row))
+        seen_ids.add(row.id)
+    for row in battery_rows:
+        if row.id not in seen_ids:
+            latest[row.device_id].append(_reading_dict(row))
+
+    return latest
+
+def device_dict(dev: Device) -> Dict[str, Any]:
+    """Colunas da sonda no formato do DeviceRead (sem chuva e leituras)."""
+    return {col.name: getattr(dev, col.name) for col in Device.__table__.columns}
+
+# Projeção (fields=) do DeviceRead: colunas da sonda, janelas de chuva e leituras
+DEVICE_COLUMN_FIELDS = tuple(col.name for col in Device.__table__.columns)
+FIELD_ALIASES = {
+    "rain": tuple(RAIN_WINDOWS),
+    "config": ("config_moisture_v1", "config_moisture_v2", "config_moisture_v3", "config_gradient_intensity"),
+}
+
+def parse_device_fields(value: Optional[str]) -> Optional[Set[str]]:
+    """
+    Converte 'esn,name,latitude,rain' no conjunto de campos pedidos (com os
+    apelidos 'rain' e 'config' expandidos). `id` sempre vem. None = tudo.
+    Levanta ValueError para campos desconhecidos.
+    """
+    if not value:
+        return None
+    fields = {"id"}
+    valid = set(DEVICE_COLUMN_FIELDS) | set(RAIN_WINDOWS) | {"readings"}
+    for name in (f.strip() for f in value.split(",")):
+        if not name:
+            continue
+        if name in FIELD_ALIASES:
+            fields.update(FIELD_ALIASES[name])
+        elif name in valid:
+            fields.add(name)
+        else:
+            raise ValueError(f"Campo desconhecido em fields: '{name}'")
+    return fields
+
+def projected_columns(fields: Set[str]) -> List[Any]:
+    """Colunas de `device` necessárias para a projeção (id primeiro)."""
+    return [getattr(Device, name) for name in DEVICE_COLUMN_FIELDS if name in fields]
+
+def build_projected_payloads(db: Session, rows: Sequence[Any], fields: Set[str]) -> List[Dict[str, Any]]:
+    """
+    Como build_device_payloads, mas só com os campos pedidos: a consulta de
+    chuva só roda se alguma janela foi pedida, e as de leituras só com 'readings'.
+    `rows` são as linhas de projected_columns (com `id`).
+    """
+    columns = [name for name in DEVICE_COLUMN_FIELDS if name in fields]
+    payloads = [{name: getattr(row, name) for name in columns} for row in rows]
+    device_ids = [p["id"] for p in payloads]
+
+    rain_fields = [name for name in RAIN_WINDOWS if name in fields]
+    if rain_fields:
+        rain_map = get_rain_windows(db, device_ids)
+        for data in payloads:
+            metrics = rain_map.get(data["id"], {})
+            for name in rain_fields:
+                data[name] = metrics.get(name, 0.0)
+
+    if "readings" in fields:
+        latest = get_latest_readings(db, device_ids)
+        for data in payloads:
+            data["readings"] = latest[data["id"]]
+    return payloads
+
+def build_device_payloads(db: Session, devices: List[Device]) -> List[Dict[str, Any]]:
+    """
+    Monta a resposta do DeviceRead para uma página de sondas com um número
+    fixo de consultas: chuva (livro-razão) e estado atual em lote.
+    """
+    device_ids = [dev.id for dev in devices]
+    rain_map = get_rain_windows(db, device_ids)
+    latest = get_latest_readings(db, device_ids)
+
+    result = []
+    for dev in devices:
+        data = device_dict(dev)
+        metrics = rain_map.get(dev.id, {})
+        for name in RAIN_WINDOWS:
+            data[name] = metrics.get(name, 0.0)
+        data["readings"] = latest[dev.id]
+        result.append(data)
+    return result
+
+def get_moisture_sparklines(
+    db: Session,
+    device_ids: List[int],
+    start: datetime,
+    bucket_s: int,
+    points: int,
+) -> Dict[int, List[Dict[str, Any]]]:
+    """
+    Série curta de umidade média por profundidade para várias sondas, em uma
+    única consulta agrupada. Cada série tem exatamente `points` valores
+    alinhados a partir de `start` (None onde não houve leitura).
+
+    Lê só a tabela quente: a janela de um sparkline é bem menor que o prazo
+    para selar blocos ou arquivar meses.
+    """
+    series: Dict[int, Dict[float, List[Any]]] = {device_id: {} for device_id in device_ids}
+    if not device_ids:
+        return {}
+
+    bucket = bucket_expr(bucket_s)
+    rows = (
+        db.query(Reading.device_id, Reading.depth_cm, bucket, func.avg(Reading.moisture_pct))
+        .filter(
+            Reading.device_id.in_(device_ids),
+            Reading.depth_cm.isnot(None),
+            Reading.moisture_pct.isnot(None),
+            Reading.timestamp >= start,
+        )
+        .group_by(Reading.device_id, Reading.depth_cm, bucket)
+        .all()
+    )
+
+    for device_id, depth, bucket_ts, avg in rows:
+        index = int((bucket_ts - start).total_seconds() // bucket_s)
+        if 0 <= index < points:
+            values = series[device_id].setdefault(depth, [None] * points)
+            values[index] = round(float(avg), 2)
+
+    return {
+        device_id: [{"depth_cm": depth, "values": values} for depth, values in sorted(by_depth.items())]
+        for device_id, by_depth in series.items()
+    }
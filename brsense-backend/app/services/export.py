@@ -0,0 +1,44 @@
+# app/services/export.py
+import csv
+import io
+import json
+from typing import Iterable, Iterator
+
+from app.schemas.reading import HistoryRow
+
+# Linhas acumuladas antes de enviar um pedaço da resposta
+EXPORT_CHUNK_ROWS = 500
+
+def _cell(value) -> str:
+    return "" if value is None else str(value)
+
+def iter_csv(rows: Iterable[HistoryRow]) -> Iterator[str]:
+    """CSV em pedaços: o cabeçalho sai imediatamente, depois blocos de EXPORT_CHUNK_ROWS linhas."""
+    yield ",".join(HistoryRow._fields) + "\r\n"
+
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    pending = 0
+    for r in rows:
+        writer.writerow([r.timestamp.isoformat(), *map(_cell, r[1:])])
+        pending += 1
+        if pending >= EXPORT_CHUNK_ROWS:
+            yield buf.getvalue()
+            buf.seek(0)
+            buf.truncate()
+            pending = 0
+    if pending:
+        yield buf.getvalue()
+
+def iter_ndjson(rows: Iterable[HistoryRow]) -> Iterator[str]:
+    """Um objeto JSON por linha, enviado em blocos de EXPORT_CHUNK_ROWS linhas."""
+    lines = []
+    for r in rows:
+        item = r._asdict()
+        item["timestamp"] = r.timestamp.isoformat()
+        lines.append(json.dumps(item, separators=(",", ":")))
+        if len(lines) >= EXPORT_CHUNK_ROWS:
+            yield "\n".join(lines) + "\n"
+            lines = []
+    if lines:
+        yield "\n".join(lines) + "\n"
@@ -0,0 +1,203 @@
+# app/services/export_jobs.py
+import logging
+import os
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor, as_completed, wait
+from datetime import datetime, timedelta
+from itertools import islice
+from typing import Dict, List, Optional
+
+from app.db.session import SessionLocal
+from app.models.device import Device
+from app.schemas.reading import HistoryRow
+from app.services.history import iter_device_history
+from app.settings import settings
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # pragma: no cover - pyarrow faz parte do requirements.txt
+    pa = None
+    pq = None
+
+logger = logging.getLogger(__name__)
+
+# Colunas de metadados da sonda repetidas em cada linha do arquivo
+_DEVICE_COLUMNS = ("device_id", "esn", "device_name", "cultura", "latitude", "longitude")
+
+def _export_schema():
+    return pa.schema([
+        ("device_id", pa.int32()),
+        ("esn", pa.dictionary(pa.int32(), pa.string())),
+        ("device_name", pa.dictionary(pa.int32(), pa.string())),
+        ("cultura", pa.dictionary(pa.int32(), pa.string())),
+        ("latitude", pa.float64()),
+        ("longitude", pa.float64()),
+        ("timestamp", pa.timestamp("us")),
+        ("depth_cm", pa.float64()),
+        ("moisture_pct", pa.float64()),
+        ("temperature_c", pa.float64()),
+        ("battery_status", pa.int32()),
+        ("rain_cm", pa.float64()),
+    ])
+
+class ExportJob:
+    """Estado de uma exportação em segundo plano (mantido em memória pelo processo)."""
+
+    def __init__(self, farm_id: int, user_id: int, start_date: Optional[datetime], end_date: Optional[datetime]):
+        self.id = uuid.uuid4().hex
+        self.farm_id = farm_id
+        self.user_id = user_id
+        self.start_date = start_date
+        self.end_date = end_date
+        self.status = "pending"
+        self.created_at = datetime.utcnow()
+        self.finished_at: Optional[datetime] = None
+        self.devices_total = 0
+        self.devices_done = 0
+        self.row_count = 0
+        self.error: Optional[str] = None
+        self.path = os.path.join(settings.EXPORT_DIR, f"farm{farm_id}_{self.id}.parquet")
+
+class ExportJobManager:
+    """
+    Executa exportações de fazenda inteira fora dos workers da API.
+
+    Cada lote de uma sonda é lido com uma sessão curta (a conexão volta ao
+    pool antes da gravação), em paralelo limitado por EXPORT_JOB_PARALLELISM,
+    e o resultado vai para um único Parquet (zstd) gravado incrementalmente:
+    cada leitor segura um lote de EXPORT_BATCH_ROWS linhas por vez, gravado
+    assim que fica pronto.
+    """
+
+    def __init__(self, workers: int, parallelism: int):
+        self._jobs: Dict[str, ExportJob] = {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="export-job")
+        self._readers = ThreadPoolExecutor(max_workers=parallelism, thread_name_prefix="export-read")
+
+    def submit(self, farm_id: int, user_id: int, start_date: Optional[datetime], end_date: Optional[datetime]) -> ExportJob:
+        if pa is None:
+            raise RuntimeError("pyarrow não está instalado: exportação em Parquet indisponível.")
+        self._purge_expired()
+        job = ExportJob(farm_id, user_id, start_date, end_date)
+        with self._lock:
+            self._jobs[job.id] = job
+        self._executor.submit(self._run, job)
+        return job
+
+    def get(self, job_id: str) -> Optional[ExportJob]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        self._readers.shutdown(wait=False, cancel_futures=True)
+
+    def _purge_expired(self) -> None:
+        limit = datetime.utcnow() - timedelta(hours=settings.EXPORT_JOB_TTL_HOURS)
+        with self._lock:
+            expired = [j for j in self._jobs.values() if j.finished_at and j.finished_at < limit]
+            for job in expired:
+                del self._jobs[job.id]
+        for job in expired:
+            if os.path.exists(job.path):
+                os.remove(job.path)
+
+    def _list_devices(self, farm_id: int) -> List[dict]:
+        db = SessionLocal()
+        try:
+            rows = (
+                db.query(Device.id, Device.esn, Device.name, Device.cultura, Device.latitude, Device.longitude)
+                .filter(Device.farm_id == farm_id)
+                .order_by(Device.id)
+                .all()
+            )
+            return [dict(zip(_DEVICE_COLUMNS, r)) for r in rows]
+        finally:
+            db.close()
+
+    def _read_batch(self, device_id: int, start: Optional[datetime], end: Optional[datetime]) -> List[HistoryRow]:
+        """
+        Um lote de EXPORT_BATCH_ROWS linhas a partir de `start`, lido em uma
+        sessão própria, fechada antes de devolver o lote. As linhas do mesmo
+        instante da última entram todas no lote, para que o próximo comece
+        logo depois dele sem repetir nem perder leituras (o arquivo frio não
+        tem id para desempate).
+        """
+        db = SessionLocal()
+        try:
+            rows = iter_device_history(db, device_id, start, end)
+            batch = list(islice(rows, settings.EXPORT_BATCH_ROWS))
+            if len(batch) == settings.EXPORT_BATCH_ROWS:
+                last_ts = batch[-1].timestamp
+                for row in rows:
+                    if row.timestamp != last_ts:
+                        break
+                    batch.append(row)
+            return batch
+        finally:
+            db.close()
+
+    def _export_device(self, job: ExportJob, device: dict, writer, write_lock: threading.Lock) -> None:
+        """
+        Lê o histórico de uma sonda em lotes de EXPORT_BATCH_ROWS, cada um com
+        sua sessão, e grava cada lote (um row group) antes de ler o próximo.
+        Nenhuma conexão fica presa enquanto o lote espera pelo write_lock.
+        """
+        schema = _export_schema()
+        start = job.start_date
+        while True:
+            batch = self._read_batch(device["device_id"], start, job.end_date)
+            if not batch:
+                break
+            done = len(batch) < settings.EXPORT_BATCH_ROWS
+            start = batch[-1].timestamp + timedelta(microseconds=1)
+            columns = {name: [r[i] for r in batch] for i, name in enumerate(HistoryRow._fields)}
+            for name in _DEVICE_COLUMNS:
+                columns[name] = [device[name]] * len(batch)
+            table = pa.Table.from_pydict(columns, schema=schema)
+            del batch, columns
+            # O ParquetWriter não é thread-safe: um lote por vez
+            with write_lock:
+                writer.write_table(table)
+                job.row_count += table.num_rows
+            if done:
+                break
+        with write_lock:
+            job.devices_done += 1
+
+    def _run(self, job: ExportJob) -> None:
+        job.status = "running"
+        tmp_path = job.path + ".tmp"
+        try:
+            devices = self._list_devices(job.farm_id)
+            job.devices_total = len(devices)
+            os.makedirs(settings.EXPORT_DIR, exist_ok=True)
+
+            write_lock = threading.Lock()
+            with pq.ParquetWriter(tmp_path, _export_schema(), compression="zstd") as writer:
+                futures = [self._readers.submit(self._export_device, job, d, writer, write_lock) for d in devices]
+                try:
+                    for future in as_completed(futures):
+                        future.result()
+                except Exception:
+                    # Ninguém pode estar gravando quando o writer for fechado
+                    for future in futures:
+                        future.cancel()
+                    wait(futures)
+                    raise
+
+            os.replace(tmp_path, job.path)
+            job.status = "done"
+        except Exception as e:
+            logger.error(f"Erro na exportação {job.id} da fazenda {job.farm_id}: {e}")
+            job.status = "failed"
+            job.error = str(e)
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        finally:
+            job.finished_at = datetime.utcnow()
+
+export_jobs = ExportJobManager(settings.EXPORT_JOB_WORKERS, settings.EXPORT_JOB_PARALLELISM)
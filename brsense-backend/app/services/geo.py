@@ -0,0 +1,141 @@
+# app/services/geo.py
+import math
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, NamedTuple, Optional
+
+from sqlalchemy import and_, func, or_, select
+from sqlalchemy.orm import Session
+
+from app.models.device import Device
+from app.models.farm import Farm
+from app.models.reading import Reading
+from app.settings import settings
+
+class BBox(NamedTuple):
+    west: float
+    south: float
+    east: float
+    north: float
+
+def _in_box(west: float, south: float, east: float, north: float):
+    # Mesma expressão do índice ix_device_location_gist (point(longitude, latitude))
+    return func.point(Device.longitude, Device.latitude).op("<@")(
+        func.box(func.point(west, south), func.point(east, north))
+    )
+
+def bbox_filter(bbox: BBox):
+    """Filtro do viewport; se cruzar o antimeridiano (west > east), vira duas caixas."""
+    located = and_(Device.latitude.isnot(None), Device.longitude.isnot(None))
+    if bbox.west <= bbox.east:
+        return and_(located, _in_box(bbox.west, bbox.south, bbox.east, bbox.north))
+    return and_(located, or_(
+        _in_box(bbox.west, bbox.south, 180.0, bbox.north),
+        _in_box(-180.0, bbox.south, bbox.east, bbox.north),
+    ))
+
+def cell_degrees(zoom: int) -> float:
+    """Tamanho (graus) da célula de agrupamento para ~MAP_CLUSTER_CELL_PX pixels no zoom."""
+    return 360.0 * settings.MAP_CLUSTER_CELL_PX / (256 * 2 ** zoom)
+
+def _moisture_by_device(device_ids, since: datetime):
+    """
+    Umidade média atual de cada sonda: média da última leitura de cada
+    profundidade dentro da janela `since` (sondas caladas ficam sem valor).
+    """
+    latest = (
+        select(Reading.device_id, Reading.moisture_pct)
+        .where(
+            Reading.device_id.in_(device_ids),
+            Reading.moisture_pct.isnot(None),
+            Reading.timestamp >= since,
+        )
+        .distinct(Reading.device_id, Reading.depth_cm)
+        .order_by(Reading.device_id, Reading.depth_cm, Reading.timestamp.desc())
+        .subquery()
+    )
+    return (
+        select(latest.c.device_id, func.avg(latest.c.moisture_pct).label("moisture"))
+        .group_by(latest.c.device_id)
+        .subquery()
+    )
+
+def query_map_markers(
+    db: Session,
+    bbox: BBox,
+    zoom: int,
+    owner_id: Optional[int] = None,
+) -> Dict[str, Any]:
+    """
+    Sondas do viewport em uma única consulta (índice GiST). Abaixo de
+    MAP_CLUSTER_MAX_ZOOM, agrupa em grade no próprio Postgres e devolve por
+    célula a contagem, o centróide e a umidade média; células com uma só
+    sonda saem como marcador individual.
+    """
+    visible = select(Device.id).where(bbox_filter(bbox))
+    if owner_id is not None:
+        visible = visible.join(Farm, Device.farm_id == Farm.id).where(Farm.user_id == owner_id)
+
+    since = datetime.utcnow() - timedelta(hours=settings.MAP_MOISTURE_WINDOW_HOURS)
+    moisture = _moisture_by_device(visible.scalar_subquery(), since)
+    base = (
+        select(Device.id, Device.esn, Device.name, Device.farm_id, Device.latitude, Device.longitude, moisture.c.moisture)
+        .outerjoin(moisture, moisture.c.device_id == Device.id)
+        .where(Device.id.in_(visible.scalar_subquery()))
+        .subquery()
+    )
+
+    if zoom >= settings.MAP_CLUSTER_MAX_ZOOM:
+        rows = db.execute(select(base).order_by(base.c.id).limit(settings.MAP_MAX_MARKERS + 1)).all()
+        truncated = len(rows) > settings.MAP_MAX_MARKERS
+        return {
+            "clustered": False,
+            "cell_degrees": None,
+            "truncated": truncated,
+            "markers": [_device_marker(r) for r in rows[:settings.MAP_MAX_MARKERS]],
+        }
+
+    cell = cell_degrees(zoom)
+    cx = func.floor(base.c.longitude / cell).label("cx")
+    cy = func.floor(base.c.latitude / cell).label("cy")
+    rows = db.execute(
+        select(
+            func.count().label("count"),
+            func.avg(base.c.latitude).label("latitude"),
+            func.avg(base.c.longitude).label("longitude"),
+            func.avg(base.c.moisture).label("moisture"),
+            func.min(base.c.id).label("id"),
+            func.min(base.c.esn).label("esn"),
+            func.min(base.c.name).label("name"),
+            func.min(base.c.farm_id).label("farm_id"),
+        ).group_by(cx, cy)
+    ).all()
+
+    markers = []
+    for r in rows:
+        if r.count == 1:
+            markers.append(_device_marker(r))
+        else:
+            markers.append({
+                "type": "cluster",
+                "latitude": r.latitude,
+                "longitude": r.longitude,
+                "count": r.count,
+                "mean_moisture_pct": _round(r.moisture),
+            })
+    return {"clustered": True, "cell_degrees": cell, "truncated": False, "markers": markers}
+
+def _round(value: Optional[float]) -> Optional[float]:
+    return None if value is None or math.isnan(value) else round(float(value), 2)
+
+def _device_marker(row) -> Dict[str, Any]:
+    return {
+        "type": "device",
+        "latitude": row.latitude,
+        "longitude": row.longitude,
+        "count": 1,
+        "mean_moisture_pct": _round(row.moisture),
+        "device_id": row.id,
+        "esn": row.esn,
+        "name": row.name,
+        "farm_id": row.farm_id,
+    }
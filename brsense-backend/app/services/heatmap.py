@@ -0,0 +1,168 @@
+# app/services/heatmap.py
+import base64
+import math
+import zlib
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - numpy faz parte do requirements.txt
+    np = None
+
+from sqlalchemy.orm import Session
+
+from app.models.device import Device
+from app.models.reading import Reading
+from app.services.dashboard_cache import DashboardCache
+from app.settings import settings
+
+# Rasters serializados por (fazenda, profundidade, tamanho, potência); o ETag
+# das sondas da fazenda é a versão e a ingestão descarta as entradas delas
+heatmap_cache = DashboardCache(settings.HEATMAP_CACHE_MAX_BYTES)
+
+# Valores em centésimos de ponto percentual; 65535 fica reservado para "sem dado"
+GRID_SCALE = 0.01
+GRID_NODATA = 65535
+
+# Extensão mínima (graus) do raster quando as sondas estão (quase) no mesmo ponto
+_MIN_SPAN_DEG = 0.005
+
+def farm_probes(db: Session, farm_id: int, depth_cm: float, now: Optional[datetime] = None) -> List[Dict[str, Any]]:
+    """
+    Sondas localizadas da fazenda com a última umidade da profundidade dentro
+    da janela MAP_MOISTURE_WINDOW_HOURS (None se a sonda está calada). A janela
+    termina na hora cheia de `now`, então o resultado só muda na virada da hora
+    ou com um uplink novo (o que permite versioná-lo pela hora).
+    """
+    hour = (now or datetime.utcnow()).replace(minute=0, second=0, microsecond=0)
+    since = hour - timedelta(hours=settings.MAP_MOISTURE_WINDOW_HOURS)
+    located = (
+        db.query(Device.id)
+        .filter(Device.farm_id == farm_id, Device.latitude.isnot(None), Device.longitude.isnot(None))
+    )
+    latest = (
+        db.query(Reading.device_id, Reading.moisture_pct)
+        .filter(
+            Reading.device_id.in_(located.scalar_subquery()),
+            Reading.depth_cm == depth_cm,
+            Reading.moisture_pct.isnot(None),
+            Reading.timestamp >= since,
+        )
+        .distinct(Reading.device_id)
+        .order_by(Reading.device_id, Reading.timestamp.desc())
+        .subquery()
+    )
+    rows = (
+        db.query(Device.id, Device.esn, Device.latitude, Device.longitude, latest.c.moisture_pct)
+        .outerjoin(latest, latest.c.device_id == Device.id)
+        .filter(Device.id.in_(located.scalar_subquery()))
+        .order_by(Device.id)
+        .all()
+    )
+    return [
+        {"device_id": r.id, "esn": r.esn, "latitude": r.latitude, "longitude": r.longitude, "moisture_pct": r.moisture_pct}
+        for r in rows
+    ]
+
+def _bounds(lats, lons):
+    """Caixa das sondas com margem de HEATMAP_PADDING (e extensão mínima)."""
+    south, north = float(lats.min()), float(lats.max())
+    west, east = float(lons.min()), float(lons.max())
+    pad_lat = max((north - south) * settings.HEATMAP_PADDING, (_MIN_SPAN_DEG - (north - south)) / 2, 0.0)
+    pad_lon = max((east - west) * settings.HEATMAP_PADDING, (_MIN_SPAN_DEG - (east - west)) / 2, 0.0)
+    return west - pad_lon, south - pad_lat, east + pad_lon, north + pad_lat
+
+def idw_grid(lats, lons, values, bounds, width: int, height: int, power: float):
+    """
+    Interpolação IDW (inverso da distância) no centro de cada célula, em
+    NumPy. A matriz de distâncias células × sondas é montada em faixas de
+    linhas (HEATMAP_CHUNK_CELLS elementos por vez), então a memória não cresce
+    com o tamanho da fazenda. A longitude é encolhida por cos(latitude) para
+    as distâncias valerem em metros, não em graus. Linhas de norte para sul.
+    """
+    west, south, east, north = bounds
+    kx = math.cos(math.radians((south + north) / 2))
+    xs = west + (np.arange(width) + 0.5) * (east - west) / width
+    ys = north - (np.arange(height) + 0.5) * (north - south) / height
+
+    dx = (xs[:, None] - lons[None, :]) * kx  # width × sondas, reaproveitado em todas as linhas
+    dx2 = dx * dx
+    rows_per_chunk = max(1, settings.HEATMAP_CHUNK_CELLS // (width * len(values)))
+
+    grid = np.empty((height, width), dtype=np.float64)
+    for top in range(0, height, rows_per_chunk):
+        dy = ys[top:top + rows_per_chunk, None] - lats[None, :]  # linhas × sondas
+        d2 = dx2[None, :, :] + (dy * dy)[:, None, :]  # linhas × width × sondas
+        exact = d2 == 0
+        with np.errstate(divide="ignore"):
+            np.power(d2, -power / 2, out=d2)
+        hit = exact.any(axis=-1)
+        if hit.any():
+            # Célula exatamente sobre uma sonda recebe o valor dela
+            d2[hit] = exact[hit]
+        grid[top:top + rows_per_chunk] = (d2 @ values) / d2.sum(axis=-1)
+    return grid
+
+def encode_grid(grid) -> str:
+    """uint16 little-endian (centésimos de %), zlib, base64."""
+    scaled = np.where(np.isnan(grid), GRID_NODATA, np.clip(np.round(grid / GRID_SCALE), 0, GRID_NODATA - 1))
+    raw = scaled.astype("<u2").tobytes()
+    return base64.b64encode(zlib.compress(raw, 6)).decode("ascii")
+
+def build_farm_heatmap(
+    db: Session,
+    farm_id: int,
+    depth_cm: float,
+    size: int,
+    power: float,
+    now: Optional[datetime] = None,
+) -> Dict[str, Any]:
+    """
+    Raster de umidade da fazenda na profundidade: `size` células no lado mais
+    longo (o outro segue a proporção da área). Sem sondas com leitura, `data`
+    sai None.
+    """
+    if np is None:
+        raise RuntimeError("numpy não está instalado: mapa de calor indisponível.")
+    probes = farm_probes(db, farm_id, depth_cm, now)
+    result = {
+        "farm_id": farm_id,
+        "depth_cm": depth_cm,
+        "generated_at": datetime.utcnow(),
+        "width": 0,
+        "height": 0,
+        "bounds": None,
+        "scale": GRID_SCALE,
+        "nodata": GRID_NODATA,
+        "encoding": "uint16le+zlib+base64",
+        "data": None,
+        "probes": [{k: p[k] for k in ("esn", "latitude", "longitude", "moisture_pct")} for p in probes],
+    }
+    if not probes:
+        return result
+
+    # O enquadramento usa todas as sondas localizadas, para não mudar quando uma se cala
+    bounds = _bounds(
+        np.array([p["latitude"] for p in probes], dtype=np.float64),
+        np.array([p["longitude"] for p in probes], dtype=np.float64),
+    )
+    west, south, east, north = bounds
+    ground_w = (east - west) * math.cos(math.radians((south + north) / 2))
+    ground_h = north - south
+    if ground_w >= ground_h:
+        width, height = size, max(1, round(size * ground_h / ground_w))
+    else:
+        width, height = max(1, round(size * ground_w / ground_h)), size
+    result.update(width=width, height=height, bounds=list(bounds))
+
+    active = [p for p in probes if p["moisture_pct"] is not None]
+    if active:
+        grid = idw_grid(
+            np.array([p["latitude"] for p in active], dtype=np.float64),
+            np.array([p["longitude"] for p in active], dtype=np.float64),
+            np.array([p["moisture_pct"] for p in active], dtype=np.float64),
+            bounds, width, height, power,
+        )
+        result["data"] = encode_grid(grid)
+    return result
@@ -0,0 +1,414 @@
+# app/services/history.py
+import heapq
+import math
+import re
+from datetime import datetime, timedelta
+from itertools import groupby, islice
+from typing import Dict, Iterator, List, Optional, Set, Tuple
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from app.models.reading import Reading
+from app.models.reading_archive import ReadingArchive
+from app.models.reading_block import ReadingBlock
+from app.schemas.reading import HistoryBucket, HistoryRow
+from app.services.archive import iter_archived_rows
+from app.services.blocks import iter_block_rows
+
+# Sem intervalo informado, o histórico é limitado a esta quantidade de pontos
+DEFAULT_HISTORY_LIMIT = 10000
+
+# Tamanhos de bucket (segundos) escolhidos automaticamente a partir de max_points
+BUCKET_STEPS = [60, 300, 900, 1800, 3600, 3 * 3600, 6 * 3600, 12 * 3600, 86400, 7 * 86400]
+
+_RESOLUTION_RE = re.compile(r"^(\d+)([smhd])$")
+_UNIT_SECONDS = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+
+def _naive(ts: Optional[datetime]) -> Optional[datetime]:
+    if ts and ts.tzinfo:
+        return ts.replace(tzinfo=None)
+    return ts
+
+def _matches(row: HistoryRow, depth_cm: Optional[float], reading_type: Optional[str]) -> bool:
+    """Filtro de profundidade/tipo para as camadas frias (mesma regra do ingest: 'H' tem umidade)."""
+    if depth_cm is not None and row.depth_cm != depth_cm:
+        return False
+    if reading_type == "H" and row.moisture_pct is None:
+        return False
+    if reading_type == "T" and row.temperature_c is None:
+        return False
+    return True
+
+def iter_hot_rows(
+    db: Session,
+    device_id: int,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    depth_cm: Optional[float] = None,
+    reading_type: Optional[str] = None,
+) -> Iterator[HistoryRow]:
+    """Leituras ainda no Postgres, em ordem cronológica (cursor no servidor, em lotes)."""
+    query = db.query(
+        Reading.timestamp,
+        Reading.depth_cm,
+        Reading.moisture_pct,
+        Reading.temperature_c,
+        Reading.battery_status,
+        Reading.rain_cm
+    ).filter(Reading.device_id == device_id)
+
+    if start:
+        query = query.filter(Reading.timestamp >= start)
+    if end:
+        query = query.filter(Reading.timestamp <= end)
+    if depth_cm is not None:
+        query = query.filter(Reading.depth_cm == depth_cm)
+    if reading_type == "H":
+        query = query.filter(Reading.moisture_pct.isnot(None))
+    elif reading_type == "T":
+        query = query.filter(Reading.temperature_c.isnot(None))
+
+    for r in query.order_by(Reading.timestamp.asc()).yield_per(2000):
+        yield HistoryRow(*r)
+
+def iter_device_history(
+    db: Session,
+    device_id: int,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    depth_cm: Optional[float] = None,
+    reading_type: Optional[str] = None,
+) -> Iterator[HistoryRow]:
+    """
+    Junta, em ordem cronológica, o arquivo frio (Parquet), os blocos diários
+    compactados e as leituras quentes. Quem chama não precisa saber em que
+    camada cada período está guardado. `reading_type` aceita 'H' (umidade)
+    ou 'T' (temperatura).
+    """
+    start, end = _naive(start), _naive(end)
+    cold = _iter_cold_rows(db, device_id, start, end)
+    if depth_cm is not None or reading_type:
+        cold = (r for r in cold if _matches(r, depth_cm, reading_type))
+    return heapq.merge(
+        cold,
+        iter_hot_rows(db, device_id, start, end, depth_cm, reading_type),
+        key=lambda r: r.timestamp,
+    )
+
+def _iter_cold_rows(
+    db: Session,
+    device_id: int,
+    start: Optional[datetime],
+    end: Optional[datetime],
+) -> Iterator[HistoryRow]:
+    """Camadas fora da tabela `reading` (arquivo Parquet e blocos diários)."""
+    return heapq.merge(
+        iter_archived_rows(db, device_id, start, end),
+        iter_block_rows(db, device_id, start, end),
+        key=lambda r: r.timestamp,
+    )
+
+def load_device_history(
+    db: Session,
+    device_id: int,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+) -> List[HistoryRow]:
+    """Histórico completo do intervalo; sem intervalo, os primeiros DEFAULT_HISTORY_LIMIT pontos."""
+    rows = iter_device_history(db, device_id, start, end)
+    if not start and not end:
+        rows = islice(rows, DEFAULT_HISTORY_LIMIT)
+    return list(rows)
+
+def _devices_with_cold_data(
+    db: Session,
+    device_ids: List[int],
+    start: Optional[datetime],
+    end: Optional[datetime],
+) -> Set[int]:
+    """Sondas que têm arquivo ou blocos no intervalo (duas consultas aos manifestos)."""
+    found: Set[int] = set()
+    for model in (ReadingArchive, ReadingBlock):
+        query = db.query(model.device_id).filter(model.device_id.in_(device_ids))
+        if start:
+            query = query.filter(model.last_ts >= start)
+        if end:
+            query = query.filter(model.first_ts <= end)
+        found.update(device_id for (device_id,) in query.distinct())
+    return found
+
+def load_batch_history(
+    db: Session,
+    device_ids: List[int],
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+) -> Dict[int, List[HistoryRow]]:
+    """
+    Histórico bruto de várias sondas com uma única varredura da tabela quente,
+    ordenada por (sonda, timestamp). Só as sondas com dados frios no intervalo
+    consultam o arquivo/blocos. Mesmo limite de load_device_history por sonda.
+    """
+    start, end = _naive(start), _naive(end)
+    result: Dict[int, List[HistoryRow]] = {device_id: [] for device_id in device_ids}
+    if not device_ids:
+        return result
+    cold_ids = _devices_with_cold_data(db, device_ids, start, end)
+
+    query = db.query(
+        Reading.device_id,
+        Reading.timestamp,
+        Reading.depth_cm,
+        Reading.moisture_pct,
+        Reading.temperature_c,
+        Reading.battery_status,
+        Reading.rain_cm
+    ).filter(Reading.device_id.in_(device_ids))
+    if start:
+        query = query.filter(Reading.timestamp >= start)
+    if end:
+        query = query.filter(Reading.timestamp <= end)
+    scan = query.order_by(Reading.device_id, Reading.timestamp.asc()).yield_per(2000)
+
+    def collect(device_id: int, rows: Iterator[HistoryRow]) -> None:
+        if device_id in cold_ids:
+            rows = heapq.merge(_iter_cold_rows(db, device_id, start, end), rows, key=lambda r: r.timestamp)
+        if not start and not end:
+            rows = islice(rows, DEFAULT_HISTORY_LIMIT)
+        result[device_id] = list(rows)
+
+    visited = set()
+    for device_id, group in groupby(scan, key=lambda r: r[0]):
+        visited.add(device_id)
+        collect(device_id, (HistoryRow(*r[1:]) for r in group))
+
+    # Sondas que só têm dados frios no intervalo
+    for device_id in cold_ids - visited:
+        collect(device_id, iter(()))
+    return result
+
+# --- Histórico reduzido (downsampling) ---
+
+def parse_resolution(value: str) -> Optional[int]:
+    """Converte '15m', '1h', '1d'... em segundos. 'raw' desliga a redução (None)."""
+    if value == "raw":
+        return None
+    match = _RESOLUTION_RE.match(value.strip().lower())
+    if not match or int(match.group(1)) <= 0:
+        raise ValueError(f"Resolução inválida: '{value}'. Use 'raw' ou valores como '15m', '1h', '1d'.")
+    return int(match.group(1)) * _UNIT_SECONDS[match.group(2)]
+
+def choose_bucket_seconds(start: datetime, end: datetime, max_points: int) -> Optional[int]:
+    """Menor bucket de BUCKET_STEPS que mantém cada série em até max_points pontos."""
+    span = (end - start).total_seconds()
+    needed = span / max_points
+    if needed <= 0:
+        return None
+    for step in BUCKET_STEPS:
+        if step >= needed:
+            return step
+    return int(math.ceil(needed / BUCKET_STEPS[-1])) * BUCKET_STEPS[-1]
+
+def get_history_bounds(db: Session, device_id: int) -> Optional[Tuple[datetime, datetime]]:
+    """Primeiro e último timestamp da sonda considerando todas as camadas."""
+    return _history_bounds(db, [device_id])
+
+def _history_bounds(db: Session, device_ids: List[int]) -> Optional[Tuple[datetime, datetime]]:
+    bounds = [
+        db.query(func.min(Reading.timestamp), func.max(Reading.timestamp))
+        .filter(Reading.device_id.in_(device_ids)).one(),
+        db.query(func.min(ReadingArchive.first_ts), func.max(ReadingArchive.last_ts))
+        .filter(ReadingArchive.device_id.in_(device_ids)).one(),
+        db.query(func.min(ReadingBlock.first_ts), func.max(ReadingBlock.last_ts))
+        .filter(ReadingBlock.device_id.in_(device_ids)).one(),
+    ]
+    firsts = [b[0] for b in bounds if b[0]]
+    lasts = [b[1] for b in bounds if b[1]]
+    if not firsts:
+        return None
+    return min(firsts), max(lasts)
+
+def _max_device_rows(db: Session, device_ids: List[int], start: datetime, end: datetime) -> int:
+    """
+    Maior número de leituras de uma sonda no intervalo: limite superior dos
+    pontos de cada série por profundidade. A tabela quente (só os dias ainda
+    não selados) é contada por índice; blocos e arquivos usam o row_count do
+    manifesto, inteiro mesmo quando só parte deles cai no intervalo.
+    """
+    totals: Dict[int, int] = dict.fromkeys(device_ids, 0)
+    hot = (
+        db.query(Reading.device_id, func.count(Reading.id))
+        .filter(Reading.device_id.in_(device_ids), Reading.timestamp >= start, Reading.timestamp <= end)
+        .group_by(Reading.device_id)
+    )
+    for device_id, n in hot:
+        totals[device_id] += n
+    for model in (ReadingBlock, ReadingArchive):
+        cold = (
+            db.query(model.device_id, func.sum(model.row_count))
+            .filter(model.device_id.in_(device_ids), model.last_ts >= start, model.first_ts <= end)
+            .group_by(model.device_id)
+        )
+        for device_id, n in cold:
+            totals[device_id] += int(n)
+    return max(totals.values(), default=0)
+
+def plan_downsampling(
+    db: Session,
+    device_id: int,
+    start: Optional[datetime],
+    end: Optional[datetime],
+    max_points: Optional[int] = None,
+    resolution: Optional[str] = None,
+) -> Optional[Tuple[datetime, datetime, int]]:
+    """
+    Decide (início, fim, bucket em segundos) do histórico reduzido.
+    Retorna None quando a resposta deve sair bruta: resolution='raw', sonda
+    sem dados ou, sem resolution, quando as leituras do intervalo já cabem
+    em max_points (ver _max_device_rows). Levanta ValueError para resoluções
+    inválidas.
+    """
+    return plan_batch_downsampling(db, [device_id], start, end, max_points, resolution)
+
+def plan_batch_downsampling(
+    db: Session,
+    device_ids: List[int],
+    start: Optional[datetime],
+    end: Optional[datetime],
+    max_points: Optional[int] = None,
+    resolution: Optional[str] = None,
+) -> Optional[Tuple[datetime, datetime, int]]:
+    """Como plan_downsampling, com um único bucket para todas as sondas (séries sobrepostas)."""
+    bucket_s = parse_resolution(resolution) if resolution else None
+    if resolution and bucket_s is None:
+        return None
+
+    start, end = _naive(start), _naive(end)
+    if not (start and end):
+        bounds = _history_bounds(db, device_ids)
+        if not bounds:
+            return None
+        start, end = start or bounds[0], end or bounds[1]
+
+    if bucket_s is None and max_points:
+        if _max_device_rows(db, device_ids, start, end) <= max_points:
+            return None
+        bucket_s = choose_bucket_seconds(start, end, max_points)
+    if not bucket_s:
+        return None
+    return start, end, bucket_s
+
+def _bucket_start(ts: datetime, bucket_s: int) -> datetime:
+    epoch = int((ts - datetime(1970, 1, 1)).total_seconds())
+    return datetime(1970, 1, 1) + timedelta(seconds=epoch - epoch % bucket_s)
+
+def bucket_expr(bucket_s: int):
+    """Início do bucket de cada leitura no Postgres (mesmo alinhamento de _bucket_start)."""
+    return func.timezone(
+        "UTC",
+        func.to_timestamp(func.floor(func.extract("epoch", Reading.timestamp) / bucket_s) * bucket_s),
+    ).label("bucket")
+
+# Agregados parciais por (bucket, profundidade), combináveis entre camadas:
+# [soma umid., nº umid., mín umid., máx umid., soma temp., nº temp., mín temp., máx temp., chuva, bateria mín.]
+_Partial = List[Optional[float]]
+
+def _merge_partial(acc: Dict[Tuple[datetime, float], _Partial], key, part: _Partial) -> None:
+    cur = acc.get(key)
+    if cur is None:
+        acc[key] = list(part)
+        return
+    cur[0] += part[0]
+    cur[1] += part[1]
+    cur[4] += part[4]
+    cur[5] += part[5]
+    cur[8] += part[8]
+    for i, pick in ((2, min), (3, max), (6, min), (7, max), (9, min)):
+        values = [v for v in (cur[i], part[i]) if v is not None]
+        cur[i] = pick(values) if values else None
+
+def load_downsampled_history(
+    db: Session,
+    device_id: int,
+    start: datetime,
+    end: datetime,
+    bucket_s: int,
+) -> List[HistoryBucket]:
+    """
+    Agrega o histórico em buckets de `bucket_s` segundos por profundidade.
+    As leituras quentes são agregadas no próprio Postgres; as camadas frias,
+    em Python com o mesmo alinhamento (época Unix), e os parciais são somados.
+    """
+    return load_downsampled_batch(db, [device_id], start, end, bucket_s)[device_id]
+
+def load_downsampled_batch(
+    db: Session,
+    device_ids: List[int],
+    start: datetime,
+    end: datetime,
+    bucket_s: int,
+) -> Dict[int, List[HistoryBucket]]:
+    """load_downsampled_history para várias sondas com uma única agregação da tabela quente."""
+    start, end = _naive(start), _naive(end)
+    acc: Dict[int, Dict[Tuple[datetime, float], _Partial]] = {device_id: {} for device_id in device_ids}
+    if not device_ids:
+        return {}
+
+    bucket = bucket_expr(bucket_s)
+    hot = (
+        db.query(
+            Reading.device_id,
+            bucket,
+            Reading.depth_cm,
+            func.coalesce(func.sum(Reading.moisture_pct), 0.0),
+            func.count(Reading.moisture_pct),
+            func.min(Reading.moisture_pct),
+            func.max(Reading.moisture_pct),
+            func.coalesce(func.sum(Reading.temperature_c), 0.0),
+            func.count(Reading.temperature_c),
+            func.min(Reading.temperature_c),
+            func.max(Reading.temperature_c),
+            func.coalesce(func.sum(Reading.rain_cm), 0.0),
+            func.min(Reading.battery_status),
+        )
+        .filter(
+            Reading.device_id.in_(device_ids),
+            Reading.depth_cm.isnot(None),
+            Reading.timestamp >= start,
+            Reading.timestamp <= end,
+        )
+        .group_by(Reading.device_id, bucket, Reading.depth_cm)
+        .all()
+    )
+    for row in hot:
+        _merge_partial(acc[row[0]], (row[1], row[2]), list(row[3:]))
+
+    for device_id in _devices_with_cold_data(db, device_ids, start, end):
+        for r in _iter_cold_rows(db, device_id, start, end):
+            if r.depth_cm is None:
+                continue
+            m, t = r.moisture_pct, r.temperature_c
+            _merge_partial(acc[device_id], (_bucket_start(r.timestamp, bucket_s), r.depth_cm), [
+                m or 0.0, 0 if m is None else 1, m, m,
+                t or 0.0, 0 if t is None else 1, t, t,
+                r.rain_cm or 0.0, r.battery_status,
+            ])
+
+    return {
+        device_id: [
+            HistoryBucket(
+                timestamp=ts,
+                depth_cm=depth,
+                moisture_pct=p[0] / p[1] if p[1] else None,
+                temperature_c=p[4] / p[5] if p[5] else None,
+                battery_status=p[9],
+                rain_cm=p[8],
+                moisture_min=p[2],
+                moisture_max=p[3],
+                temperature_min=p[6],
+                temperature_max=p[7],
+            )
+            for (ts, depth), p in sorted(partials.items(), key=lambda item: item[0])
+        ]
+        for device_id, partials in acc.items()
+    }
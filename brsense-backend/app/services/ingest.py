@@ -2,23 +2,55 @@
 import logging
 from sqlalchemy.orm import Session
 from datetime import datetime, timezone
-from typing import Any, Dict, List
+from typing import Any, Dict, List, Tuple
 
 from app.models.device import Device
 from app.models.reading import Reading
 from app.decoders.smartone_c import decode_soil_payload
+from app.services.rain import record_rain
+from app.services.last_seen import last_seen_tracker
+from app.services.dashboard_cache import dashboard_cache
+from app.services.profile import forget_late_readings
+from app.services.heatmap import heatmap_cache
+from app.services.sync import next_ingest_seq
+from app.services.broker import event_broker
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-def _ensure_device(db: Session, esn: str) -> Device:
+def _ensure_device(db: Session, esn: str) -> Tuple[Device, bool]:
+    """Retorna a sonda do ESN, criando-a se necessário (e se foi criada agora)."""
     device = db.query(Device).filter(Device.esn == esn).first()
     if not device:
         logger.info(f"Novo dispositivo detectado: {esn}")
         device = Device(esn=esn, name=f"Sonda {esn}")
         db.add(device)
         db.flush()
-    return device
+        return device, True
+    return device, False
+
+def _reading_events(seq: int, devices: Dict[int, Tuple[str, int]], readings: List[Reading]) -> List[Dict[str, Any]]:
+    """Uma atualização compacta por sonda com as leituras do envelope (campos do DeviceReadingSchema)."""
+    events: Dict[int, Dict[str, Any]] = {}
+    for r in readings:
+        esn, farm_id = devices[r.device_id]
+        event = events.setdefault(r.device_id, {
+            "seq": seq,
+            "device_id": r.device_id,
+            "esn": esn,
+            "farm_id": farm_id,
+            "readings": [],
+        })
+        event["readings"].append({
+            "timestamp": r.timestamp.astimezone(timezone.utc).replace(tzinfo=None).isoformat(),
+            "depth_cm": r.depth_cm,
+            "moisture_pct": r.moisture_pct,
+            "temperature_c": r.temperature_c,
+            "battery_status": r.battery_status,
+            "solar_status": r.solar_status,
+            "rain_cm": r.rain_cm,
+        })
+    return list(events.values())
 
 def _extract_messages_from_dict(payload: Dict[str, Any]) -> List[Dict[str, Any]]:
     """
@@ -85,6 +117,11 @@ def ingest_envelope(payload: Dict[str, Any], db: Session) -> dict:
     
     saved_count = 0
     readings_count = 0
+    rain_entries = []
+    seen = []
+    new_readings = []
+    devices = {}
+    new_devices = False
     
     # Se a lista estiver vazia (heartbeat), o loop não roda e retorna OK.
     for msg in msgs:
@@ -96,8 +133,9 @@ def ingest_envelope(payload: Dict[str, Any], db: Session) -> dict:
             
         try:
             # 1. Device
-            device = _ensure_device(db, esn)
-            device.updated_at = datetime.now(timezone.utc)
+            device, created = _ensure_device(db, esn)
+            new_devices = new_devices or created
+            devices[device.id] = (device.esn, device.farm_id)
             
             ts = datetime.now(timezone.utc)
             if msg.get("unixTime"):
@@ -127,8 +165,13 @@ def ingest_envelope(payload: Dict[str, Any], db: Session) -> dict:
                             timestamp=ts
                         )
                         db.add(reading)
+                        new_readings.append(reading)
                         readings_count += 1
+
+                        if r.get("rain_cm"):
+                            rain_entries.append((device.id, ts, r["rain_cm"]))
             
+            seen.append((device.id, ts))
             saved_count += 1
             
         except Exception as e:
@@ -136,7 +179,37 @@ def ingest_envelope(payload: Dict[str, Any], db: Session) -> dict:
             continue
             
     try:
+        # Atualiza o livro-razão de chuva na mesma transação das leituras
+        record_rain(db, rain_entries)
+
+        # Número de ingestão do envelope (cursor dos endpoints de sincronização).
+        # Fica por último: o lock que ordena os números dura só até o commit
+        events = []
+        if new_readings:
+            seq = next_ingest_seq(db)
+            for reading in new_readings:
+                reading.ingest_seq = seq
+            # Montado antes do commit, que expira os atributos dos objetos
+            events = _reading_events(seq, devices, new_readings)
         db.commit()
+
+        # O "visto por último" vai para o LastSeenTracker, que grava em lote
+        received_at = datetime.now(timezone.utc)
+        for device_id, ts in seen:
+            last_seen_tracker.touch(device_id, received_at, ts)
+
+        # Descarta do cache do dashboard só as páginas das sondas que receberam dados
+        dashboard_cache.invalidate_devices(device_id for device_id, _ in seen)
+        heatmap_cache.invalidate_devices(device_id for device_id, _ in seen)
+        if new_devices:
+            # Sonda nova (ainda sem fazenda) aparece na listagem dos administradores
+            dashboard_cache.invalidate_scopes([])
+        # Leituras atrasadas mudam matrizes de perfil já guardadas como "fechadas"
+        forget_late_readings(seen)
+
+        # Empurra as leituras novas para os dashboards conectados (SSE)
+        event_broker.publish(events)
+
         # Retorna estrutura que será convertida em XML/JSON na resposta
         return {
             "status": "ok", 
@@ -0,0 +1,109 @@
+# app/services/last_seen.py
+import logging
+import threading
+from datetime import datetime, timezone
+from typing import Dict, Optional, Tuple
+
+from sqlalchemy import update, values, column, func, Integer, DateTime
+
+from app.db.session import engine
+from app.models.device import Device
+from app.settings import settings
+
+logger = logging.getLogger(__name__)
+
+def _naive_utc(ts: datetime) -> datetime:
+    if ts.tzinfo:
+        return ts.astimezone(timezone.utc).replace(tzinfo=None)
+    return ts
+
+class LastSeenTracker:
+    """
+    Acumula em memória o "visto por último" de cada sonda e grava tudo
+    de uma vez, a cada poucos segundos, com um único UPDATE.
+
+    Evita um UPDATE na linha quente de `device` para cada mensagem recebida.
+    Os valores só avançam (GREATEST no banco e max() em memória) e nunca
+    tocam em `updated_at`, que continua sendo o carimbo das edições do usuário.
+    """
+
+    def __init__(self, interval_s: float):
+        self.interval_s = interval_s
+        self._lock = threading.Lock()
+        self._pending: Dict[int, Tuple[datetime, datetime]] = {}
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def touch(self, device_id: int, seen_at: datetime, message_at: datetime) -> None:
+        """Registra que a sonda foi ouvida em `seen_at` com mensagem de `message_at`."""
+        seen_at, message_at = _naive_utc(seen_at), _naive_utc(message_at)
+        with self._lock:
+            current = self._pending.get(device_id)
+            if current:
+                seen_at = max(seen_at, current[0])
+                message_at = max(message_at, current[1])
+            self._pending[device_id] = (seen_at, message_at)
+
+    def pending(self) -> Dict[int, Tuple[datetime, datetime]]:
+        """Cópia dos valores ainda não gravados (device_id -> (seen_at, message_at))."""
+        with self._lock:
+            return dict(self._pending)
+
+    def flush(self) -> int:
+        """Grava os valores pendentes em um único UPDATE. Retorna o nº de sondas."""
+        with self._lock:
+            batch, self._pending = self._pending, {}
+
+        if not batch:
+            return 0
+
+        pending = values(
+            column("id", Integer),
+            column("seen_at", DateTime),
+            column("message_at", DateTime),
+            name="pending",
+        ).data([(device_id, seen, msg) for device_id, (seen, msg) in batch.items()])
+
+        stmt = (
+            update(Device)
+            .where(Device.id == pending.c.id)
+            .values(
+                last_seen_at=func.greatest(Device.last_seen_at, pending.c.seen_at),
+                last_message_at=func.greatest(Device.last_message_at, pending.c.message_at),
+                # Mantém o carimbo de edição intacto (senão o onupdate dispararia)
+                updated_at=Device.updated_at,
+            )
+        )
+
+        try:
+            with engine.begin() as conn:
+                conn.execute(stmt)
+        except Exception as e:
+            logger.error(f"Erro ao gravar last_seen de {len(batch)} sondas: {e}")
+            # Devolve o lote para a próxima tentativa sem perder valores mais novos
+            for device_id, (seen, msg) in batch.items():
+                self.touch(device_id, seen, msg)
+            return 0
+
+        return len(batch)
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval_s):
+            self.flush()
+
+    def start(self) -> None:
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="last-seen-flush", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        """Para a thread de flush e grava o que ainda estiver pendente."""
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=self.interval_s + 1)
+            self._thread = None
+        self.flush()
+
+last_seen_tracker = LastSeenTracker(settings.LAST_SEEN_FLUSH_SECONDS)
@@ -0,0 +1,42 @@
+# app/services/latest_state.py
+from typing import Iterable, Set
+
+from sqlalchemy.orm import Query, Session
+
+from app.models.reading import Reading
+
+def latest_depth_query(db: Session, device_ids: Iterable[int], *columns) -> Query:
+    """Última leitura com umidade válida de cada profundidade (mantém as cores do mapa)."""
+    return (
+        db.query(*columns)
+        .filter(
+            Reading.device_id.in_(device_ids),
+            Reading.depth_cm.isnot(None),
+            Reading.moisture_pct.isnot(None),
+        )
+        .distinct(Reading.device_id, Reading.depth_cm)
+        .order_by(Reading.device_id, Reading.depth_cm, Reading.timestamp.desc(), Reading.id.desc())
+    )
+
+def latest_battery_query(db: Session, device_ids: Iterable[int], *columns) -> Query:
+    """Leitura mais recente com bateria de cada sonda."""
+    return (
+        db.query(*columns)
+        .filter(Reading.device_id.in_(device_ids), Reading.battery_status.isnot(None))
+        .distinct(Reading.device_id)
+        # Desempate por id: a escolha não pode mudar entre a listagem e o arquivamento
+        .order_by(Reading.device_id, Reading.timestamp.desc(), Reading.id.desc())
+    )
+
+def latest_state_ids(db: Session, device_ids: Iterable[int]) -> Set[int]:
+    """
+    Ids das linhas que formam o estado atual das sondas (get_latest_readings).
+    Blocos e arquivo frio deixam essas linhas na tabela quente, para que uma
+    sonda calada há muito tempo continue mostrando a última leitura e a bateria.
+    """
+    device_ids = list(device_ids)
+    if not device_ids:
+        return set()
+    ids = {r.id for r in latest_depth_query(db, device_ids, Reading.id, Reading.device_id, Reading.depth_cm)}
+    ids |= {r.id for r in latest_battery_query(db, device_ids, Reading.id, Reading.device_id)}
+    return ids
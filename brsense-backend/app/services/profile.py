@@ -0,0 +1,124 @@
+# app/services/profile.py
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - numpy faz parte do requirements.txt
+    np = None
+
+from sqlalchemy.orm import Session
+
+from app.schemas.reading import HistoryBucket
+from app.services.dashboard_cache import DashboardCache
+from app.services.history import load_downsampled_history
+from app.settings import settings
+
+# Matrizes de intervalos fechados (nada novo deve chegar). Reaproveita o LRU do
+# dashboard: a "versão" é fixa e a invalidação vem da ingestão de dados atrasados.
+profile_cache = DashboardCache(settings.PROFILE_CACHE_MAX_BYTES)
+CLOSED_VERSION = "closed"
+
+_EPOCH = datetime(1970, 1, 1)
+
+def is_closed_range(end: datetime, now: Optional[datetime] = None) -> bool:
+    now = now or datetime.utcnow()
+    return end <= now - timedelta(hours=settings.PROFILE_CLOSED_AFTER_HOURS)
+
+def forget_late_readings(entries: Iterable[Tuple[int, datetime]]) -> None:
+    """Leitura atrasada (dentro de um intervalo já fechado) descarta as matrizes da sonda."""
+    cutoff = datetime.utcnow() - timedelta(hours=settings.PROFILE_CLOSED_AFTER_HOURS)
+    late = {device_id for device_id, ts in entries if ts.replace(tzinfo=None) <= cutoff}
+    if late:
+        profile_cache.invalidate_devices(late)
+
+def grid_start(start: datetime, step_s: int) -> datetime:
+    """Início da grade alinhado à época Unix (mesmo alinhamento dos buckets do histórico)."""
+    epoch = int((start - _EPOCH).total_seconds())
+    return _EPOCH + timedelta(seconds=epoch - epoch % step_s)
+
+def _forward_fill(matrix, max_gap: int):
+    """Repete o último valor por até `max_gap` passos (vetorizado em todas as profundidades)."""
+    n = matrix.shape[1]
+    positions = np.arange(n)
+    last = np.where(~np.isnan(matrix), positions, -1)
+    np.maximum.accumulate(last, axis=1, out=last)
+    filled = np.take_along_axis(matrix, np.clip(last, 0, None), axis=1)
+    keep = (last >= 0) & (positions - last <= max_gap)
+    return np.where(keep, filled, np.nan)
+
+def _linear_fill(matrix, max_gap: int):
+    """Interpola só lacunas internas de até `max_gap` passos; bordas e buracos longos ficam vazios."""
+    n = matrix.shape[1]
+    positions = np.arange(n)
+    valid = ~np.isnan(matrix)
+
+    prev = np.where(valid, positions, -1)
+    np.maximum.accumulate(prev, axis=1, out=prev)
+    nxt = np.where(valid, positions, n)
+    nxt = np.minimum.accumulate(nxt[:, ::-1], axis=1)[:, ::-1]
+    fillable = ~valid & (prev >= 0) & (nxt < n) & (nxt - prev <= max_gap + 1)
+
+    result = matrix.copy()
+    for row in np.flatnonzero(fillable.any(axis=1)):
+        known = valid[row]
+        targets = fillable[row]
+        result[row, targets] = np.interp(positions[targets], positions[known], matrix[row, known])
+    return result
+
+def build_moisture_matrix(
+    buckets: List[HistoryBucket],
+    start: datetime,
+    steps: int,
+    step_s: int,
+    fill: str = "none",
+    max_gap: int = 3,
+) -> Dict[str, Any]:
+    """
+    Pivota os buckets (timestamp, profundidade, umidade) em uma matriz densa
+    profundidade × tempo na grade regular `start + i * step_s`. Células sem
+    leitura ficam None (ou preenchidas conforme `fill`).
+    """
+    points = [b for b in buckets if b.moisture_pct is not None]
+    depths = np.unique(np.array([b.depth_cm for b in points], dtype=np.float64))
+    matrix = np.full((len(depths), steps), np.nan)
+
+    if points:
+        offsets = np.array([(b.timestamp - start).total_seconds() for b in points], dtype=np.float64)
+        cols = (offsets // step_s).astype(np.int64)
+        rows = np.searchsorted(depths, np.array([b.depth_cm for b in points], dtype=np.float64))
+        values = np.array([b.moisture_pct for b in points], dtype=np.float64)
+        inside = (cols >= 0) & (cols < steps)
+        matrix[rows[inside], cols[inside]] = values[inside]
+
+        if fill == "ffill":
+            matrix = _forward_fill(matrix, max_gap)
+        elif fill == "linear":
+            matrix = _linear_fill(matrix, max_gap)
+
+    rounded = np.round(matrix, 2).tolist()
+    return {
+        "start": start,
+        "step_seconds": step_s,
+        "steps": steps,
+        "depths": depths.tolist(),
+        # NaN não existe em JSON: vira None
+        "moisture_pct": [[None if v != v else v for v in row] for row in rounded],
+    }
+
+def load_moisture_matrix(
+    db: Session,
+    device_id: int,
+    start: datetime,
+    end: datetime,
+    step_s: int,
+    fill: str = "none",
+    max_gap: int = 3,
+) -> Dict[str, Any]:
+    """Médias por bucket de todas as camadas (load_downsampled_history) pivotadas com NumPy."""
+    if np is None:
+        raise RuntimeError("numpy não está instalado: matriz de perfil indisponível.")
+    first = grid_start(start, step_s)
+    steps = int((end - first).total_seconds() // step_s) + 1
+    buckets = load_downsampled_history(db, device_id, first, end, step_s)
+    return build_moisture_matrix(buckets, first, steps, step_s, fill, max_gap)
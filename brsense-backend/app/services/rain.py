@@ -0,0 +1,171 @@
+# app/services/rain.py
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import and_, case, func, or_
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+
+from app.models.rain_hourly import RainHourly
+from app.models.reading import Reading
+from app.settings import settings
+
+# Janelas exibidas no RainAccumulationCard (nome do campo -> duração)
+RAIN_WINDOWS: Dict[str, timedelta] = {
+    "rain_1h": timedelta(hours=1),
+    "rain_24h": timedelta(hours=24),
+    "rain_7d": timedelta(days=7),
+    "rain_15d": timedelta(days=15),
+    "rain_30d": timedelta(days=30),
+}
+
+def hour_bucket(ts: datetime) -> datetime:
+    """Trunca o timestamp para a hora cheia em UTC (naive, como no banco)."""
+    if ts.tzinfo:
+        ts = ts.astimezone(timezone.utc).replace(tzinfo=None)
+    return ts.replace(minute=0, second=0, microsecond=0)
+
+def record_rain(db: Session, entries: Iterable[Tuple[int, datetime, float]]) -> None:
+    """
+    Acumula a chuva recebida no balde horário de cada sonda.
+    `entries` são tuplas (device_id, timestamp, rain_cm); tudo é agregado
+    em memória e gravado com um único INSERT ... ON CONFLICT.
+    """
+    buckets: Dict[Tuple[int, datetime], float] = {}
+    for device_id, ts, rain_cm in entries:
+        if not rain_cm:
+            continue
+        key = (device_id, hour_bucket(ts))
+        buckets[key] = buckets.get(key, 0.0) + float(rain_cm)
+
+    if not buckets:
+        return
+
+    stmt = insert(RainHourly).values([
+        {"device_id": device_id, "hour": hour, "rain_cm": rain_cm}
+        for (device_id, hour), rain_cm in buckets.items()
+    ])
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[RainHourly.device_id, RainHourly.hour],
+        set_={"rain_cm": RainHourly.rain_cm + stmt.excluded.rain_cm},
+    )
+    db.execute(stmt)
+
+def _exact_boundary(delta: timedelta) -> bool:
+    """
+    A hora de fronteira da janela ainda está na tabela `reading` (não foi
+    selada em blocos)? Então ela é somada exatamente a partir das leituras.
+    """
+    return delta <= timedelta(days=settings.BLOCK_SEAL_AFTER_DAYS)
+
+def _window_bounds(now: datetime) -> Tuple[Dict[str, datetime], Dict[str, datetime]]:
+    """Início de cada janela e a primeira hora do livro-razão somada inteira nela."""
+    cutoffs = {name: now - delta for name, delta in RAIN_WINDOWS.items()}
+    ledger_from = {
+        name: hour_bucket(cutoff) + timedelta(hours=1) if _exact_boundary(RAIN_WINDOWS[name]) else hour_bucket(cutoff)
+        for name, cutoff in cutoffs.items()
+    }
+    return cutoffs, ledger_from
+
+def _partial_ranges(
+    cutoffs: Dict[str, datetime],
+    ledger_from: Dict[str, datetime],
+) -> Dict[str, Tuple[datetime, datetime]]:
+    return {
+        name: (cutoffs[name], ledger_from[name])
+        for name, delta in RAIN_WINDOWS.items()
+        if _exact_boundary(delta) and cutoffs[name] < ledger_from[name]
+    }
+
+def next_rain_change(db: Session, device_ids: List[int], now: datetime) -> Optional[datetime]:
+    """
+    Próximo instante, depois de `now`, em que uma leitura com chuva sai de uma
+    janela exata (1h, 24h, 7d) e get_rain_windows muda sem uplink novo. As
+    demais mudanças acontecem na hora cheia. None se nenhuma janela tem chuva
+    na hora de fronteira. Uma consulta pequena: só as horas de fronteira.
+    """
+    if not device_ids:
+        return None
+    partial = _partial_ranges(*_window_bounds(now))
+    if not partial:
+        return None
+    row = (
+        db.query(*[
+            func.min(case((and_(Reading.timestamp >= lo, Reading.timestamp < hi), Reading.timestamp))).label(name)
+            for name, (lo, hi) in partial.items()
+        ])
+        .filter(
+            Reading.device_id.in_(device_ids),
+            Reading.rain_cm > 0,
+            or_(*[and_(Reading.timestamp >= lo, Reading.timestamp < hi) for lo, hi in partial.values()]),
+        )
+        .one()
+    )
+    # A leitura de `ts` sai da janela `delta` em ts + delta
+    exits = [getattr(row, name) + RAIN_WINDOWS[name] for name in partial if getattr(row, name) is not None]
+    return min(exits, default=None)
+
+def get_rain_windows(db: Session, device_ids: List[int], now: datetime | None = None) -> Dict[int, Dict[str, float]]:
+    """
+    Soma as janelas de chuva (1h, 24h, 7d, 15d, 30d).
+
+    As horas inteiras dentro da janela vêm do livro-razão; a hora parcial da
+    fronteira (`now - janela` até a hora cheia seguinte) vem das poucas
+    leituras brutas desse trecho, então 1h, 24h e 7d são exatas. Nas janelas
+    cuja fronteira já pode estar selada em blocos (mais antigas que
+    BLOCK_SEAL_AFTER_DAYS), a hora de fronteira entra inteira: no máximo 1h a
+    mais em 15 ou 30 dias. Sondas sem chuva não aparecem no dicionário.
+    """
+    if not device_ids:
+        return {}
+
+    now = now or datetime.utcnow()
+    cutoffs, ledger_from = _window_bounds(now)
+
+    rows = (
+        db.query(
+            RainHourly.device_id,
+            *[
+                func.coalesce(func.sum(case((RainHourly.hour >= start, RainHourly.rain_cm), else_=0.0)), 0.0).label(name)
+                for name, start in ledger_from.items()
+            ],
+        )
+        .filter(
+            RainHourly.device_id.in_(device_ids),
+            RainHourly.hour >= min(ledger_from.values()),
+        )
+        .group_by(RainHourly.device_id)
+        .all()
+    )
+    result = {
+        row.device_id: {name: float(getattr(row, name) or 0.0) for name in RAIN_WINDOWS}
+        for row in rows
+    }
+
+    # Horas de fronteira: [now - janela, próxima hora cheia), direto das leituras
+    partial = _partial_ranges(cutoffs, ledger_from)
+    if partial:
+        boundary_rows = (
+            db.query(
+                Reading.device_id,
+                *[
+                    func.coalesce(func.sum(case(
+                        (and_(Reading.timestamp >= lo, Reading.timestamp < hi), Reading.rain_cm), else_=0.0
+                    )), 0.0).label(name)
+                    for name, (lo, hi) in partial.items()
+                ],
+            )
+            .filter(
+                Reading.device_id.in_(device_ids),
+                Reading.rain_cm.isnot(None),
+                or_(*[and_(Reading.timestamp >= lo, Reading.timestamp < hi) for lo, hi in partial.values()]),
+            )
+            .group_by(Reading.device_id)
+            .all()
+        )
+        for row in boundary_rows:
+            metrics = result.setdefault(row.device_id, {name: 0.0 for name in RAIN_WINDOWS})
+            for name in partial:
+                metrics[name] += float(getattr(row, name) or 0.0)
+
+    return result
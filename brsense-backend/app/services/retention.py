@@ -0,0 +1,252 @@
+# app/services/retention.py
+import logging
+from datetime import datetime, timedelta
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from sqlalchemy import case, func, or_, text
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+
+from app.models.reading import Reading
+from app.models.reading_block import ReadingBlock
+from app.models.retention_watermark import RetentionWatermark
+from app.services.blocks import compact_block_day
+from app.services.latest_state import latest_state_ids
+from app.settings import settings
+
+logger = logging.getLogger(__name__)
+
+class CompactionBatch(NamedTuple):
+    """Um lote da política de retenção: um dia de uma sonda, compactado para `unit`."""
+    device_id: int
+    day: datetime
+    unit: str  # 'hour' ou 'day'
+    rows_before: int
+    rows_after: Optional[int]  # Desconhecido nos blocos até decodificá-los
+    tier: str = "reading"  # 'reading' (linhas quentes) ou 'block' (dia selado)
+
+class CompactionPlan(NamedTuple):
+    """Lotes de uma execução e as marcas d'água a gravar depois de compactá-los."""
+    batches: List[CompactionBatch]
+    watermarks: Dict[str, datetime]  # unit -> dias antes disto já compactados
+
+# Dias de uma janela que ainda têm mais de uma leitura por bucket de `unit`.
+# Varre sonda a sonda pelo índice (device_id, timestamp), só dentro de [lo, hi).
+_PLAN_SQL = text("""
+    SELECT d.id AS device_id, p.day, p.rows_before, p.rows_after
+    FROM device d
+    CROSS JOIN LATERAL (
+        SELECT date_trunc('day', timestamp) AS day,
+               COUNT(*) AS rows_before,
+               COUNT(DISTINCT (reading_type, depth_cm, date_trunc(:unit, timestamp))) AS rows_after
+        FROM reading
+        WHERE device_id = d.id AND timestamp >= :lo AND timestamp < :hi
+        GROUP BY date_trunc('day', timestamp)
+        HAVING COUNT(*) > COUNT(DISTINCT (reading_type, depth_cm, date_trunc(:unit, timestamp)))
+    ) p
+    ORDER BY p.day ASC, d.id ASC
+    LIMIT :max_batches
+""")
+
+# Leitura mais antiga (linhas quentes, sonda a sonda pelo índice, ou blocos), na 1ª execução
+_OLDEST_SQL = text("""
+    SELECT LEAST(
+        (SELECT MIN(f.first_ts)
+         FROM device d
+         CROSS JOIN LATERAL (
+             SELECT MIN(timestamp) AS first_ts FROM reading WHERE device_id = d.id
+         ) f),
+        (SELECT MIN(day)::timestamp FROM reading_block)
+    )
+""")
+
+# Níveis que já satisfazem a compactação para `unit` (um bloco diário já serve ao horário)
+_DONE_RESOLUTIONS = {"hour": ("hour", "day"), "day": ("day",)}
+
+# Substitui as leituras do dia por um valor representativo por série e bucket:
+# média de umidade/temperatura, soma da chuva e último status de energia.
+# O estado atual da sonda (:keep, ver latest_state_ids) fica bruto, como nos blocos e no arquivo.
+_COMPACT_SQL = text("""
+    WITH doomed AS (
+        DELETE FROM reading
+        WHERE device_id = :device_id AND timestamp >= :start AND timestamp < :end
+          AND NOT (id = ANY(:keep))
+        RETURNING device_id, reading_type, depth_cm, moisture_pct, temperature_c,
+                  rain_cm, timestamp, battery_status, solar_status
+    )
+    INSERT INTO reading (device_id, reading_type, depth_cm, moisture_pct, temperature_c,
+                         rain_cm, timestamp, battery_status, solar_status)
+    SELECT device_id, reading_type, depth_cm,
+           AVG(moisture_pct), AVG(temperature_c), SUM(rain_cm),
+           date_trunc(:unit, timestamp),
+           (ARRAY_AGG(battery_status ORDER BY timestamp DESC) FILTER (WHERE battery_status IS NOT NULL))[1],
+           (ARRAY_AGG(solar_status ORDER BY timestamp DESC) FILTER (WHERE solar_status IS NOT NULL))[1]
+    FROM doomed
+    GROUP BY device_id, reading_type, depth_cm, date_trunc(:unit, timestamp)
+""")
+
+def retention_cutoffs(
+    now: Optional[datetime] = None,
+    raw_days: Optional[int] = None,
+    hourly_days: Optional[int] = None,
+) -> tuple[datetime, datetime]:
+    """
+    Retorna (raw_cutoff, daily_cutoff), alinhados ao início do dia.
+    Antes de raw_cutoff os dados viram horários; antes de daily_cutoff, diários.
+
+    A retenção só alcança o que ainda está no Postgres (linhas e blocos): um mês
+    arquivado (ARCHIVE_KEEP_MONTHS) vai para o Parquet com a resolução que tinha.
+    Com os padrões (6 meses de arquivo, diário após 365 dias), o arquivo guarda
+    dados horários e o nível diário só vale para o que não foi arquivado.
+    """
+    now = now or datetime.utcnow()
+    raw_days = settings.RETENTION_RAW_DAYS if raw_days is None else raw_days
+    hourly_days = settings.RETENTION_HOURLY_DAYS if hourly_days is None else hourly_days
+    today = now.replace(hour=0, minute=0, second=0, microsecond=0)
+    raw_cutoff = today - timedelta(days=raw_days)
+    daily_cutoff = today - timedelta(days=max(hourly_days, raw_days))
+    return raw_cutoff, daily_cutoff
+
+def _day(ts: datetime) -> datetime:
+    return ts.replace(hour=0, minute=0, second=0, microsecond=0)
+
+def load_watermarks(db: Session) -> Dict[str, datetime]:
+    return dict(db.query(RetentionWatermark.unit, RetentionWatermark.compacted_before).all())
+
+def compaction_epoch(db: Session) -> Optional[datetime]:
+    """Instante da última execução da retenção que compactou algum nível."""
+    return db.query(func.max(RetentionWatermark.updated_at)).scalar()
+
+def save_watermarks(db: Session, watermarks: Dict[str, datetime]) -> None:
+    """Avança as marcas d'água depois que os lotes do plano foram compactados."""
+    stmt = insert(RetentionWatermark).values([
+        {"unit": unit, "compacted_before": before, "updated_at": datetime.utcnow()}
+        for unit, before in watermarks.items()
+    ])
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[RetentionWatermark.unit],
+        set_={"compacted_before": stmt.excluded.compacted_before, "updated_at": stmt.excluded.updated_at},
+    )
+    db.execute(stmt)
+    db.commit()
+
+def _plan_blocks(db: Session, unit: str, lo: datetime, hi: datetime, limit: int) -> List[CompactionBatch]:
+    """Dias selados em [lo, hi) com blocos brutos (ou mais de um bloco) para `unit`."""
+    done = ReadingBlock.resolution.in_(_DONE_RESOLUTIONS[unit])
+    rows = (
+        db.query(ReadingBlock.device_id, ReadingBlock.day, func.sum(ReadingBlock.row_count).label("n"))
+        .filter(ReadingBlock.day >= lo.date(), ReadingBlock.day < hi.date())
+        .group_by(ReadingBlock.device_id, ReadingBlock.day)
+        .having(or_(func.count() > 1, func.count(case((done, 1))) == 0))
+        .order_by(ReadingBlock.day, ReadingBlock.device_id)
+        .limit(limit)
+        .all()
+    )
+    return [
+        CompactionBatch(device_id=r.device_id, day=datetime.combine(r.day, datetime.min.time()), unit=unit,
+                        rows_before=int(r.n), rows_after=None, tier="block")
+        for r in rows
+    ]
+
+def _plan_unit(
+    db: Session,
+    unit: str,
+    lo: datetime,
+    hi: datetime,
+    max_batches: int,
+) -> Tuple[List[CompactionBatch], datetime]:
+    """
+    Percorre [lo, hi) em janelas de RETENTION_PLAN_WINDOW_DAYS até juntar
+    max_batches lotes (linhas quentes e dias selados em blocos). Retorna os
+    lotes e até onde o intervalo fica compactado depois deles (o dia do
+    último lote pode ter ficado incompleto).
+    """
+    batches: List[CompactionBatch] = []
+    window = timedelta(days=settings.RETENTION_PLAN_WINDOW_DAYS)
+    while lo < hi and len(batches) < max_batches:
+        window_end = min(hi, lo + window)
+        remaining = max_batches - len(batches)
+        rows = db.execute(_PLAN_SQL, {
+            "unit": unit,
+            "lo": lo,
+            "hi": window_end,
+            "max_batches": remaining,
+        }).all()
+        found = [
+            CompactionBatch(device_id=r.device_id, day=r.day, unit=unit,
+                            rows_before=r.rows_before, rows_after=r.rows_after)
+            for r in rows
+        ]
+        found += _plan_blocks(db, unit, lo, window_end, remaining)
+        # Cada consulta já vem por dia: os `remaining` primeiros da união não pulam nenhum dia
+        found.sort(key=lambda b: (b.day, b.device_id, b.tier))
+        batches.extend(found[:remaining])
+        if len(batches) == max_batches:
+            return batches, max(lo, batches[-1].day)
+        lo = window_end
+    return batches, min(lo, hi)
+
+def plan_compaction(
+    db: Session,
+    raw_cutoff: datetime,
+    daily_cutoff: datetime,
+    max_batches: Optional[int] = None,
+    rescan: bool = False,
+) -> CompactionPlan:
+    """
+    Lista os dias (por sonda) que ainda têm mais de uma leitura por bucket,
+    primeiro os diários (antes de daily_cutoff), depois os horários.
+
+    Cada nível só é varrido a partir da sua marca d'água (dias já
+    compactados em execuções anteriores), em janelas de poucos dias. Leituras
+    atrasadas que caiam antes da marca só são vistas com `rescan=True`, que
+    recomeça da leitura mais antiga.
+    """
+    max_batches = max_batches or settings.RETENTION_MAX_BATCHES
+    marks = {} if rescan else load_watermarks(db)
+    oldest = None
+    if len(marks) < 2:
+        oldest = db.execute(_OLDEST_SQL).scalar()
+        if oldest is None:
+            return CompactionPlan([], {})
+        oldest = _day(oldest)
+
+    # Um dia que passa do corte diário volta a ser compactado, agora por dia
+    day_lo = marks.get("day", oldest)
+    hour_lo = max(marks.get("hour", oldest), daily_cutoff)
+
+    batches, day_mark = _plan_unit(db, "day", day_lo, daily_cutoff, max_batches)
+    watermarks = {"day": day_mark}
+    if len(batches) < max_batches:
+        hour_batches, hour_mark = _plan_unit(db, "hour", hour_lo, raw_cutoff, max_batches - len(batches))
+        batches += hour_batches
+        watermarks["hour"] = hour_mark
+    elif "hour" in marks:
+        watermarks["hour"] = marks["hour"]
+    return CompactionPlan(batches, watermarks)
+
+def compact_batch(db: Session, batch: CompactionBatch) -> int:
+    """
+    Compacta um lote em uma transação curta (bloqueia só as linhas ou os
+    blocos daquele dia). Retorna o nº de linhas depois da compactação.
+    """
+    if batch.tier == "block":
+        return compact_block_day(db, batch.device_id, batch.day.date(), batch.unit)
+    keep = latest_state_ids(db, [batch.device_id])
+    try:
+        inserted = db.execute(_COMPACT_SQL, {
+            "device_id": batch.device_id,
+            "start": batch.day,
+            "end": batch.day + timedelta(days=1),
+            "unit": batch.unit,
+            "keep": sorted(keep),
+        }).rowcount
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    # As linhas do estado atual que caem no dia continuam lá, brutas
+    kept = db.query(func.count(Reading.id)).filter(
+        Reading.id.in_(keep), Reading.timestamp >= batch.day, Reading.timestamp < batch.day + timedelta(days=1)
+    ).scalar() if keep else 0
+    return inserted + kept
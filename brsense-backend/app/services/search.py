@@ -0,0 +1,58 @@
+# app/services/search.py
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import case, func, or_
+from sqlalchemy.orm import Session
+
+from app.models.device import Device
+from app.models.farm import Farm
+
+def _like_escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+def search_devices(db: Session, q: str, limit: int, owner_id: Optional[int] = None) -> List[Dict[str, Any]]:
+    """
+    Busca sondas por trecho do ESN ou do nome (índices de trigramas), já
+    restrita às fazendas de `owner_id` quando informado.
+
+    Ordem: ESN exato, prefixo do ESN, prefixo do nome, demais ocorrências;
+    dentro de cada grupo, pela similaridade (pg_trgm) e pelo ESN. O operador
+    % também traz nomes parecidos com erro de digitação.
+    """
+    term = q.strip()
+    contains = f"%{_like_escape(term)}%"
+    prefix = f"{_like_escape(term)}%"
+    name = func.coalesce(Device.name, "")
+
+    rank = case(
+        (func.lower(Device.esn) == term.lower(), 0),
+        (Device.esn.ilike(prefix, escape="\\"), 1),
+        (name.ilike(prefix, escape="\\"), 2),
+        else_=3,
+    ).label("rank")
+    score = func.greatest(func.similarity(Device.esn, term), func.similarity(name, term)).label("score")
+
+    query = (
+        db.query(Device.id, Device.esn, Device.name, Device.farm_id, Device.last_seen_at, rank, score)
+        .filter(or_(
+            Device.esn.ilike(contains, escape="\\"),
+            Device.name.ilike(contains, escape="\\"),
+            Device.esn.op("%")(term),
+            Device.name.op("%")(term),
+        ))
+    )
+    if owner_id is not None:
+        query = query.join(Farm, Device.farm_id == Farm.id).filter(Farm.user_id == owner_id)
+
+    rows = query.order_by(rank, score.desc(), Device.esn).limit(limit).all()
+    return [
+        {
+            "id": r.id,
+            "esn": r.esn,
+            "name": r.name,
+            "farm_id": r.farm_id,
+            "last_seen_at": r.last_seen_at,
+            "score": round(float(r.score or 0.0), 3),
+        }
+        for r in rows
+    ]
@@ -0,0 +1,73 @@
+# app/services/single_flight.py
+import logging
+import threading
+from typing import Any, Callable, Dict, Hashable
+
+from app.settings import settings
+
+logger = logging.getLogger(__name__)
+
+class _Call:
+    __slots__ = ("done", "result", "error", "waiters")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: BaseException = None
+        self.waiters = 0
+
+class SingleFlight:
+    """
+    Coalesce computações idênticas e simultâneas: a primeira requisição com
+    uma chave executa a função e as que chegam enquanto ela roda esperam e
+    recebem o mesmo resultado (ou a mesma exceção).
+
+    Não é cache: assim que a execução termina a chave é liberada, e a próxima
+    requisição calcula de novo. Útil no primeiro acesso e logo após uma
+    invalidação, quando muitos painéis pedem a mesma coisa ao mesmo tempo.
+    """
+
+    def __init__(self, timeout_s: float):
+        self.timeout_s = timeout_s
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, _Call] = {}
+        self.executions = 0
+        self.shared = 0
+
+    def do(self, key: Hashable, fn: Callable[[], Any]) -> Any:
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+                self.executions += 1
+            else:
+                call.waiters += 1
+
+        if not leader:
+            if call.done.wait(self.timeout_s):
+                with self._lock:
+                    self.shared += 1
+                if call.error is not None:
+                    raise call.error
+                return call.result
+            # O líder travou: calcula por conta própria em vez de esperar para sempre
+            logger.warning(f"Single-flight: tempo esgotado aguardando {key!r}, executando em paralelo")
+            return fn()
+
+        try:
+            call.result = fn()
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.done.set()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"in_flight": len(self._calls), "executions": self.executions, "shared": self.shared}
+
+single_flight = SingleFlight(settings.SINGLE_FLIGHT_TIMEOUT_SECONDS)
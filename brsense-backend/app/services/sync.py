@@ -0,0 +1,84 @@
+# app/services/sync.py
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import func, text
+from sqlalchemy.orm import Session
+
+from app.models.device import Device
+from app.models.farm import Farm
+from app.models.reading import Reading, ingest_seq
+from app.schemas.reading import HistoryRow
+
+# Chave do advisory lock que serializa "pegar número + commit" entre ingestões
+_INGEST_SEQ_LOCK = 0x62727365
+
+def next_ingest_seq(db: Session) -> int:
+    """
+    Reserva o próximo número da sequência de ingestão para a transação atual.
+
+    Segura um advisory lock até o commit/rollback, então os números ficam
+    visíveis na mesma ordem em que foram emitidos: quem leu o cursor N já viu
+    tudo com número <= N. Chamar logo antes do commit para o lock durar pouco.
+    """
+    db.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": _INGEST_SEQ_LOCK})
+    return db.execute(ingest_seq.next_value()).scalar()
+
+def current_cursor(db: Session) -> int:
+    """Maior número de ingestão já visível (0 se nada foi ingerido com sequência)."""
+    return db.query(func.coalesce(func.max(Reading.ingest_seq), 0)).scalar()
+
+def changed_devices(db: Session, since: int, owner_id: Optional[int] = None) -> Tuple[Dict[int, int], int]:
+    """
+    Sondas com leituras ingeridas depois de `since` (só as das fazendas de
+    `owner_id`, se informado). Retorna ({device_id: último número}, novo cursor).
+    """
+    query = (
+        db.query(Reading.device_id, func.max(Reading.ingest_seq))
+        .filter(Reading.ingest_seq > since)
+        .group_by(Reading.device_id)
+    )
+    if owner_id is not None:
+        query = (
+            query.join(Device, Reading.device_id == Device.id)
+            .join(Farm, Device.farm_id == Farm.id)
+            .filter(Farm.user_id == owner_id)
+        )
+    changed = dict(query.all())
+    return changed, max(changed.values(), default=since)
+
+def reading_changes(
+    db: Session,
+    device_id: int,
+    since: int,
+    limit: int,
+) -> Tuple[List[HistoryRow], int, bool]:
+    """
+    Leituras da sonda ingeridas depois de `since`, na ordem de ingestão.
+    Retorna (linhas, novo cursor, has_more). Um envelope nunca é cortado ao
+    meio, então o cursor devolvido sempre pode ser usado na próxima chamada.
+    """
+    query = (
+        db.query(
+            Reading.ingest_seq,
+            Reading.timestamp,
+            Reading.depth_cm,
+            Reading.moisture_pct,
+            Reading.temperature_c,
+            Reading.battery_status,
+            Reading.rain_cm,
+        )
+        .filter(Reading.device_id == device_id)
+        .order_by(Reading.ingest_seq, Reading.timestamp, Reading.id)
+    )
+    rows = query.filter(Reading.ingest_seq > since).limit(limit + 1).all()
+
+    has_more = len(rows) > limit
+    if has_more:
+        boundary = rows[limit][0]
+        rows = [r for r in rows if r[0] < boundary]
+        if not rows:
+            # Um único envelope maior que o limite sai inteiro
+            rows = query.filter(Reading.ingest_seq == boundary).all()
+
+    cursor = rows[-1][0] if rows else since
+    return [HistoryRow(*r[1:]) for r in rows], cursor, has_more
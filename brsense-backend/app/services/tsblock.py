@@ -0,0 +1,160 @@
+# app/services/tsblock.py
+"""
+Codificação compacta de séries temporais: um bloco por sonda e por dia.
+
+Layout (depois do MAGIC, tudo comprimido com zlib):
+    varint nº de linhas
+    para cada coluna: varint tamanho da seção + seção
+
+- timestamp: microssegundos desde a época, em delta-of-delta (zigzag varint);
+- reading_type: um byte por linha (0 = nulo);
+- colunas numéricas: bitmap de presença + deltas zigzag entre valores
+  presentes consecutivos, em ponto fixo (FIXED_POINT_SCALE) para os floats.
+
+As linhas são ordenadas por série (tipo, profundidade) antes de codificar:
+dentro de uma série os intervalos são regulares e os valores mudam pouco,
+então quase todos os deltas cabem em um byte e o zlib faz o resto.
+"""
+import zlib
+from datetime import datetime, timedelta
+from typing import List, Optional, Sequence, Tuple
+
+MAGIC = b"BRB1"
+FIXED_POINT_SCALE = 1000  # 3 casas decimais para umidade, temperatura, chuva e profundidade
+
+# Ordem das colunas nas tuplas aceitas/retornadas pelo codec
+BLOCK_COLUMNS = (
+    "timestamp", "reading_type", "depth_cm", "moisture_pct",
+    "temperature_c", "rain_cm", "battery_status", "solar_status",
+)
+_FLOAT_COLUMNS = ("depth_cm", "moisture_pct", "temperature_c", "rain_cm")
+_INT_COLUMNS = ("battery_status", "solar_status")
+
+_EPOCH = datetime(1970, 1, 1)
+_MICRO = timedelta(microseconds=1)
+
+BlockRow = Tuple[datetime, Optional[str], Optional[float], Optional[float],
+                 Optional[float], Optional[float], Optional[int], Optional[int]]
+
+def _zigzag(n: int) -> int:
+    return n << 1 if n >= 0 else ((-n) << 1) - 1
+
+def _unzigzag(z: int) -> int:
+    return -((z + 1) >> 1) if z & 1 else z >> 1
+
+def _put_varint(out: bytearray, z: int) -> None:
+    while z >= 0x80:
+        out.append((z & 0x7F) | 0x80)
+        z >>= 7
+    out.append(z)
+
+def _get_varint(buf: bytes, pos: int) -> Tuple[int, int]:
+    z = shift = 0
+    while True:
+        b = buf[pos]
+        pos += 1
+        z |= (b & 0x7F) << shift
+        if b < 0x80:
+            return z, pos
+        shift += 7
+
+def _encode_timestamps(values: Sequence[datetime]) -> bytearray:
+    out = bytearray()
+    prev = prev_delta = 0
+    for i, ts in enumerate(values):
+        micros = (ts - _EPOCH) // _MICRO
+        if i == 0:
+            _put_varint(out, _zigzag(micros))
+        else:
+            delta = micros - prev
+            _put_varint(out, _zigzag(delta - prev_delta))
+            prev_delta = delta
+        prev = micros
+    return out
+
+def _decode_timestamps(buf: bytes, n: int) -> List[datetime]:
+    values = []
+    pos = micros = delta = 0
+    for i in range(n):
+        z, pos = _get_varint(buf, pos)
+        if i == 0:
+            micros = _unzigzag(z)
+        else:
+            delta += _unzigzag(z)
+            micros += delta
+        values.append(_EPOCH + micros * _MICRO)
+    return values
+
+def _encode_numbers(values: Sequence[Optional[int]]) -> bytearray:
+    bitmap = bytearray((len(values) + 7) // 8)
+    deltas = bytearray()
+    prev = 0
+    for i, v in enumerate(values):
+        if v is None:
+            continue
+        bitmap[i >> 3] |= 1 << (i & 7)
+        _put_varint(deltas, _zigzag(v - prev))
+        prev = v
+    return bitmap + deltas
+
+def _decode_numbers(buf: bytes, n: int) -> List[Optional[int]]:
+    values: List[Optional[int]] = []
+    pos = (n + 7) // 8
+    prev = 0
+    for i in range(n):
+        if not buf[i >> 3] & (1 << (i & 7)):
+            values.append(None)
+            continue
+        z, pos = _get_varint(buf, pos)
+        prev += _unzigzag(z)
+        values.append(prev)
+    return values
+
+def _to_fixed(v: Optional[float]) -> Optional[int]:
+    return None if v is None else int(round(v * FIXED_POINT_SCALE))
+
+def encode_block(rows: Sequence[BlockRow]) -> bytes:
+    """Codifica as linhas (tuplas na ordem de BLOCK_COLUMNS) em um bloco comprimido."""
+    rows = sorted(rows, key=lambda r: (r[1] or "", -1.0 if r[2] is None else r[2], r[0]))
+    columns = dict(zip(BLOCK_COLUMNS, zip(*rows))) if rows else {c: () for c in BLOCK_COLUMNS}
+
+    sections = [
+        _encode_timestamps(columns["timestamp"]),
+        bytearray(ord(t) if t else 0 for t in columns["reading_type"]),
+        *[_encode_numbers([_to_fixed(v) for v in columns[c]]) for c in _FLOAT_COLUMNS],
+        *[_encode_numbers([None if v is None else int(v) for v in columns[c]]) for c in _INT_COLUMNS],
+    ]
+
+    body = bytearray()
+    _put_varint(body, len(rows))
+    for section in sections:
+        _put_varint(body, len(section))
+        body += section
+    return MAGIC + zlib.compress(bytes(body), 9)
+
+def decode_block(payload: bytes) -> List[BlockRow]:
+    """Decodifica um bloco de volta em tuplas (ordem de BLOCK_COLUMNS), em ordem cronológica."""
+    if payload[:len(MAGIC)] != MAGIC:
+        raise ValueError("Bloco de leituras inválido (MAGIC incorreto)")
+    body = zlib.decompress(payload[len(MAGIC):])
+
+    n, pos = _get_varint(body, 0)
+    sections = []
+    for _ in BLOCK_COLUMNS:
+        size, pos = _get_varint(body, pos)
+        sections.append(body[pos:pos + size])
+        pos += size
+
+    columns = [
+        _decode_timestamps(sections[0], n),
+        [chr(b) if b else None for b in sections[1]],
+        *[
+            [None if v is None else v / FIXED_POINT_SCALE for v in _decode_numbers(section, n)]
+            for section in sections[2:2 + len(_FLOAT_COLUMNS)]
+        ],
+        *[_decode_numbers(section, n) for section in sections[2 + len(_FLOAT_COLUMNS):]],
+    ]
+
+    rows = list(zip(*columns)) if n else []
+    rows.sort(key=lambda r: (r[0], -1.0 if r[2] is None else r[2]))
+    return rows
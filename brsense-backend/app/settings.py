@@ -54,6 +54,58 @@ class Settings(BaseSettings):
     # ---- Parsing / Ingest knobs ----
     MAX_UPLINK_BYTES: int = 64 * 1024  # 64 KB envelope cap
     ALLOW_STALE_TIMESTAMPS: bool = True
+    LAST_SEEN_FLUSH_SECONDS: float = 5.0  # Coalesced device last_seen flush interval
+
+    # ---- Cold archive (Parquet) ----
+    ARCHIVE_DIR: str = "archive"  # Local directory for archived reading months
+    ARCHIVE_KEEP_MONTHS: int = 6  # Closed months kept hot in Postgres before archiving
+
+    # ---- Retention / downsampling ----
+    RETENTION_RAW_DAYS: int = 90  # Full resolution kept for this many days
+    RETENTION_HOURLY_DAYS: int = 365  # Hourly values up to this age, daily after; months archived before that (ARCHIVE_KEEP_MONTHS) stay hourly
+    RETENTION_MAX_BATCHES: int = 500  # Device-days compacted per run (one short transaction each)
+    RETENTION_PLAN_WINDOW_DAYS: int = 7  # Days scanned per planning query, walking forward from the watermark
+
+    # ---- Block storage (high-frequency probes) ----
+    BLOCK_SEAL_AFTER_DAYS: int = 7  # Closed days kept as rows before being sealed into blocks
+    BLOCK_MIN_ROWS_PER_DAY: int = 288  # Only device-days with at least this many rows are sealed
+
+    # ---- Farm export jobs ----
+    EXPORT_DIR: str = "exports"  # Local directory for finished export files
+    EXPORT_JOB_WORKERS: int = 1  # Export jobs running at the same time
+    EXPORT_JOB_PARALLELISM: int = 2  # Devices read in parallel per job (each holds a DB connection briefly)
+    EXPORT_JOB_TTL_HOURS: int = 24  # Finished jobs and files are purged after this
+    EXPORT_BATCH_ROWS: int = 50_000  # Rows held per reader before each write
+
+    # ---- Dashboard cache ----
+    DASHBOARD_CACHE_MAX_BYTES: int = 64 * 1024 * 1024  # Total size of serialized /api/devices pages kept in memory (LRU, 0 disables)
+    SINGLE_FLIGHT_TIMEOUT_SECONDS: float = 30.0  # Max wait on a coalesced in-flight computation
+
+    # ---- Pagination ----
+    PAGINATION_COUNT_TTL_SECONDS: float = 30.0  # Cached exact totals for X-Total-Count
+    PAGINATION_EXACT_COUNT_LIMIT: int = 100_000  # Unfiltered tables above this report the planner estimate
+
+    # ---- Soil profile matrix ----
+    PROFILE_MAX_STEPS: int = 5000  # Time columns per matrix
+    PROFILE_CLOSED_AFTER_HOURS: int = 24  # Ranges ending before this are cached
+    PROFILE_CACHE_MAX_BYTES: int = 32 * 1024 * 1024  # Total size of cached closed-range matrices (LRU)
+
+    # ---- Maps ----
+    MAP_CLUSTER_MAX_ZOOM: int = 13  # From this zoom on, the viewport returns individual probes
+    MAP_CLUSTER_CELL_PX: int = 64  # Approximate cluster cell size on screen
+    MAP_MAX_MARKERS: int = 2000  # Cap on individual markers per viewport
+    MAP_MOISTURE_WINDOW_HOURS: int = 48  # Readings older than this don't color a marker
+
+    # ---- Farm heatmap ----
+    HEATMAP_CACHE_MAX_BYTES: int = 32 * 1024 * 1024  # Total size of serialized farm rasters kept in memory (LRU)
+    HEATMAP_MAX_SIZE: int = 256  # Cells on the raster's longest side
+    HEATMAP_PADDING: float = 0.1  # Margin around the probes, as a fraction of their extent
+    HEATMAP_CHUNK_CELLS: int = 1_000_000  # cells x probes per interpolation step (~8 MB of float64)
+
+    # ---- Live stream (SSE) ----
+    SSE_QUEUE_SIZE: int = 256  # Pending events per client before it is resynced from the database
+    SSE_HEARTBEAT_SECONDS: float = 15.0  # Keep-alive comment interval
+    SSE_ACL_REFRESH_SECONDS: float = 60.0  # How often a stream reloads the user's farm list
     
     KEYCLOAK_URL: str = "https://brsense-auth.fly.dev"
     KEYCLOAK_REALM: str = os.getenv("KEYCLOAK_REALM")
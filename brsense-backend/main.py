@@ -1,15 +1,28 @@
 # main.py
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
 from app.settings import settings
 from app.db.session import SessionLocal
 from app.models.request_log import RequestLog
+from app.services.last_seen import last_seen_tracker
+from app.services.export_jobs import export_jobs
 
 # Importando as rotas
-from app.routers import uplink, auth, devices, readings, farms # <--- Adicionado readings
+from app.routers import uplink, auth, devices, readings, farms, exports, stream # <--- Adicionado readings
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Inicia a gravação em lote do "visto por último" das sondas
+    last_seen_tracker.start()
+    yield
+    # No desligamento, grava o que ainda estiver pendente
+    last_seen_tracker.stop()
+    export_jobs.shutdown()
 
 app = FastAPI(
     title=settings.APP_NAME,
+    lifespan=lifespan,
     swagger_ui_init_oauth={
         "clientId": "brsense-frontend",  # Preenche automático
         "appName": "BRSense API",
@@ -80,6 +93,8 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # Cabeçalhos de paginação e cache que o frontend precisa ler
+    expose_headers=["X-Next-Cursor", "X-Total-Count", "X-Total-Count-Estimated", "ETag", "Last-Modified"],
 )
 
 # Registrando as Rotas
@@ -88,6 +103,8 @@ app.include_router(auth.router, prefix="/api", tags=["Auth"]) # Autenticação
 app.include_router(devices.router, prefix="/api", tags=["Devices"]) # Gestão de Devices
 app.include_router(readings.router, prefix="/api", tags=["Readings"]) # <--- Nova rota do gráfico
 app.include_router(farms.router, prefix="/api", tags=["Farms"]) # <--- Nova rota do gráfico
+app.include_router(exports.router, prefix="/api", tags=["Exports"]) # Exportações em segundo plano
+app.include_router(stream.router, prefix="/api", tags=["Stream"]) # Atualizações ao vivo (SSE)
 
 # Rota de teste simples
 @app.get("/")
@@ -0,0 +1,67 @@
+# brsense-backend/scripts/apply_retention.py
+import sys
+import os
+import time
+import argparse
+
+# --- CORREÇÃO DE PATH ---
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+# ------------------------
+
+from app.db.session import SessionLocal
+# Importa os modelos para o SQLAlchemy resolver os relacionamentos (Device -> Farm -> User)
+from app.models import device, farm, user, reading, retention_watermark
+from app.services.archive import archive_cutoff
+from app.services.retention import compact_batch, plan_compaction, retention_cutoffs, save_watermarks
+from app.settings import settings
+
+def apply_retention(raw_days: int, hourly_days: int, max_batches: int, pause_s: float, dry_run: bool, rescan: bool):
+    db = SessionLocal()
+
+    raw_cutoff, daily_cutoff = retention_cutoffs(raw_days=raw_days, hourly_days=hourly_days)
+    print(f"--- Retenção: bruto após {raw_cutoff:%Y-%m-%d}, horário até {daily_cutoff:%Y-%m-%d}, diário antes ---")
+    if daily_cutoff.date() < archive_cutoff():
+        print(f"--- Aviso: meses antes de {archive_cutoff():%Y-%m} vão para o arquivo frio ainda horários ---")
+
+    plan = plan_compaction(db, raw_cutoff, daily_cutoff, max_batches, rescan=rescan)
+    batches = plan.batches
+    before = after = 0
+    for batch in batches:
+        before += batch.rows_before
+        label = f"Sonda {batch.device_id} {batch.day:%Y-%m-%d} ({batch.unit}, {batch.tier}): {batch.rows_before} -> "
+        if dry_run:
+            # Blocos só sabem quantas linhas sobram depois de decodificados
+            after += batch.rows_after if batch.rows_after is not None else batch.rows_before
+            print(f"[dry-run] {label}{'?' if batch.rows_after is None else batch.rows_after}")
+            continue
+        rows_after = compact_batch(db, batch)
+        after += rows_after
+        print(f"{label}{rows_after}")
+        # Pausa entre lotes para não disputar I/O com o ingest
+        if pause_s:
+            time.sleep(pause_s)
+
+    # Só depois de compactar: a próxima execução começa de onde esta parou
+    if not dry_run and plan.watermarks:
+        save_watermarks(db, plan.watermarks)
+
+    verb = "Seriam removidas" if dry_run else "Removidas"
+    print(f"--- {len(batches)} lotes: {before} -> {after} leituras ({verb} {before - after}) ---")
+    if len(batches) == max_batches:
+        print("--- Limite de lotes atingido; rode novamente para continuar ---")
+    db.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compacta leituras antigas para valores horários e diários.")
+    parser.add_argument("--raw-days", type=int, default=settings.RETENTION_RAW_DAYS,
+                        help="Dias mantidos em resolução total")
+    parser.add_argument("--hourly-days", type=int, default=settings.RETENTION_HOURLY_DAYS,
+                        help="Idade até a qual os dados ficam horários (depois, diários)")
+    parser.add_argument("--max-batches", type=int, default=settings.RETENTION_MAX_BATCHES,
+                        help="Máximo de sonda/dia compactados nesta execução")
+    parser.add_argument("--pause", type=float, default=0.0, help="Pausa em segundos entre lotes")
+    parser.add_argument("--dry-run", action="store_true", help="Apenas mostra as linhas afetadas")
+    parser.add_argument("--rescan", action="store_true",
+                        help="Ignora as marcas d'água e varre desde a leitura mais antiga (leituras atrasadas)")
+    args = parser.parse_args()
+    apply_retention(args.raw_days, args.hourly_days, args.max_batches, args.pause, args.dry_run, args.rescan)
@@ -0,0 +1,42 @@
+# brsense-backend/scripts/archive_readings.py
+import sys
+import os
+import argparse
+
+# --- CORREÇÃO DE PATH ---
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+# ------------------------
+
+from app.db.session import SessionLocal
+# Importa os modelos para o SQLAlchemy resolver os relacionamentos (Device -> Farm -> User)
+from app.models import device, farm, user, reading
+from app.services.archive import archive_cutoff, archive_month, find_archivable_months
+from app.settings import settings
+
+def archive_readings(keep_months: int, dry_run: bool):
+    db = SessionLocal()
+
+    cutoff = archive_cutoff(keep_months=keep_months)
+    print(f"--- Arquivando meses anteriores a {cutoff:%Y-%m} em '{settings.ARCHIVE_DIR}' ---")
+
+    months = find_archivable_months(db, cutoff)
+    total = 0
+    for device_id, month, count in months:
+        if dry_run:
+            print(f"[dry-run] Sonda {device_id} {month:%Y-%m}: {count} leituras")
+            total += count
+            continue
+        archived = archive_month(db, device_id, month)
+        print(f"Sonda {device_id} {month:%Y-%m}: {archived} leituras arquivadas")
+        total += archived
+
+    print(f"--- {'Seriam arquivadas' if dry_run else 'Arquivadas'} {total} leituras em {len(months)} meses/sonda ---")
+    db.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Move meses fechados de leituras para o arquivo frio (Parquet).")
+    parser.add_argument("--keep-months", type=int, default=settings.ARCHIVE_KEEP_MONTHS,
+                        help="Meses fechados mantidos no Postgres")
+    parser.add_argument("--dry-run", action="store_true", help="Apenas lista o que seria arquivado")
+    args = parser.parse_args()
+    archive_readings(args.keep_months, args.dry_run)
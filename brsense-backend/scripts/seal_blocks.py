@@ -0,0 +1,44 @@
+# brsense-backend/scripts/seal_blocks.py
+import sys
+import os
+import argparse
+
+# --- CORREÇÃO DE PATH ---
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+# ------------------------
+
+from app.db.session import SessionLocal
+# Importa os modelos para o SQLAlchemy resolver os relacionamentos (Device -> Farm -> User)
+from app.models import device, farm, user, reading
+from app.services.blocks import find_sealable_days, seal_cutoff, seal_day
+from app.settings import settings
+
+def seal_blocks(after_days: int, min_rows: int, dry_run: bool):
+    db = SessionLocal()
+
+    cutoff = seal_cutoff(after_days=after_days)
+    print(f"--- Selando dias anteriores a {cutoff:%Y-%m-%d} com pelo menos {min_rows} leituras ---")
+
+    days = find_sealable_days(db, cutoff, min_rows)
+    total = 0
+    for device_id, day, count in days:
+        if dry_run:
+            print(f"[dry-run] Sonda {device_id} {day:%Y-%m-%d}: {count} leituras")
+            total += count
+            continue
+        sealed = seal_day(db, device_id, day)
+        print(f"Sonda {device_id} {day:%Y-%m-%d}: {sealed} leituras seladas")
+        total += sealed
+
+    print(f"--- {'Seriam seladas' if dry_run else 'Seladas'} {total} leituras em {len(days)} blocos ---")
+    db.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compacta dias fechados de sondas de alta frequência em blocos.")
+    parser.add_argument("--after-days", type=int, default=settings.BLOCK_SEAL_AFTER_DAYS,
+                        help="Dias fechados mantidos como linhas antes de selar")
+    parser.add_argument("--min-rows", type=int, default=settings.BLOCK_MIN_ROWS_PER_DAY,
+                        help="Mínimo de leituras no dia para selar")
+    parser.add_argument("--dry-run", action="store_true", help="Apenas lista o que seria selado")
+    args = parser.parse_args()
+    seal_blocks(args.after_days, args.min_rows, args.dry_run)
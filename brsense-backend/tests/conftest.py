@@ -0,0 +1,40 @@
+# tests/conftest.py
+"""
+Fixtures dos testes com banco: precisam de um Postgres com o schema aplicado
+(DATABASE_URL) e rodam em uma transação desfeita no final. Cada módulo
+define o fixture `token` com o usuário autenticado.
+"""
+import pytest
+
+@pytest.fixture
+def db():
+    from sqlalchemy.orm import Session
+    from app.db.session import engine
+
+    connection = engine.connect()
+    transaction = connection.begin()
+    # Os commits da aplicação viram savepoints dentro da transação do teste
+    session = Session(bind=connection, join_transaction_mode="create_savepoint")
+    try:
+        yield session
+    finally:
+        session.close()
+        transaction.rollback()
+        connection.close()
+
+@pytest.fixture
+def client(db, token):
+    from fastapi.testclient import TestClient
+    import main
+    from app.core.security import get_current_user_token
+    from app.db.session import get_db
+    from app.services.dashboard_cache import dashboard_cache
+
+    main.app.dependency_overrides[get_db] = lambda: db
+    main.app.dependency_overrides[get_current_user_token] = lambda: token
+    dashboard_cache.clear()
+    try:
+        yield TestClient(main.app)
+    finally:
+        main.app.dependency_overrides.clear()
+        dashboard_cache.clear()
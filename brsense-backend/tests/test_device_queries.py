@@ -0,0 +1,88 @@
+# tests/test_device_queries.py
+"""
+O número de consultas das listagens de sondas não pode depender do tamanho
+da página: chuva e estado atual são carregados em lote (sem N+1).
+
+Precisa de um Postgres com o schema aplicado (DATABASE_URL); os fixtures
+`db` e `client` estão em conftest.py.
+"""
+import os
+from datetime import datetime, timedelta
+
+import pytest
+
+if not os.environ.get("DATABASE_URL"):
+    pytest.skip("DATABASE_URL não configurada: o teste precisa de um Postgres", allow_module_level=True)
+
+from sqlalchemy import event
+
+from app.db.session import engine
+from app.models.device import Device
+from app.models.farm import Farm
+from app.models.reading import Reading
+from app.models.user import User
+from app.services.dashboard_cache import dashboard_cache
+from app.services.rain import record_rain
+
+PAGE_SIZE = 8
+TOKEN = {"preferred_username": "n1-test@brsense", "name": "Teste N+1", "realm_access": {"roles": []}}
+
+@pytest.fixture
+def token():
+    return TOKEN
+
+@pytest.fixture
+def owner(db):
+    user = User(name=TOKEN["name"], login=TOKEN["preferred_username"], password="KEYCLOAK_AUTH")
+    db.add(user)
+    db.flush()
+    farm = Farm(name="Fazenda N+1", user_id=user.id)
+    db.add(farm)
+    db.flush()
+
+    now = datetime.utcnow().replace(microsecond=0)
+    rain = []
+    for k in range(PAGE_SIZE + 2):
+        device = Device(esn=f"N1-TEST-{k}", name=f"Sonda {k}", farm_id=farm.id)
+        db.add(device)
+        db.flush()
+        for i in range(3):
+            ts = now - timedelta(minutes=30 * i)
+            for depth in (10.0, 20.0, 30.0):
+                db.add(Reading(device_id=device.id, reading_type="H", depth_cm=depth, moisture_pct=25.0 + i, timestamp=ts))
+            db.add(Reading(device_id=device.id, reading_type="T", depth_cm=10.0, temperature_c=21.0,
+                           battery_status=3, rain_cm=0.2, timestamp=ts))
+            rain.append((device.id, ts, 0.2))
+    record_rain(db, rain)
+    db.flush()
+    return user
+
+def _count_queries(client, path: str):
+    """(consultas executadas, corpo da resposta) de uma requisição com o cache vazio."""
+    statements = []
+
+    def listener(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    dashboard_cache.clear()
+    event.listen(engine, "before_cursor_execute", listener)
+    try:
+        response = client.get(path)
+    finally:
+        event.remove(engine, "before_cursor_execute", listener)
+    assert response.status_code == 200, response.text
+    return len(statements), response.json()
+
+@pytest.mark.parametrize("path", [
+    "/api/devices?limit={limit}",
+    "/api/devices?limit={limit}&fields=esn,rain,readings",
+    "/api/devices/user/{user_id}?limit={limit}",
+])
+def test_device_list_queries_do_not_depend_on_page_size(client, owner, path):
+    single, page = _count_queries(client, path.format(limit=1, user_id=owner.id))
+    many, full_page = _count_queries(client, path.format(limit=PAGE_SIZE, user_id=owner.id))
+
+    assert len(page) == 1
+    assert len(full_page) == PAGE_SIZE
+    assert all(d["readings"] for d in full_page)
+    assert many == single
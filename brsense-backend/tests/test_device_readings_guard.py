@@ -0,0 +1,83 @@
+# tests/test_device_readings_guard.py
+"""
+Device.readings é `raise_on_sql`: carregar o histórico inteiro por acesso
+preguiçoso falha em vez de ler a tabela. As rotas que devolvem sondas trazem
+só o estado atual (uma leitura por profundidade + bateria), limitado mesmo
+com um histórico grande.
+
+Precisa de um Postgres com o schema aplicado (DATABASE_URL); os fixtures
+`db` e `client` estão em conftest.py.
+"""
+import os
+from datetime import datetime, timedelta
+
+import pytest
+
+if not os.environ.get("DATABASE_URL"):
+    pytest.skip("DATABASE_URL não configurada: o teste precisa de um Postgres", allow_module_level=True)
+
+from sqlalchemy.exc import InvalidRequestError
+
+from app.models.device import Device
+from app.models.farm import Farm
+from app.models.reading import Reading
+from app.models.user import User
+
+DEPTHS = (10.0, 20.0, 30.0)
+HISTORY_STEPS = 50
+# Última leitura de cada profundidade + a leitura de bateria
+MAX_STATE_READINGS = len(DEPTHS) + 1
+TOKEN = {"preferred_username": "guard-test@brsense", "name": "Teste Guarda", "realm_access": {"roles": []}}
+
+@pytest.fixture
+def token():
+    return TOKEN
+
+@pytest.fixture
+def probe(db):
+    user = User(name=TOKEN["name"], login=TOKEN["preferred_username"], password="KEYCLOAK_AUTH")
+    db.add(user)
+    db.flush()
+    farm = Farm(name="Fazenda Guarda", user_id=user.id)
+    db.add(farm)
+    db.flush()
+    device = Device(esn="GUARD-TEST-1", name="Sonda Guarda", farm_id=farm.id)
+    db.add(device)
+    db.flush()
+
+    now = datetime.utcnow().replace(microsecond=0)
+    for i in range(HISTORY_STEPS):
+        ts = now - timedelta(minutes=15 * i)
+        for depth in DEPTHS:
+            db.add(Reading(device_id=device.id, reading_type="H", depth_cm=depth, moisture_pct=20.0 + i % 5, timestamp=ts))
+        db.add(Reading(device_id=device.id, reading_type="T", depth_cm=10.0, temperature_c=21.0,
+                       battery_status=3, timestamp=ts))
+    db.flush()
+    db.expire_all()
+    return device
+
+def test_lazy_readings_load_raises(db, probe):
+    device = db.query(Device).filter(Device.id == probe.id).one()
+    with pytest.raises(InvalidRequestError):
+        device.readings
+
+def _assert_bounded(payload):
+    readings = payload["readings"]
+    assert 0 < len(readings) <= MAX_STATE_READINGS
+    assert {r["depth_cm"] for r in readings if r.get("moisture_pct") is not None} == set(DEPTHS)
+
+def test_device_routes_return_bounded_readings(client, probe):
+    user_id = probe.farm.user_id
+
+    response = client.get(f"/api/devices/user/{user_id}")
+    assert response.status_code == 200, response.text
+    [listed] = response.json()
+    _assert_bounded(listed)
+
+    response = client.patch(f"/api/devices/{probe.esn}", json={"name": "Sonda Guarda 2"})
+    assert response.status_code == 200, response.text
+    _assert_bounded(response.json())
+
+    response = client.post("/api/devices", json={"esn": probe.esn, "name": "Sonda Guarda 3", "farm_id": probe.farm_id})
+    assert response.status_code == 200, response.text
+    _assert_bounded(response.json())